@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the compression of batched sensor payloads (see SensorHistory): no compression,
+plain zlib, zlib with the schema dictionary of PayloadCompressor and zlib with a dictionary
+trained on recorded payloads. The trained dictionary is made of the first half of the readings
+and every mode is measured on the second half, so it is not tested on its own training data.
+
+Readings come from a virtual SenseHAT with a simulated clock or, with '--trace', from recorded
+payloads (one JSON payload per line, e.g., captured from a 'sensor/status' topic).
+Run from the root of the repository: 'python3 -m benchmarks.compression'.
+"""
+
+# local imports
+import src.sensehat as sensehat
+import src.simulation as simulation
+# external imports
+import argparse
+import logging
+import timeit
+import zlib
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the compression of batched sensor payloads.")
+    parser.add_argument('--readings', type=int, default=2000, help="readings to make or replay (default: 2000)")
+    parser.add_argument('--resolution', type=float, default=5.0, help="simulated seconds between readings (default: 5)")
+    parser.add_argument('--trace', default=None, help="file with recorded payloads to replay instead of synthetic ones")
+    parser.add_argument('--batches', type=int, nargs='+', default=[1, 10, 100], help="payloads per batch (default: 1 10 100)")
+    parser.add_argument('--dictionary-size', type=int, default=sensehat.PayloadCompressor.DICTIONARY_SIZE,
+        help=f"bytes of the trained dictionary (default: {sensehat.PayloadCompressor.DICTIONARY_SIZE})")
+    parser.add_argument('--number', type=int, default=20, help="calls per time measurement (default: 20)")
+    return parser.parse_args()
+
+def readings(args)->list:
+    now = [1704067200.0]
+    if args.trace:
+        # recorded values already include multipliers
+        backend = simulation.ReplaySense(simulation.ReplaySense.load(args.trace))
+        sensor = sensehat.SenseHatSensor(sense=backend, acceleration_multiplier=1.0, gyroscope_multiplier=1.0, read_timeout=None)
+    else:
+        backend = simulation.SyntheticSense(seed=0, clock=lambda: now[0])
+        sensor = sensehat.SenseHatSensor(sense=backend, read_timeout=None)
+    serializer = sensehat.SensorSerializer()
+    payloads = []
+    for _ in range(args.readings):
+        now[0] += args.resolution
+        payloads.append(serializer.serialize(sensor.sensors_values(), sensor.stale))
+    sensor.disable()
+    return payloads
+
+class Zlib():
+    # plain zlib at the same level, i.e., without a preset dictionary
+    def compress(self, payloads:list)->bytes:
+        return zlib.compress(b'\n'.join(payloads), 9)
+
+    def decompress(self, batch:bytes)->list:
+        return zlib.decompress(batch).split(b'\n')
+
+class Identity():
+    def compress(self, payloads:list)->bytes:
+        return b'\n'.join(payloads)
+
+    def decompress(self, batch:bytes)->list:
+        return batch.split(b'\n')
+
+def measure(function, number:int)->float:
+    # best time per call, in microseconds
+    return min(timeit.repeat(function, number=number, repeat=3)) / number * 1e6
+
+def sample(codec, payloads:list, size:int, number:int)->dict:
+    batches = [payloads[i:i + size] for i in range(0, len(payloads) - size + 1, size)]
+    compressed = [codec.compress(batch) for batch in batches]
+    for batch, data in zip(batches, compressed):
+        assert codec.decompress(data) == batch
+    raw = sum(len(b'\n'.join(batch)) for batch in batches)
+    total = sum(len(data) for data in compressed)
+    return {
+        'batches': len(batches),
+        'ratio': round(total / raw, 3),
+        'bytes/reading': round(total / (len(batches) * size), 1),
+        'compress_us': round(measure(lambda: codec.compress(batches[0]), number), 1),
+        'decompress_us': round(measure(lambda: codec.decompress(compressed[0]), number), 1),
+    }
+
+def main():
+    args = parse_args()
+    # keep log file writes out of the measurements
+    logging.disable(logging.CRITICAL)
+    payloads = readings(args)
+    training, measured = payloads[:len(payloads) // 2], payloads[len(payloads) // 2:]
+    codecs = {
+        'none': Identity(),
+        'zlib': Zlib(),
+        'zlib + schema dictionary': sensehat.PayloadCompressor(),
+        'zlib + trained dictionary': sensehat.PayloadCompressor(sensehat.PayloadCompressor.train(training, args.dictionary_size)),
+    }
+    print(f"'{len(measured)}' readings of '{sum(map(len, measured)) / len(measured):.1f}' bytes on average.")
+    width = max(len(name) for name in codecs) + 8
+    for size in args.batches:
+        if size > len(measured):
+            continue
+        results = {name: sample(codec, measured, size, args.number) for name, codec in codecs.items()}
+        print()
+        print(f"{f'batch of {size}':<{width}}  " + "  ".join(f"{key:>13}" for key in results['none']))
+        for name, result in results.items():
+            print(f"{name:<{width}}  " + "  ".join(f"{value:>13}" for value in result.values()))
+
+if __name__ == "__main__":
+    main()
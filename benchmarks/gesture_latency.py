@@ -0,0 +1,144 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the detection latency of joystick gestures. A thread plays a script of gestures
+(double presses, long holds, a sequence and single presses) on a virtual joystick in real time,
+while the joystick loop (wait_directions() with a GestureRecognizer, as in streaming_joystick())
+reads it with each poll interval. Latency is the time from the moment a gesture was resolved (a
+release, the end of a window or the hold time) until the joystick loop dequeued it.
+It also counts the joystick reads while a direction is held right after a tap, whose window
+cannot close until the release, and checks that the loop keeps to its poll interval then.
+
+Run from the root of the repository: 'python3 -m benchmarks.gesture_latency'.
+"""
+
+# local imports
+import src.analytics as analytics
+import src.sensehat as sensehat
+import src.simulation as simulation
+# external imports
+import argparse
+import logging
+import threading
+from time import sleep, time
+
+# (gesture, directions) expected from each step of the script
+SCRIPT = [
+    ('double_press', ['up', 'up']),
+    ('long_hold', ['middle']),
+    ('sequence', ['left', 'right', 'left']),
+    (None, ['down']),
+]
+# seconds each direction is pressed and between presses, as a person would do them
+TAP = 0.08
+GAP = 0.15
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the detection latency of joystick gestures.")
+    parser.add_argument('--rounds', type=int, default=5, help="rounds of the gesture script per poll interval (default: 5)")
+    parser.add_argument('--poll-intervals', type=float, nargs='+', default=[1.0, 0.1, 0.02],
+        help="seconds between joystick reads (default: 1.0 0.1 0.02)")
+    return parser.parse_args()
+
+class CountingJoystick(sensehat.SenseHatJoystick):
+    # counts the reads of wait_directions()
+    polls = 0
+
+    def poll(self)->bool:
+        self.polls += 1
+        return super().poll()
+
+def percentile(samples:list, p:float)->float:
+    # in milliseconds
+    samples = sorted(samples)
+    return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 1) if samples else None
+
+def play(stick, rounds:int, done:threading.Event):
+    for _ in range(rounds):
+        for gesture, directions in SCRIPT:
+            if gesture == 'long_hold':
+                stick.down(directions[0])
+                sleep(1.5)
+                stick.up(directions[0])
+            else:
+                for direction in directions:
+                    stick.down(direction)
+                    sleep(TAP)
+                    stick.up(direction)
+                    sleep(GAP)
+            # a pause that ends every window
+            sleep(1.2)
+    done.set()
+
+def sample(args, poll_interval:float)->dict:
+    backend = simulation.SyntheticSense(seed=0)
+    recognizer = analytics.GestureRecognizer(double_press_window=0.4, hold_time=1.0, sequence_window=0.6,
+        sequences=[SCRIPT[2][1]])
+    joystick = CountingJoystick(sense=backend, recognizer=recognizer, poll_interval=poll_interval)
+    done = threading.Event()
+    player = threading.Thread(target=play, args=(backend.stick, args.rounds, done), daemon=True)
+    player.start()
+    latencies = {gesture: [] for gesture in analytics.GestureRecognizer.GESTURES}
+    while not done.is_set():
+        joystick.wait_directions(done)
+        while not joystick.directions.empty():
+            joystick.joystick_data()
+        while not joystick.gestures.empty():
+            data = joystick.gesture_data()
+            latencies[data['gesture']].append(time() - data['timestamp'])
+    joystick.disable()
+    results = {'polls': joystick.polls}
+    for gesture, samples in latencies.items():
+        expected = args.rounds * sum(1 for g, _ in SCRIPT if g == gesture)
+        results[gesture] = {
+            'detected': f"{len(samples)}/{expected}",
+            'p50_ms': percentile(samples, 0.50),
+            'p99_ms': percentile(samples, 0.99),
+            'max_ms': percentile(samples, 1.0),
+        }
+    return results
+
+def held_after_tap(poll_interval:float, hold:float = 0.9)->dict:
+    # a tap of 'up' and then 'down' held for less than the hold time, with nothing else to read
+    backend = simulation.SyntheticSense(seed=0)
+    joystick = CountingJoystick(sense=backend, recognizer=analytics.GestureRecognizer(hold_time=1.0), poll_interval=poll_interval)
+    done = threading.Event()
+    def play():
+        backend.stick.down('up')
+        sleep(TAP)
+        backend.stick.up('up')
+        sleep(GAP)
+        backend.stick.down('down')
+        sleep(hold)
+        backend.stick.up('down')
+        sleep(0.3)
+        done.set()
+    player = threading.Thread(target=play, daemon=True)
+    start = time()
+    player.start()
+    while not done.is_set():
+        joystick.wait_directions(done)
+    elapsed = time() - start
+    joystick.disable()
+    # a read per poll interval plus a few at the ends of the windows and of the hold time
+    limit = int(elapsed / poll_interval) + 10
+    assert joystick.polls <= limit, f"'{joystick.polls}' reads in '{elapsed:.2f}' s"
+    return {'polls': joystick.polls, 'limit': limit, 'seconds': round(elapsed, 2)}
+
+def main():
+    args = parse_args()
+    # keep log file writes out of the measurements
+    logging.disable(logging.CRITICAL)
+    for poll_interval in args.poll_intervals:
+        results = sample(args, poll_interval)
+        polls = results.pop('polls')
+        width = max(len(name) for name in results)
+        print(f"poll interval of {poll_interval} s, '{polls}' reads, held after a tap: {held_after_tap(poll_interval)}")
+        print(f"{'':<{width}}  " + "  ".join(f"{key:>9}" for key in results['long_hold']))
+        for name, result in results.items():
+            print(f"{name:<{width}}  " + "  ".join(f"{value!s:>9}" for value in result.values()))
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of sensor sample timing under an LED flood. A sensor loop (virtual backend,
+precompiled serializer and fixed-rate scheduler, as in streaming_sensor()) runs while
+another thread keeps the LED matrix busy with scrolls and full frames, either in the same
+process (SenseHatLed) or through the LED worker process (LedWorker). Jitter is how far each
+interval between samples is from the resolution. It also checks that a worker stuck in an
+LED call is replaced instead of blocking the LED loop.
+
+Run from the root of the repository: 'python3 -m benchmarks.led_jitter'.
+"""
+
+# local imports
+import src.sensehat as sensehat
+import src.simulation as simulation
+import src.utils as utils
+# external imports
+import argparse
+import logging
+import random
+import threading
+from time import monotonic, sleep
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark sensor sample jitter under an LED flood.")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per mode (default: 10)")
+    parser.add_argument('--resolution', type=float, default=0.05, help="seconds between samples (default: 0.05)")
+    parser.add_argument('--message', type=str, default="The quick brown fox jumps over the lazy dog",
+        help="text scrolled by the LED flood")
+    parser.add_argument('--scroll-speed', type=float, default=0.0, help="seconds per scroll frame (default: 0)")
+    return parser.parse_args()
+
+class StuckLed(simulation.VirtualLed):
+    # an LED matrix whose set_pixel() never returns, like a hung framebuffer write
+    def set_pixel(self, x:int, y:int, *args):
+        sleep(3600)
+
+def percentile(samples:list, p:float)->float:
+    # in milliseconds
+    return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 3) if samples else None
+
+def flood(led, message:str, scroll_speed:float, stop:threading.Event):
+    frames = random.Random(0)
+    while not stop.is_set():
+        pixels = [[frames.randrange(256) for _ in range(3)] for _ in range(64)]
+        led.run([{'show_message': [message, scroll_speed]}, {'set_pixels': [pixels]}, {'clear': []}])
+
+def sample(args, led = None)->dict:
+    sensor = sensehat.SenseHatSensor(sense=simulation.SyntheticSense(seed=0), read_timeout=None)
+    serializer = sensehat.SensorSerializer()
+    stop = threading.Event()
+    flooder = threading.Thread(target=flood, args=(led, args.message, args.scroll_speed, stop), daemon=True) if led else None
+    if flooder:
+        flooder.start()
+    scheduler = utils.FixedRateScheduler(args.resolution)
+    intervals, works = [], []
+    scheduler.wait()
+    previous = None
+    ends = monotonic() + args.duration
+    while monotonic() < ends:
+        started = monotonic()
+        if previous is not None:
+            intervals.append(abs(started - previous - args.resolution))
+        previous = started
+        serializer.serialize(sensor.sensors_values(), sensor.stale)
+        works.append(monotonic() - started)
+        scheduler.wait()
+    stop.set()
+    if flooder:
+        flooder.join()
+    sensor.disable()
+    intervals.sort()
+    works.sort()
+    return {
+        'samples': len(works),
+        'skipped': scheduler.skipped,
+        'jitter_p50_ms': percentile(intervals, 0.50),
+        'jitter_p99_ms': percentile(intervals, 0.99),
+        'jitter_max_ms': percentile(intervals, 1.0),
+        'work_p50_ms': percentile(works, 0.50),
+        'work_p99_ms': percentile(works, 0.99),
+    }
+
+def stuck_worker(margin:float = 1.0)->dict:
+    worker = sensehat.LedWorker(sense_factory=StuckLed)
+    stuck = worker.process
+    margin, sensehat.LedWorker.SYNC_MARGIN = sensehat.LedWorker.SYNC_MARGIN, margin
+    beats = []
+    started = monotonic()
+    try:
+        worker.run([{'set_pixel': [0, 0, [255, 0, 0]]}], heartbeat=lambda: beats.append(monotonic() - started))
+    finally:
+        sensehat.LedWorker.SYNC_MARGIN = margin
+    elapsed = monotonic() - started
+    replaced = worker.process is not stuck and worker.process.is_alive() and not stuck.is_alive()
+    worker.disable()
+    assert replaced, "the stuck LED worker was not replaced"
+    return {'seconds': round(elapsed, 2), 'heartbeats': len(beats), 'replaced': replaced}
+
+def main():
+    args = parse_args()
+    # keep log file writes out of the measurements
+    logging.disable(logging.CRITICAL)
+    results = {'no LED flood': sample(args)}
+    results['LED flood (in process)'] = sample(args, sensehat.SenseHatLed(sense=simulation.VirtualLed()))
+    worker = sensehat.LedWorker(sense_factory=simulation.VirtualLed)
+    results['LED flood (worker)'] = sample(args, worker)
+    worker.disable()
+    print(f"stuck LED worker: {stuck_worker()}")
+    width = max(len(name) for name in results)
+    print(f"{'':<{width}}  " + "  ".join(f"{key:>13}" for key in results['no LED flood']))
+    for name, result in results.items():
+        print(f"{name:<{width}}  " + "  ".join(f"{value:>13}" for value in result.values()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Microbenchmark of sensor payload serialization: the dict + json.dumps() path of
+SenseHatSensor.sensors_data() and MqttClientPub.publish() against SensorSerializer.
+Both paths are checked to produce identical bytes first.
+
+Run from the root of the repository: 'python3 -m benchmarks.serializer'.
+"""
+
+# local imports
+import src.sensehat as sensehat
+import src.simulation as simulation
+# external imports
+import argparse
+import json
+import logging
+import timeit
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark sensor payload serialization.")
+    parser.add_argument('--number', type=int, default=20000, help="calls per measurement (default: 20000)")
+    parser.add_argument('--repeat', type=int, default=5, help="measurements; the best one is reported (default: 5)")
+    return parser.parse_args()
+
+def measure(function, number:int, repeat:int)->float:
+    # best time per call, in microseconds
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number * 1e6
+
+def main():
+    args = parse_args()
+    # keep log file writes out of the measurements
+    logging.disable(logging.CRITICAL)
+    sensor = sensehat.SenseHatSensor(sense=simulation.SyntheticSense(seed=0), read_timeout=None)
+    serializer = sensehat.SensorSerializer()
+    values = sensor.sensors_values()
+    stale = ['pressure']
+    for s in (None, stale):
+        assert serializer.serialize(values, s) == json.dumps(sensehat.SenseHatSensor.to_dict(values, s)).encode('utf-8')
+    results = {
+        # serialization of the same readings
+        'encode (dict + json.dumps)': lambda: json.dumps(sensehat.SenseHatSensor.to_dict(values)).encode('utf-8'),
+        'encode (serializer)': lambda: serializer.serialize(values),
+        'encode stale (dict + json.dumps)': lambda: json.dumps(sensehat.SenseHatSensor.to_dict(values, stale)).encode('utf-8'),
+        'encode stale (serializer)': lambda: serializer.serialize(values, stale),
+        # a whole cycle with a virtual backend (sensor reads are much slower on real hardware)
+        'cycle (sensors_data + json.dumps)': lambda: json.dumps(sensor.sensors_data()).encode('utf-8'),
+        'cycle (sensors_values + serializer)': lambda: serializer.serialize(sensor.sensors_values(), sensor.stale),
+    }
+    width = max(len(name) for name in results)
+    for name, function in results.items():
+        print(f"{name:<{width}}  {measure(function, args.number, args.repeat):8.2f} us/call")
+    sensor.disable()
+
+if __name__ == "__main__":
+    main()
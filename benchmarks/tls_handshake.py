@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the cost of (re)connecting to a TLS broker, with full handshakes and with
+resumed TLS sessions. An MQTT client (non-threaded MqttClientPub, so the handshake runs in
+this thread) connects to an in-process TLS broker stand-in again and again; each connection
+measures the wall and CPU time of the TCP connect, the TLS handshake and the MQTT CONNECT.
+The CPU time is of this thread only, so the broker's side of the handshake is not included.
+
+A self-signed certificate is made with the 'openssl' command, unless '--cert' and '--key' are given.
+Run from the root of the repository: 'python3 -m benchmarks.tls_handshake'.
+"""
+
+# local imports
+import src.mqtt as mqtt
+import src.simulation as simulation
+# external imports
+import argparse
+import logging
+import os
+import ssl
+import subprocess
+import tempfile
+from time import monotonic, perf_counter, sleep, thread_time
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark full and resumed TLS handshakes against a local broker.")
+    parser.add_argument('--connections', type=int, default=50, help="connections per mode (default: 50)")
+    parser.add_argument('--cert', default=None, help="PEM certificate of the broker (default: a self-signed one)")
+    parser.add_argument('--key', default=None, help="PEM key of the broker certificate")
+    parser.add_argument('--key-type', default='rsa:2048', help="'openssl req -newkey' key of the self-signed certificate (default: rsa:2048)")
+    parser.add_argument('--tls-version', choices=['1.2', '1.3'], default='1.3', help="highest TLS version of the broker (default: 1.3)")
+    return parser.parse_args()
+
+def percentile(samples:list, p:float)->float:
+    # in milliseconds
+    return round(sorted(samples)[min(len(samples) - 1, int(p * len(samples)))] * 1000, 3) if samples else None
+
+def self_signed(directory:str, key_type:str)->tuple:
+    cert, key = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', key_type, '-nodes', '-keyout', key, '-out', cert, '-days', '1',
+        '-subj', '/CN=localhost', '-addext', 'subjectAltName=DNS:localhost,IP:127.0.0.1'],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return cert, key
+
+def connect(address:str, tls:mqtt.TlsContext, n:int)->tuple:
+    client = mqtt.MqttClientPub(broker_address=address, zone='bench', room='tls', client_name='bench',
+        type='sensor', client_id=f"bench_tls_{n}", user=None, password=None, threaded=False, tls=tls)
+    started_wall, started_cpu = perf_counter(), thread_time()
+    # connects, does the TLS handshake and sends CONNECT
+    client.loop_socket()
+    wall, cpu = perf_counter() - started_wall, thread_time() - started_cpu
+    ends = monotonic() + 5
+    while not client.is_connected and monotonic() < ends:
+        client.loop_io(readable=True, misc=False)
+        sleep(0.001)
+    connected = client.is_connected
+    client.disable()
+    return wall, cpu, connected
+
+def sample(args, address:str, ca_certs:str, cache:bool)->dict:
+    tls = mqtt.TlsContext(ca_certs=ca_certs, cache=cache)
+    walls, cpus, failed = [], [], 0
+    # the first connection is always a full handshake
+    connect(address, tls, 0)
+    for n in range(1, args.connections + 1):
+        wall, cpu, connected = connect(address, tls, n)
+        walls.append(wall)
+        cpus.append(cpu)
+        failed += not connected
+    return {
+        'connections': len(walls),
+        'failed': failed,
+        'full': tls.full - 1,
+        'resumed': tls.resumed,
+        'wall_p50_ms': percentile(walls, 0.50),
+        'wall_p99_ms': percentile(walls, 0.99),
+        'cpu_p50_ms': percentile(cpus, 0.50),
+        'cpu_p99_ms': percentile(cpus, 0.99),
+    }
+
+def main():
+    args = parse_args()
+    # keep log file writes out of the measurements
+    logging.disable(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = (args.cert, args.key) if args.cert else self_signed(directory, args.key_type)
+        server = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        server.load_cert_chain(certfile=cert, keyfile=key)
+        if args.tls_version == '1.2':
+            server.maximum_version = ssl.TLSVersion.TLSv1_2
+        broker = simulation.BrokerStandIn(host='localhost', ssl_context=server)
+        broker.start()
+        address = f"mqtts://localhost:{broker.port}"
+        results = {
+            'full handshake': sample(args, address, cert, cache=False),
+            'resumed session': sample(args, address, cert, cache=True),
+        }
+        broker.stop()
+    width = max(len(name) for name in results)
+    print(f"{'':<{width}}  " + "  ".join(f"{key:>11}" for key in results['full handshake']))
+    for name, result in results.items():
+        print(f"{name:<{width}}  " + "  ".join(f"{value:>11}" for value in result.values()))
+
+if __name__ == "__main__":
+    main()
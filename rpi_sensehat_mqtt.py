@@ -18,11 +18,16 @@ import src.errors as err
 import src.utils as utils
 import src.mqtt as mqtt
 import src.sensehat as sensehat
+import src.analytics as analytics
+import src.diagnostics as diagnostics
 # external imports
+import json
 import logging
-from signal import signal, SIGINT, SIGHUP, SIGTERM, pause
+from signal import signal, SIGINT, SIGHUP, SIGTERM
 import sys
 import threading
+from collections import deque
+from urllib.parse import urlparse
 
 # start a logging instance for this module using constants
 file_handler = logging.FileHandler(const.LOG_FILENAME)
@@ -44,17 +49,98 @@ logger.debug("Initilized a logger object.")
 # methods for sense object threads
 def streaming_sensor():
     logger.info("Starting sensor publishing loop.")
+    scheduler = utils.FixedRateScheduler(config.resolution, stop_streaming)
+    # payloads are written straight from the sensor values, without building the nested dict
+    serializer = sensehat.SensorSerializer()
     while not stop_streaming.is_set():
+        if diagnostics_runner: diagnostics_runner.checkpoint()
         logger.debug("Updating and publishing sensor data.")
-        mqtt_pub_sensor.publish(sense_sensor.sensors_data())
-        logger.debug(f"Waiting for signal or timeout ({config.resolution}).")
-        stop_streaming.wait(config.resolution)
+        values = sense_sensor.sensors_values()
+        stale = sense_sensor.stale
+        payload = serializer.serialize(values, stale)
+        # keep readings while the broker is unreachable and backfill them once it is back
+        if history is not None and not mqtt_pub_sensor.is_connected:
+            history.append(payload)
+        else:
+            mqtt_pub_sensor.publish_raw(payload)
+            if history is not None: backfill_history(mqtt_pub_sensor)
+        # extra brokers get the same bytes through their own queues, so they never delay this loop
+        if fanout: fanout.publish(mqtt.MqttClient.SENSOR, payload)
+        # rules only evaluate the inputs that changed since the previous reading
+        if rules: queue_rule_commands(rules.update(values))
+        # adaptive sampling is optional; use the fixed resolution otherwise
+        resolution = sampler.update(values) if sampler else config.resolution
+        watchdog.beat('sensor', resolution)
+        logger.debug(f"Waiting for signal or next tick ({resolution}).")
+        scheduler.wait(resolution)
         if not stop_streaming.is_set():
             logger.warning("Reached wait timeout.")
 
+def backfill_history(mqtt_pub):
+    while len(history) and mqtt_pub.is_connected:
+        batch, count = history.peek()
+        if not mqtt_pub.publish_history(batch):
+            break
+        history.pop(count)
+        logger.info(f"Published a batch of '{count}' past readings ('{len(batch)}' bytes).")
+
+def streaming_events():
+    logger.info("Starting event detection loop.")
+    scheduler = utils.FixedRateScheduler(config.events_resolution, stop_streaming)
+    while not stop_streaming.is_set():
+        if diagnostics_runner: diagnostics_runner.checkpoint()
+        for event in detector.update(sense_sensor.events_data()):
+            logger.debug(f"Publishing event '{event}'.")
+            payload = json.dumps(event)
+            mqtt_pub_events.publish_raw(payload, retain=False)
+            if fanout: fanout.publish(mqtt.MqttClient.EVENTS, payload, retain=False)
+        watchdog.beat('events', config.events_resolution)
+        scheduler.wait(config.events_resolution)
+
+def streaming_orientation():
+    logger.info("Starting orientation fusion loop.")
+    scheduler = utils.FixedRateScheduler(config.orientation_resolution, stop_streaming)
+    # IMU samples are taken at the resolution but fused in batches, right before each publish
+    samples = []
+    next_publish = time.monotonic() + config.orientation_publish_interval
+    while not stop_streaming.is_set():
+        if diagnostics_runner: diagnostics_runner.checkpoint()
+        sample = sense_sensor.imu_values()
+        if sample: samples.append(sample)
+        publish = time.monotonic() >= next_publish
+        # long publish intervals are fused in several batches, so samples do not pile up
+        if publish or len(samples) >= analytics.OrientationFilter.BATCH:
+            fusion.update(samples)
+            samples.clear()
+        if publish:
+            next_publish = time.monotonic() + config.orientation_publish_interval
+            data = fusion.orientation_data()
+            logger.debug(f"Publishing orientation '{data}'.")
+            payload = json.dumps(data)
+            mqtt_pub_orientation.publish_raw(payload, retain=False)
+            if fanout: fanout.publish(mqtt.MqttClient.ORIENTATION, payload, retain=False)
+        watchdog.beat('orientation', config.orientation_resolution)
+        scheduler.wait(config.orientation_resolution)
+
+def queue_rule_commands(commands:list):
+    """
+    Hands the LED commands of local rules over to the LED loop and wakes it up.
+    """
+    if commands:
+        rule_commands.append(commands)
+        led_wakeup.set()
+
 def streaming_led():
     logger.info("Starting LED message loop.")
+    # a scroll tells how long it takes (see SenseHatLed.run()), so the watchdog expects the next heartbeat that much later
+    heartbeat = lambda duration=0.0: watchdog.beat('led', 2 + duration)
     while not stop_streaming.is_set():
+        if diagnostics_runner: diagnostics_runner.checkpoint()
+        watchdog.beat('led')
+        led_wakeup.clear()
+        # commands of local rules run right away and are not rate limited
+        while rule_commands:
+            sense_led.run(rule_commands.popleft(), heartbeat=heartbeat)
         if not mqtt_sub_led.messages.empty():
             logger.debug("Received a payload. Parsing it.")
             try:
@@ -68,42 +154,230 @@ def streaming_led():
                 continue
             # payload should be in {'method' : [*args]} format
             logger.info(f"payload {payload} received. Executing commands.")
-            for cmd in payload:
-                if not isinstance(cmd, dict):
-                    logger.warning(f"The command '{cmd}' is not a dictionary. Skipping it.")
-                    continue
-                for func_name, func_args in cmd.items():
-                    if func_name == "delay":
-                        time.sleep(*func_args)
-                    else:
-                        try:
-                            # https://pythonhosted.org/sense-hat/api/#led-matrix
-                            # if a valid setter, call with kwargs; else, log and skip.
-                            func = getattr(sense_led.sense, func_name, None)
-                            if func is None:
-                                logger.warning(f"The method '{func_name}' is not supported by SenseHat.")
-                                continue
-                            elif not callable(func):
-                                logger.warning(f"The method '{func_name}' is not callable.")
-                                continue
-                            func(*func_args)
-                        except TypeError as terr:
-                            logger.info(f"Unable to call '{func_name}' with args '{func_args}': {terr}")
-                        except Exception as e:
-                            # catch other exceptions that might propagate from SenseHat methods
-                            logger.warning(f"There was a non-specific error running method '{func_name}': {e}")
-        # wait a second before displaying any new messages from the mqtt topic
-        stop_streaming.wait(2)
+            logger.debug(f"LED command queue counters: '{mqtt_sub_led.messages.counters}'.")
+            sense_led.run(payload, heartbeat=heartbeat)
+        # wait a second before displaying any new messages from the mqtt topic, unless a rule wakes this loop up
+        led_wakeup.wait(2)
 
 def streaming_joystick():
     logger.info("Starting joystick directions loop.")
     while not stop_streaming.is_set():
+        if diagnostics_runner: diagnostics_runner.checkpoint()
         logger.debug("Waiting for joystick directions.")
         # pass stop_streaming flag to prevent locks in wait_directions method
-        sense_joystick.wait_directions(stop_streaming)
+        sense_joystick.wait_directions(stop_streaming, heartbeat=lambda: watchdog.beat('joystick', config.joystick_poll_interval))
         if not sense_joystick.directions.empty():
             logger.debug("A joystick direction was detected. Publishing direction from queue.")
-            mqtt_pub_joystick.publish(sense_joystick.joystick_data())
+            data = sense_joystick.joystick_data()
+            payload = json.dumps(data)
+            mqtt_pub_joystick.publish_raw(payload)
+            if fanout: fanout.publish(mqtt.MqttClient.JOYSTICK, payload)
+            if rules: queue_rule_commands(rules.joystick(data[sensehat.SenseHatJoystick.DIRECTION]))
+        # gestures are one-off messages, like events
+        while not sense_joystick.gestures.empty():
+            payload = json.dumps(sense_joystick.gesture_data())
+            mqtt_pub_joystick.publish_raw(payload, retain=False)
+            if fanout: fanout.publish(mqtt.MqttClient.JOYSTICK, payload, retain=False)
+
+def streaming_watchdog():
+    logger.info("Starting watchdog loop.")
+    next_publish = time.monotonic()
+    late = []
+    # if systemd's watchdog is enabled for the service, notify it as often as it expects;
+    # otherwise, a reloaded interval applies from the next wait
+    while not stop_streaming.wait(utils.watchdog_interval() or config.watchdog_interval):
+        current = watchdog.late()
+        if not current:
+            utils.sd_notify('WATCHDOG=1')
+        elif current != late:
+            logger.warning(f"The following loops are late: '{current}'. Not notifying the systemd watchdog.")
+        if late and not current:
+            logger.info("Every loop is within its budget again.")
+        late = current
+        if mqtt_pub_watchdog and config.watchdog_publish_interval and time.monotonic() >= next_publish:
+            next_publish = time.monotonic() + config.watchdog_publish_interval
+            mqtt_pub_watchdog.publish({
+                'time': time.asctime(),
+                'timestamp': round(time.time(), 3),
+                'healthy': not current,
+                'late': current,
+                'loops': watchdog.stats(),
+                'mqtt': reconnect_status(),
+            })
+
+def reconnect_status()->dict:
+    # the clients of the extra brokers, if any, reconnect on their own too (and a reload may replace them)
+    extra = fanout
+    clients = list(mqtts) + ([target.client for target in extra.targets] if extra else [])
+    return {m.client_id: m.reconnect.status() for m in clients}
+
+def streaming_diagnostics():
+    logger.info("Starting diagnostics loop.")
+    while not stop_streaming.is_set():
+        if not mqtt_sub_diagnostics.messages.empty():
+            logger.debug("Received a diagnostics command. Parsing it.")
+            try:
+                summary = diagnostics_runner.run(mqtt_sub_diagnostics.decoded_message())
+            except err.MqttDecodingError as mderr:
+                logger.warning(f"Could not decode mqtt message. Skipping it. Error: {mderr.error}")
+                continue
+            except err.DiagnosticsCommandError as dcerr:
+                logger.warning(f"Rejected a diagnostics command: {dcerr.message}")
+                summary = {'error': dcerr.message}
+            mqtt_sub_diagnostics.publish_status(diagnostics_runner.compress(summary))
+            logger.info("Published a diagnostics summary.")
+        stop_streaming.wait(1)
+
+# helpers to create objects from a config object; also used to reload settings
+def create_sampler(config):
+    if not config.sampling_adaptive:
+        return None
+    return analytics.AdaptiveSampler(idle_resolution=config.sampling_idle_resolution,
+        active_resolution=config.sampling_active_resolution,
+        motion_up=config.sampling_motion_up,
+        motion_down=config.sampling_motion_down,
+        change_up=config.sampling_change_up,
+        change_down=config.sampling_change_down)
+
+def create_detector(config):
+    if not config.events_enabled:
+        return None
+    return analytics.EventDetector(shake_threshold=config.events_shake_threshold,
+        tilt_angle=config.events_tilt_angle,
+        temperature_threshold=config.events_temperature_threshold,
+        temperature_hysteresis=config.events_temperature_hysteresis,
+        humidity_threshold=config.events_humidity_threshold,
+        humidity_hysteresis=config.events_humidity_hysteresis)
+
+def create_rules(config):
+    if not config.rules_enabled:
+        return None
+    return analytics.RulesEngine.load(config.rules_file)
+
+def create_fusion(config):
+    if not config.orientation_enabled:
+        return None
+    return analytics.OrientationFilter(beta=config.orientation_beta,
+        rounding=config.sensehat_rounding)
+
+def create_history(config):
+    if not config.history_enabled:
+        return None
+    return sensehat.SensorHistory(size=config.history_size,
+        batch=config.history_batch,
+        compressor=create_compressor(config) if config.history_compression else None)
+
+def create_compressor(config):
+    # the history and the 'zdict' extra brokers share the dictionary
+    if config.history_dictionary:
+        return sensehat.PayloadCompressor.load(config.history_dictionary)
+    return sensehat.PayloadCompressor()
+
+def create_fanout(config):
+    if not config.broker_targets:
+        return None
+    targets = []
+    try:
+        for target in config.broker_targets:
+            scheme = urlparse(target['broker_address']).scheme
+            client_id = f"{config.mqtt_client_name}_{target['name']}"
+            targets.append(mqtt.BrokerTarget(name=target['name'],
+                broker_address=target['broker_address'],
+                zone=config.mqtt_zone,
+                room=config.mqtt_room,
+                client_name=config.mqtt_client_name,
+                user=target['user'],
+                password=target['password'],
+                qos=target['qos'],
+                prefix=target['prefix'],
+                encoding=target['encoding'],
+                queue_size=target['queue_size'],
+                reconnect=mqtt.ReconnectManager(client_id=client_id,
+                    min_delay=config.mqtt_reconnect_min_delay,
+                    max_delay=config.mqtt_reconnect_max_delay,
+                    startup_delay=config.mqtt_startup_delay),
+                protocol_version=config.mqtt_protocol_version,
+                message_expiry=config.mqtt_message_expiry,
+                tls=mqtt.TlsContext(ca_certs=target['ca_certs']) if scheme in const.MQTT_TLS_PROTOCOLS else None))
+        compressor = create_compressor(config) if any(t.encoding == mqtt.BrokerTarget.ZDICT for t in targets) else None
+        return mqtt.Fanout(targets, compressor=compressor)
+    except (err.InvalidMqttAttr, OSError):
+        # do not leave the clients of the valid brokers behind
+        for target in targets:
+            target.disable()
+        raise
+
+def create_gestures(config):
+    if not config.joystick_gestures:
+        return None
+    return analytics.GestureRecognizer(double_press_window=config.joystick_double_press_window,
+        hold_time=config.joystick_hold_time,
+        sequence_window=config.joystick_sequence_window,
+        sequences=config.joystick_sequences)
+
+def create_command_queue(config):
+    return mqtt.CommandQueue(maxsize=config.led_queue_size,
+        policy=config.led_queue_policy,
+        rate=config.led_rate,
+        burst=config.led_burst)
+
+def create_diagnostics(config):
+    if not config.diagnostics_enabled:
+        return None
+    return diagnostics.Diagnostics(token=config.diagnostics_token,
+        max_duration=config.diagnostics_max_duration,
+        top=config.diagnostics_top,
+        event=stop_streaming)
+
+def create_tls(config):
+    # a single context for all clients, so they resume each other's TLS sessions
+    if urlparse(config.mqtt_broker_address).scheme not in const.MQTT_TLS_PROTOCOLS:
+        return None
+    return mqtt.TlsContext(ca_certs=config.mqtt_ca_certs,
+        certfile=config.mqtt_certfile,
+        keyfile=config.mqtt_keyfile,
+        insecure=config.mqtt_tls_insecure)
+
+def create_mqtts(config, events:bool, diagnostics:bool, orientation:bool, tls=None):
+    """
+    Returns the sensor, LED, joystick, (if 'events') events, (if 'diagnostics') diagnostics,
+    (if lag statistics are published) watchdog and (if 'orientation') orientation MQTT clients,
+    in this order.
+    """
+    clients = []
+    for type in ['sensor', 'led', 'joystick', 'events', 'diagnostics', 'watchdog', 'orientation']:
+        if ((type == 'events' and not events) or (type == 'diagnostics' and not diagnostics)
+            or (type == 'watchdog' and not config.watchdog_publish_interval) or (type == 'orientation' and not orientation)):
+            clients.append(None)
+            continue
+        client_class = mqtt.MqttClientSub if type in ['led', 'diagnostics'] else mqtt.MqttClientPub
+        clients.append(client_class(broker_address=config.mqtt_broker_address,
+            zone=config.mqtt_zone,
+            room=config.mqtt_room,
+            client_name=config.mqtt_client_name,
+            type=type,
+            client_id=f"{config.mqtt_client_name}_{type}",
+            user=config.mqtt_user,
+            password=config.mqtt_password,
+            reconnect=mqtt.ReconnectManager(client_id=f"{config.mqtt_client_name}_{type}",
+                min_delay=config.mqtt_reconnect_min_delay,
+                max_delay=config.mqtt_reconnect_max_delay,
+                startup_delay=config.mqtt_startup_delay),
+            protocol_version=config.mqtt_protocol_version,
+            message_expiry=config.mqtt_message_expiry,
+            tls=tls))
+    # LED commands have their own queue limits (see the [led] section)
+    clients[1].messages = create_command_queue(config)
+    return clients
+
+def configure_mqtt(client, config):
+    """
+    Applies the MQTT settings that do not need a new connection to a running client.
+    """
+    client.message_expiry = config.mqtt_message_expiry
+    client.reconnect.configure(min_delay=config.mqtt_reconnect_min_delay,
+        max_delay=config.mqtt_reconnect_max_delay,
+        startup_delay=config.mqtt_startup_delay)
 
 # methods of the main logic
 def start(*signals):
@@ -116,25 +390,176 @@ def start(*signals):
     mqtts = []
     threads = []
     # thread helpers
-    global stop_streaming
+    global stop_streaming, led_wakeup, rule_commands, reload_requested
     stop_streaming = threading.Event()
+    reload_requested = threading.Event()
+    led_wakeup = threading.Event()
+    # reload settings on HUP instead; the main thread does it once everything is running (see main())
+    signal(SIGHUP, request_reload)
+    # LED commands of local rules that the LED loop has not run yet; the oldest are dropped first
+    rule_commands = deque(maxlen=16)
+    # extra brokers, if any (see create_fanout())
+    global fanout
+    fanout = None
+
+def request_reload(signum, frame=None):
+    # reload() runs in the main thread instead of this handler, so never before the objects it
+    # updates exist nor in the middle of another reload (or of a log call of the main thread)
+    reload_requested.set()
 
 def stop(signum, frame=None):
     logger.info(f"Received a signal '{signum}' to stop.")
+    utils.sd_notify('STOPPING=1')
     # cleanup procedures
     stop_streaming.set()
+    led_wakeup.set()
     # disconnect and stop threads
     for m in mqtts:
         if m.is_enabled: m.disable()
+    if fanout: fanout.disable()
     # turn off sensehat led and so on
     for s in senses:
         if s.is_enabled: s.disable()
     # exit the application
     sys.exit(signum)
 
+def reload(signum, frame=None):
+    """
+    Re-parses the config file and applies only the settings that changed to the running
+    objects. MQTT clients are only recreated (i.e., reconnected) when a connection or topic
+    setting changed. Timing changes apply from the next tick of each loop.
+    """
+    logger.info(f"Received a signal '{signum}' to reload settings.")
+    global config, sampler, detector, rules, tls_context, fanout
+    global mqtt_pub_sensor, mqtt_sub_led, mqtt_pub_joystick, mqtt_pub_events, mqtt_sub_diagnostics, mqtt_pub_watchdog, mqtt_pub_orientation
+    try:
+        new_config = utils.Configuration()
+    except err.SenseHatException as cerr:
+        logger.info(f"Unable to reload settings: {cerr.message} Keeping the running ones.")
+        return
+    changes = config.diff(new_config)
+    # rules are read again on every reload, because their file might have changed on its own
+    try:
+        new_rules = create_rules(new_config)
+    except err.InvalidAnalyticsAttr as anerr:
+        logger.info(f"Unable to reload settings because the rules are invalid: {anerr.message} Keeping the running ones.")
+        return
+    if not changes:
+        rules = new_rules
+        logger.info(f"No settings changed.{' Rules were reloaded.' if rules else ''}")
+        return
+    logger.info(f"Applying changed settings: '{changes}'.")
+    if 'events_enabled' in changes:
+        logger.info("Enabling or disabling events requires a restart. Ignoring it.")
+    if 'diagnostics_enabled' in changes:
+        logger.info("Enabling or disabling diagnostics requires a restart. Ignoring it.")
+    if 'led_worker' in changes:
+        logger.info("Enabling or disabling the LED worker requires a restart. Ignoring it.")
+    if 'orientation_enabled' in changes:
+        logger.info("Enabling or disabling orientation fusion requires a restart. Ignoring it.")
+    if 'history_enabled' in changes:
+        logger.info("Enabling or disabling the history requires a restart. Ignoring it.")
+    if 'watchdog_publish_interval' in changes and not (config.watchdog_publish_interval and new_config.watchdog_publish_interval):
+        logger.info("Enabling or disabling lag statistics requires a restart. Ignoring it.")
+        new_config.watchdog_publish_interval = config.watchdog_publish_interval
+    # create new objects first, so an invalid setting leaves everything untouched
+    try:
+        new_sampler = create_sampler(new_config) if any(c.startswith('sampling_') or c == 'resolution' for c in changes) else sampler
+        new_detector = create_detector(new_config) if detector and any(c.startswith('events_') for c in changes) else detector
+        # a new recognizer forgets the presses of a gesture in progress
+        new_gestures = create_gestures(new_config) if any(c.startswith('joystick_') and c != 'joystick_poll_interval' for c in changes) else sense_joystick.recognizer
+    except err.InvalidAnalyticsAttr as anerr:
+        logger.info(f"Unable to reload settings because the following attribute is invalid: '{anerr.attribute}'. Keeping the running ones.")
+        return
+    # the MQTT clients are only recreated for the settings of their connections and topics;
+    # the extra brokers have their own addresses, but share the client name, topics and protocol version
+    connection = ['mqtt_broker_address', 'mqtt_user', 'mqtt_password', 'mqtt_client_name', 'mqtt_zone', 'mqtt_room',
+        'mqtt_protocol_version', 'mqtt_ca_certs', 'mqtt_certfile', 'mqtt_keyfile', 'mqtt_tls_insecure']
+    shared = ['mqtt_client_name', 'mqtt_zone', 'mqtt_room', 'mqtt_protocol_version']
+    if new_config.mqtt_reconnect_min_delay > new_config.mqtt_reconnect_max_delay:
+        logger.info("Unable to reload settings because the reconnect min delay is greater than the max delay. Keeping the running ones.")
+        return
+    new_mqtts = None
+    new_tls = tls_context
+    if any(c in changes for c in connection):
+        try:
+            # keep the TLS context (and its sessions) unless the broker or its TLS settings changed
+            if any(c in changes for c in ['mqtt_broker_address', 'mqtt_ca_certs', 'mqtt_certfile', 'mqtt_keyfile', 'mqtt_tls_insecure']):
+                new_tls = create_tls(new_config)
+            new_mqtts = create_mqtts(new_config, events=detector is not None, diagnostics=diagnostics_runner is not None,
+                orientation=fusion is not None, tls=new_tls)
+        except err.InvalidMqttAttr as maerr:
+            logger.info(f"Unable to reload settings because the following MQTT attribute is invalid: '{maerr.attribute}'. Keeping the running ones.")
+            return
+    new_fanout = fanout
+    if 'broker_targets' in changes or 'history_dictionary' in changes or any(c in changes for c in shared):
+        try:
+            new_fanout = create_fanout(new_config)
+        except (err.InvalidMqttAttr, OSError) as ferr:
+            logger.info(f"Unable to reload settings because of an extra broker: '{getattr(ferr, 'attribute', ferr)}'. Keeping the running ones.")
+            for m in new_mqtts or []:
+                if m: m.disable()
+            return
+    # sensehat objects
+    sense_sensor.rounding = new_config.sensehat_rounding
+    sense_sensor.acceleration_multiplier = new_config.sensehat_acceleration_multiplier
+    sense_sensor.gyroscope_multiplier = new_config.sensehat_gyroscope_multiplier
+    sense_sensor.reader.timeout = new_config.sensehat_read_timeout
+    if 'sensehat_set_rotation' in changes: sense_led.set_rotation = new_config.sensehat_set_rotation
+    if 'sensehat_low_light' in changes: sense_led.low_light = new_config.sensehat_low_light
+    sense_joystick.poll_interval = new_config.joystick_poll_interval
+    sense_joystick.recognizer = new_gestures
+    # the history keeps its readings; new limits and compression apply to the next batch
+    if history is not None and any(c.startswith('history_') for c in changes):
+        try:
+            history.configure(size=new_config.history_size,
+                batch=new_config.history_batch,
+                compressor=create_compressor(new_config) if new_config.history_compression else None)
+        except OSError as oerr:
+            logger.info(f"Unable to read the history dictionary: '{oerr}'. Keeping the running one.")
+    # the filter keeps its orientation; a new gain applies from the next batch
+    if fusion and 'orientation_beta' in changes: fusion.beta = new_config.orientation_beta
+    # analytics objects
+    sampler, detector, rules, tls_context = new_sampler, new_detector, new_rules, new_tls
+    # the diagnostics runner is kept, so profiles that are running end cleanly
+    if diagnostics_runner and new_config.diagnostics_enabled:
+        diagnostics_runner.configure(token=new_config.diagnostics_token,
+            max_duration=new_config.diagnostics_max_duration,
+            top=new_config.diagnostics_top)
+    # watchdog budgets; new periods are sent with the next heartbeat of each loop
+    if 'watchdog_budget' in changes:
+        for name in watchdog.stats():
+            watchdog.budget(name, new_config.watchdog_budget)
+    # mqtt objects
+    if new_mqtts:
+        old_mqtts = list(mqtts)
+        (mqtt_pub_sensor, mqtt_sub_led, mqtt_pub_joystick, mqtt_pub_events, mqtt_sub_diagnostics, mqtt_pub_watchdog,
+            mqtt_pub_orientation) = new_mqtts
+        mqtts[:] = [m for m in new_mqtts if m]
+        for m in old_mqtts:
+            if m.is_enabled: m.disable()
+    else:
+        if any(c.startswith('led_') for c in changes):
+            mqtt_sub_led.messages.configure(maxsize=new_config.led_queue_size,
+                policy=new_config.led_queue_policy,
+                rate=new_config.led_rate,
+                burst=new_config.led_burst)
+        # e.g., the message expiry and reconnect delays; the clients stay connected
+        for m in mqtts:
+            configure_mqtt(m, new_config)
+    # extra brokers; queued messages of the old ones are dropped
+    if new_fanout is not fanout:
+        old_fanout, fanout = fanout, new_fanout
+        if old_fanout: old_fanout.disable()
+    elif fanout:
+        for target in fanout.targets:
+            configure_mqtt(target.client, new_config)
+    config = new_config
+    logger.info("Settings were reloaded.")
+
 def main():
-    # startup procedure to trap INT, HUP, TERM signals
-    start(SIGINT, SIGHUP, SIGTERM)
+    # startup procedure to trap INT, TERM signals (HUP reloads settings)
+    start(SIGINT, SIGTERM)
     # create a config object
     global config
     try:
@@ -152,53 +577,96 @@ def main():
     global sense_sensor, sense_led, sense_joystick
     sense_sensor = sensehat.SenseHatSensor(rounding=config.sensehat_rounding,
         acceleration_multiplier=config.sensehat_acceleration_multiplier,
-        gyroscope_multiplier=config.sensehat_gyroscope_multiplier)
-    sense_led = sensehat.SenseHatLed(set_rotation=config.sensehat_set_rotation,
+        gyroscope_multiplier=config.sensehat_gyroscope_multiplier,
+        read_timeout=config.sensehat_read_timeout)
+    # the LED worker has the same interface as the LED object it runs in another process
+    led_class = sensehat.LedWorker if config.led_worker else sensehat.SenseHatLed
+    sense_led = led_class(set_rotation=config.sensehat_set_rotation,
         low_light=config.sensehat_low_light)
-    sense_joystick = sensehat.SenseHatJoystick()
+    sense_joystick = sensehat.SenseHatJoystick(poll_interval=config.joystick_poll_interval)
     senses.extend([sense_sensor, sense_led, sense_joystick])
+    # create analytics objects
+    global sampler, detector, rules, fusion
+    try:
+        sampler = create_sampler(config)
+        detector = create_detector(config)
+        rules = create_rules(config)
+        fusion = create_fusion(config)
+        sense_joystick.recognizer = create_gestures(config)
+    except err.InvalidAnalyticsAttr as anerr:
+        logger.info(f"Check your config because the following analytics attribute is invalid: '{anerr.attribute}'. {anerr.message}")
+        stop(1)
+    # readings kept while the broker is unreachable (off by default)
+    global history
+    try:
+        history = create_history(config)
+    except OSError as oerr:
+        logger.info(f"Unable to read the history dictionary: '{oerr}'.")
+        stop(1)
+    # create the diagnostics runner (off by default)
+    global diagnostics_runner
+    try:
+        diagnostics_runner = create_diagnostics(config)
+    except err.InvalidDiagnosticsAttr as dierr:
+        logger.info(f"Check your config because the following diagnostics attribute is invalid: '{dierr.attribute}'")
+        stop(1)
     # create mqtt objects
-    global mqtt_pub_sensor, mqtt_sub_led, mqtt_pub_joystick
+    global mqtt_pub_sensor, mqtt_sub_led, mqtt_pub_joystick, mqtt_pub_events, mqtt_sub_diagnostics, mqtt_pub_watchdog
+    global mqtt_pub_orientation, tls_context
     try:
-        mqtt_pub_sensor = mqtt.MqttClientPub(broker_address=config.mqtt_broker_address,
-            zone=config.mqtt_zone,
-            room=config.mqtt_room,
-            client_name=config.mqtt_client_name,
-            type='sensor',
-            client_id=f"{config.mqtt_client_name}_sensor",
-            user=config.mqtt_user,
-            password=config.mqtt_password)
-        mqtt_sub_led = mqtt.MqttClientSub(broker_address=config.mqtt_broker_address,
-            zone=config.mqtt_zone,
-            room=config.mqtt_room,
-            client_name=config.mqtt_client_name,
-            type='led',
-            client_id=f"{config.mqtt_client_name}_led",
-            user=config.mqtt_user,
-            password=config.mqtt_password)
-        mqtt_pub_joystick = mqtt.MqttClientPub(broker_address=config.mqtt_broker_address,
-            zone=config.mqtt_zone,
-            room=config.mqtt_room,
-            client_name=config.mqtt_client_name,
-            type='joystick',
-            client_id=f"{config.mqtt_client_name}_joystick",
-            user=config.mqtt_user,
-            password=config.mqtt_password)
-        mqtts.extend([mqtt_pub_sensor, mqtt_sub_led, mqtt_pub_joystick])
+        tls_context = create_tls(config)
+        (mqtt_pub_sensor, mqtt_sub_led, mqtt_pub_joystick, mqtt_pub_events, mqtt_sub_diagnostics,
+            mqtt_pub_watchdog, mqtt_pub_orientation) = create_mqtts(config, events=detector is not None,
+            diagnostics=diagnostics_runner is not None, orientation=fusion is not None, tls=tls_context)
+        mqtts.extend([m for m in [mqtt_pub_sensor, mqtt_sub_led, mqtt_pub_joystick, mqtt_pub_events, mqtt_sub_diagnostics,
+            mqtt_pub_watchdog, mqtt_pub_orientation] if m])
     except err.InvalidMqttAttr as maerr:
         logger.info(f"Check your config becayse the following MQTT attribute is invalid: '{maerr.attribute}'")
         stop(1)
+    # extra brokers (none by default)
+    global fanout
+    try:
+        fanout = create_fanout(config)
+    except err.InvalidMqttAttr as maerr:
+        logger.info(f"Check your config because the following attribute of an extra broker is invalid: '{maerr.attribute}'")
+        stop(1)
+    except OSError as oerr:
+        logger.info(f"Unable to read the dictionary of the extra brokers: '{oerr}'.")
+        stop(1)
     # thread handlers
     thread_sensor = threading.Thread(target=streaming_sensor)
     thread_led = threading.Thread(target=streaming_led)
     thread_joystick = threading.Thread(target=streaming_joystick)
     threads.extend([thread_sensor, thread_led, thread_joystick])
+    if detector:
+        threads.append(threading.Thread(target=streaming_events))
+    if diagnostics_runner:
+        threads.append(threading.Thread(target=streaming_diagnostics))
+    if fusion:
+        threads.append(threading.Thread(target=streaming_orientation))
+    # every loop sends heartbeats to the watchdog, which has its own thread
+    global watchdog
+    watchdog = utils.Watchdog()
+    watchdog.watch('sensor', sampler.resolution if sampler else config.resolution, config.watchdog_budget)
+    watchdog.watch('led', 2, config.watchdog_budget)
+    watchdog.watch('joystick', config.joystick_poll_interval, config.watchdog_budget)
+    if detector:
+        watchdog.watch('events', config.events_resolution, config.watchdog_budget)
+    if fusion:
+        watchdog.watch('orientation', config.orientation_resolution, config.watchdog_budget)
+    threads.append(threading.Thread(target=streaming_watchdog))
     # finished setting up, then print welcome message if set (this blocking)
     # start threads and wait for interrupt signal in this one
     logger.debug(f"Starting threads '{threads}'.")
     for t in threads: t.start()
+    # with 'Type=notify', systemd considers the service started from now on
+    utils.sd_notify('READY=1')
     logger.info("Main thread is done. Waiting for interrupt.")
-    pause()
+    while True:
+        # including a HUP received while starting
+        reload_requested.wait()
+        reload_requested.clear()
+        reload(SIGHUP)
 
 if __name__ == "__main__":
     main()
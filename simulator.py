@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+This script simulates many virtual SenseHATs in a single process to test how an MQTT broker
+and its consumers (e.g., Home Assistant) behave with large fleets. Each virtual device
+publishes to its own 'zone/room/client_name' topic tree from a synthetic or replayed
+backend, and aggregate publish throughput and latency are reported periodically.
+
+Run './simulator.py --help' for usage. Use '--broker local' to run against an in-process
+broker stand-in instead of a real broker.
+"""
+
+# local imports
+import src.constants as const
+import src.errors as err
+import src.simulation as simulation
+# external imports
+import argparse
+import logging
+import sys
+from threading import Event
+from signal import signal, SIGINT, SIGTERM
+
+# start a logging instance for this module using constants
+file_handler = logging.FileHandler(const.LOG_FILENAME)
+stream_handler = logging.StreamHandler(sys.stdout)
+
+formatter = logging.Formatter(fmt=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+file_handler.setFormatter(formatter)
+stream_handler.setFormatter(formatter)
+root_logger = logging.getLogger()
+root_logger.setLevel(const.LOG_LEVEL)
+root_logger.addHandler(file_handler)
+root_logger.addHandler(stream_handler)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Simulate a fleet of virtual SenseHATs.")
+    parser.add_argument('--devices', type=int, default=10, help="number of virtual devices (default: 10)")
+    parser.add_argument('--broker', default='local',
+        help="'protocol://address:port' of the broker or 'local' for an in-process stand-in (default: local)")
+    parser.add_argument('--user', default=None, help="broker user, if required")
+    parser.add_argument('--password', default=None, help="broker password, if required")
+    parser.add_argument('--zone', default='simulation', help="zone of every device (default: simulation)")
+    parser.add_argument('--rooms', type=int, default=10, help="number of rooms devices are spread across (default: 10)")
+    parser.add_argument('--prefix', default='virtual', help="client_name prefix of the devices (default: virtual)")
+    parser.add_argument('--resolution', type=float, default=5.0, help="seconds between readings of each device (default: 5)")
+    parser.add_argument('--aligned', action='store_true',
+        help="publish from every device at the same instant instead of spreading them over the resolution")
+    parser.add_argument('--replay', default=None,
+        help="file with one recorded 'sensor/status' JSON payload per line to replay instead of synthetic data")
+    parser.add_argument('--workers', type=int, default=4, help="number of worker threads (default: 4)")
+    parser.add_argument('--duration', type=float, default=60.0, help="seconds to run for; 0 runs until interrupted (default: 60)")
+    parser.add_argument('--report', type=float, default=10.0, help="seconds between reports (default: 10)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    # per-reading log messages would drown the reports
+    logging.getLogger('src.sensehat.sensehat').setLevel(logging.WARNING)
+    stop_simulation = Event()
+    for s in [SIGINT, SIGTERM]: signal(s, lambda signum, frame: stop_simulation.set())
+    broker = None
+    broker_address = args.broker
+    if broker_address == 'local':
+        broker = simulation.BrokerStandIn()
+        broker.start()
+        broker_address = broker.url
+    records = simulation.ReplaySense.load(args.replay) if args.replay else None
+    stats = simulation.FleetStats()
+    try:
+        devices = []
+        for i in range(args.devices):
+            backend = simulation.ReplaySense(records, offset=i) if records else simulation.SyntheticSense(seed=i)
+            devices.append(simulation.VirtualDevice(broker_address=broker_address,
+                zone=args.zone,
+                room=f"room{i % args.rooms:03d}",
+                client_name=f"{args.prefix}{i:05d}",
+                backend=backend,
+                resolution=args.resolution,
+                stats=stats,
+                offset=0.0 if args.aligned else args.resolution * i / args.devices,
+                user=args.user,
+                password=args.password,
+                # recorded values already include multipliers
+                acceleration_multiplier=1.0 if records else 9.80665))
+        monitor = simulation.MonitorClient(stats=stats,
+            topic=f"{args.zone}/+/+/sensor/status",
+            broker_address=broker_address,
+            zone=args.zone,
+            room=None,
+            client_name=f"{args.prefix}_monitor",
+            type='sensor',
+            client_id=f"{args.prefix}_monitor",
+            user=args.user,
+            password=args.password,
+            threaded=False)
+    except (err.InvalidMqttAttr, err.InvalidSenseAttr) as aerr:
+        logger.info(f"Unable to create the virtual devices because the following attribute is invalid: '{aerr.attribute}'")
+        sys.exit(1)
+    fleet = simulation.Fleet(devices, workers=args.workers, monitor=monitor)
+    fleet.start()
+    remaining = args.duration if args.duration > 0 else float('inf')
+    while remaining > 0 and not stop_simulation.wait(min(args.report, remaining)):
+        remaining -= args.report
+        logger.info(f"Connected devices '{fleet.connected}/{len(devices)}'. Stats: '{stats.report()}'")
+    fleet.stop()
+    report = stats.report()
+    if broker:
+        report['broker_received'] = broker.received
+        report['broker_delivered'] = broker.delivered
+    logger.info(f"Final stats: '{report}'")
+    if broker:
+        broker.stop()
+
+if __name__ == "__main__":
+    main()
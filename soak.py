@@ -0,0 +1,115 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+This script runs a soak test of the rpi-sensehat-mqtt pipeline: a virtual SenseHAT goes
+through the same sensor, LED and joystick paths as the service for simulated days, while the
+memory of the process is sampled every simulated hour. It exits with an error if the RSS or
+the number of objects grew by more than the allowed amounts after the warm-up.
+
+Run './soak.py --help' for usage. Use '--broker local' (default) to run against an in-process
+broker stand-in instead of a real broker.
+"""
+
+# local imports
+import src.constants as const
+import src.errors as err
+import src.simulation as simulation
+# external imports
+import argparse
+import logging
+import sys
+from time import monotonic, sleep
+
+# start a logging instance for this module using constants
+file_handler = logging.FileHandler(const.LOG_FILENAME)
+stream_handler = logging.StreamHandler(sys.stdout)
+
+formatter = logging.Formatter(fmt=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+file_handler.setFormatter(formatter)
+stream_handler.setFormatter(formatter)
+root_logger = logging.getLogger()
+root_logger.setLevel(const.LOG_LEVEL)
+root_logger.addHandler(file_handler)
+root_logger.addHandler(stream_handler)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+HOUR = 3600
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Soak test the pipeline with a virtual SenseHAT.")
+    parser.add_argument('--days', type=float, default=7.0, help="simulated days to run for (default: 7)")
+    parser.add_argument('--resolution', type=float, default=5.0, help="simulated seconds between readings (default: 5)")
+    parser.add_argument('--warmup', type=float, default=6.0,
+        help="simulated hours before the baseline is taken, so caches and buffers can fill up (default: 6)")
+    parser.add_argument('--max-rss-growth', type=int, default=2048, help="allowed RSS growth in KiB (default: 2048)")
+    parser.add_argument('--max-object-growth', type=int, default=500,
+        help="allowed growth of the number of objects tracked by the garbage collector (default: 500)")
+    parser.add_argument('--rules', default=None, help="rules file to run through the rules engine (e.g., rules.json.example)")
+    parser.add_argument('--broker', default='local',
+        help="'protocol://address:port' of the broker or 'local' for an in-process stand-in (default: local)")
+    parser.add_argument('--user', default=None, help="broker user, if required")
+    parser.add_argument('--password', default=None, help="broker password, if required")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    # per-reading log messages would drown the reports (and fill the log file)
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith('src.'):
+            logging.getLogger(name).setLevel(logging.WARNING)
+    broker = None
+    broker_address = args.broker
+    if broker_address == 'local':
+        broker = simulation.BrokerStandIn()
+        broker.start()
+        broker_address = broker.url
+    try:
+        pipeline = simulation.SoakPipeline(broker_address=broker_address, resolution=args.resolution,
+            rules_file=args.rules, user=args.user, password=args.password)
+    except (err.InvalidMqttAttr, err.InvalidSenseAttr, err.InvalidAnalyticsAttr) as aerr:
+        logger.warning(f"Unable to create the pipeline because the following attribute is invalid: '{aerr.attribute}'")
+        sys.exit(1)
+    if not pipeline.connect():
+        logger.warning(f"Unable to connect to the broker '{broker_address}'.")
+        sys.exit(1)
+    probe = simulation.MemoryProbe()
+    steps_per_hour = max(1, round(HOUR / args.resolution))
+    total = round(args.days * 24 * steps_per_hour)
+    warmup = round(args.warmup * steps_per_hour)
+    baseline, baseline_types = None, None
+    started = monotonic()
+    for step in range(1, total + 1):
+        pipeline.step()
+        if step % steps_per_hour and step != total:
+            continue
+        sample = probe.sample()
+        hours = pipeline.simulated / HOUR
+        if baseline is None and step >= warmup:
+            baseline, baseline_types = sample, probe.types()
+        growth = f" (+{sample['rss_kb'] - baseline['rss_kb']} KiB, +{sample['objects'] - baseline['objects']} objects)" if baseline else ''
+        logger.info(f"Simulated hour '{hours:.0f}' after '{monotonic() - started:.0f}' seconds: "
+            f"RSS '{sample['rss_kb']}' KiB, objects '{sample['objects']}'{growth}.")
+    pipeline.disable()
+    if broker:
+        # give the broker time to see the clients disconnect before its loop stops
+        sleep(0.5)
+        broker.stop()
+    if baseline is None:
+        logger.warning("The run ended before the warm-up, so there is no baseline. Run it for longer.")
+        sys.exit(1)
+    rss_growth = sample['rss_kb'] - baseline['rss_kb']
+    object_growth = sample['objects'] - baseline['objects']
+    if rss_growth > args.max_rss_growth or object_growth > args.max_object_growth:
+        types = probe.types()
+        types.subtract(baseline_types)
+        logger.warning(f"FAILED: RSS grew by '{rss_growth}' KiB (max '{args.max_rss_growth}') and objects by "
+            f"'{object_growth}' (max '{args.max_object_growth}'). Types that grew the most: '{types.most_common(10)}'.")
+        sys.exit(1)
+    logger.info(f"PASSED: RSS grew by '{rss_growth}' KiB and objects by '{object_growth}' over '{pipeline.steps}' readings.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+from src.analytics.sampling import *
+from src.analytics.events import *
+from src.analytics.rules import *
+from src.analytics.orientation import *
+from src.analytics.gestures import *
@@ -0,0 +1,133 @@
+"""
+Module that contains an on-device event detector for sensor readings.
+The detector is fed with readings (see SenseHatSensor.events_data()) and returns
+the list of events found in each of them, so that they can be published right away.
+"""
+
+# local imports
+from src.constants import constants as const
+from src.errors import errors as err
+# external imports
+import logging
+from math import acos, degrees, sqrt
+from time import asctime, time
+
+# start a loggin instance for this module using constants
+logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+class EventDetector():
+    """
+    Class that generates an event detector.
+    Every detector is edge triggered: an event is only returned when its condition changes,
+    so a device left tilted or a room that stays warm does not produce an event per reading.
+    Set a threshold to None to disable its detector.
+    """
+    # event payload keys convention
+    EVENT = 'event'
+    STATE = 'state'
+    VALUE = 'value'
+    TIME = 'time'
+    TIMESTAMP = 'timestamp'
+    # event names
+    SHAKE = 'shake'
+    TILT = 'tilt'
+    TEMPERATURE = 'temperature'
+    HUMIDITY = 'humidity'
+    EVENTS = [SHAKE, TILT, TEMPERATURE, HUMIDITY]
+    # event states
+    DETECTED = 'detected'
+    TILTED = 'tilted'
+    LEVEL = 'level'
+    ABOVE = 'above'
+    BELOW = 'below'
+
+    def __init__(self,
+                shake_threshold:float = None,
+                tilt_angle:float = None,
+                temperature_threshold:float = None,
+                temperature_hysteresis:float = 0.0,
+                humidity_threshold:float = None,
+                humidity_hysteresis:float = 0.0):
+        if tilt_angle is not None and not 0 < tilt_angle < 180:
+            logger.info(f"The tilt angle '{tilt_angle}' must be between 0 and 180 degrees.")
+            raise err.InvalidAnalyticsAttr(f"The tilt angle '{tilt_angle}' is invalid.", 'tilt_angle')
+        if temperature_hysteresis < 0 or humidity_hysteresis < 0:
+            logger.info(f"Hysteresis values cannot be negative.")
+            raise err.InvalidAnalyticsAttr(f"Hysteresis values cannot be negative.", 'hysteresis')
+        self._shake_threshold = shake_threshold
+        self._tilt_angle = tilt_angle
+        self._temperature_threshold = temperature_threshold
+        self._temperature_hysteresis = temperature_hysteresis
+        self._humidity_threshold = humidity_threshold
+        self._humidity_hysteresis = humidity_hysteresis
+        # current state of each detector; None until the first reading
+        self._shaking = False
+        self._tilted = None
+        self._temperature_above = None
+        self._humidity_above = None
+        logger.info(f"An event detector was initialized.")
+
+    # class specific methods
+    def update(self, data:dict)->list:
+        """
+        Method that takes a reading and returns a (possibly empty) list of event dicts.
+        Keys follow the SenseHatSensor data conventions.
+        """
+        events = []
+        # epoch time of the reading, so the event lines up with the sample that triggered it
+        timestamp = data.get('timestamp', round(time(), 3))
+        acc = data.get('acceleration')
+        # skip motion detectors until every axis has been read at least once
+        if acc is not None and None not in acc.values():
+            magnitude = sqrt(acc['x']**2 + acc['y']**2 + acc['z']**2)
+            if self._shake_threshold is not None:
+                shaking = magnitude >= self._shake_threshold
+                if shaking and not self._shaking:
+                    events.append(self.__event(EventDetector.SHAKE, EventDetector.DETECTED, magnitude, timestamp))
+                self._shaking = shaking
+            if self._tilt_angle is not None and magnitude > 0:
+                # angle between the acceleration vector and the z axis of the board
+                angle = degrees(acos(max(-1.0, min(1.0, acc['z'] / magnitude))))
+                tilted = angle >= self._tilt_angle
+                if self._tilted is not None and tilted != self._tilted:
+                    state = EventDetector.TILTED if tilted else EventDetector.LEVEL
+                    events.append(self.__event(EventDetector.TILT, state, angle, timestamp))
+                self._tilted = tilted
+        temperature = data.get('temperature', {}).get('from_humidity')
+        if temperature is not None and self._temperature_threshold is not None:
+            above = self.__crossing(temperature, self._temperature_above,
+                self._temperature_threshold, self._temperature_hysteresis)
+            if self._temperature_above is not None and above != self._temperature_above:
+                state = EventDetector.ABOVE if above else EventDetector.BELOW
+                events.append(self.__event(EventDetector.TEMPERATURE, state, temperature, timestamp))
+            self._temperature_above = above
+        humidity = data.get('humidity')
+        if humidity is not None and self._humidity_threshold is not None:
+            above = self.__crossing(humidity, self._humidity_above,
+                self._humidity_threshold, self._humidity_hysteresis)
+            if self._humidity_above is not None and above != self._humidity_above:
+                state = EventDetector.ABOVE if above else EventDetector.BELOW
+                events.append(self.__event(EventDetector.HUMIDITY, state, humidity, timestamp))
+            self._humidity_above = above
+        return events
+
+    @staticmethod
+    def __crossing(value:float, above:bool, threshold:float, hysteresis:float)->bool:
+        # go above at the threshold but only go back below at threshold - hysteresis
+        if above:
+            return value > threshold - hysteresis
+        return value >= threshold
+
+    @staticmethod
+    def __event(name:str, state:str, value:float, timestamp:float)->dict:
+        logger.info(f"Detected a '{name}' event with state '{state}' and value '{value:.4f}'.")
+        return {
+            EventDetector.EVENT : name,
+            EventDetector.STATE : state,
+            EventDetector.VALUE : round(value, 4),
+            EventDetector.TIME : asctime(),
+            EventDetector.TIMESTAMP : timestamp
+        }
@@ -0,0 +1,231 @@
+"""
+Module that contains an on-device gesture recognizer for the joystick.
+The recognizer is fed with the raw joystick events (see SenseHatJoystick.poll()) and returns
+the gestures they resolve, so that they can be published right away.
+"""
+
+# local imports
+from src.constants import constants as const
+from src.errors import errors as err
+from src.utils import validate as val
+# external imports
+import logging
+from collections import deque
+from time import asctime
+
+# start a loggin instance for this module using constants
+logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+class GestureRecognizer():
+    """
+    Class that generates a joystick gesture recognizer with the following gestures:
+    - long_hold: a direction held down for 'hold_time' seconds, returned while it is still held;
+    - double_press: two presses of the same direction, the second one starting at most
+      'double_press_window' seconds after the first one was released;
+    - sequence: one of 'sequences' (e.g., ['up', 'up', 'down']), each press starting at most
+      'sequence_window' seconds after the previous one was released.
+    Timing comes from the timestamps of the events, not from when they are read, so slow polling
+    delays gestures but does not change them. A gesture that is also the start of a sequence
+    (e.g., a double press of 'up' with an 'up-up-down' sequence) is only resolved once the
+    sequence window passes without the next press. The latency of a gesture is the time from
+    the moment it was resolved (a release, the end of a window or the hold time) until update()
+    returned it.
+    """
+    # gesture payload keys convention
+    GESTURE = 'gesture'
+    DIRECTION = 'direction'
+    DIRECTIONS = 'directions'
+    TIME = 'time'
+    TIMESTAMP = 'timestamp'
+    LATENCY = 'latency_ms'
+    # gesture names
+    LONG_HOLD = 'long_hold'
+    DOUBLE_PRESS = 'double_press'
+    SEQUENCE = 'sequence'
+    GESTURES = [LONG_HOLD, DOUBLE_PRESS, SEQUENCE]
+    # joystick directions and actions (same values as the sense_hat API)
+    JOYSTICK_DIRECTIONS = ['up', 'down', 'left', 'right', 'middle']
+    PRESSED = 'pressed'
+    RELEASED = 'released'
+    # latencies kept per gesture for stats()
+    LATENCIES = 100
+
+    def __init__(self, double_press_window:float = 0.4, hold_time:float = 1.0, sequence_window:float = 0.6,
+                sequences:list = None):
+        for value, name in [(double_press_window, 'double_press_window'), (hold_time, 'hold_time'), (sequence_window, 'sequence_window')]:
+            if not val.timeout(value):
+                logger.info(f"The gesture window '{name}' must be greater than 0, not '{value}'.")
+                raise err.InvalidAnalyticsAttr(f"The gesture window '{name}' is invalid.", name)
+        for sequence in sequences or []:
+            if len(sequence) < 2 or any(d not in GestureRecognizer.JOYSTICK_DIRECTIONS for d in sequence):
+                logger.info(f"The gesture sequence '{sequence}' needs at least two of '{GestureRecognizer.JOYSTICK_DIRECTIONS}'.")
+                raise err.InvalidAnalyticsAttr(f"The gesture sequence '{sequence}' is invalid.", 'sequences')
+        self._double_press_window = double_press_window
+        self._hold_time = hold_time
+        self._sequence_window = sequence_window
+        self._sequences = [tuple(sequence) for sequence in sequences or []]
+        # direction held down and the timestamp of its press; None if the joystick is released
+        self._pressed = None
+        # whether the current press already was a long hold
+        self._held = False
+        # (direction, pressed, released) presses that may still become a gesture and when they stop being one
+        self._taps = []
+        self._deadline = None
+        self._latencies = {gesture: deque(maxlen=GestureRecognizer.LATENCIES) for gesture in GestureRecognizer.GESTURES}
+        self._counts = dict.fromkeys(GestureRecognizer.GESTURES, 0)
+        logger.info(f"A gesture recognizer with '{len(self._sequences)}' sequences was initialized.")
+
+    @property
+    def sequences(self):
+        return [list(sequence) for sequence in self._sequences]
+
+    # class specific methods
+    def update(self, events:list, now:float)->list:
+        """
+        Method that takes the joystick events (with 'timestamp', 'direction' and 'action'
+        attributes) read since the last call and the current epoch time 'now', and returns
+        a (possibly empty) list of gesture dicts, oldest first.
+        """
+        gestures = []
+        for event in events:
+            # a window that closed before this event resolves its presses first
+            self.__expire(event.timestamp, now, gestures)
+            if event.action == GestureRecognizer.PRESSED:
+                self.__press(event.direction, event.timestamp, now, gestures)
+                self._pressed = (event.direction, event.timestamp)
+                self._held = False
+            elif event.action == GestureRecognizer.RELEASED and self._pressed:
+                direction, pressed = self._pressed
+                self._pressed = None
+                if self._held:
+                    continue
+                if event.timestamp - pressed >= self._hold_time:
+                    # the hold time passed between two reads
+                    self.__long_hold(direction, pressed, now, gestures)
+                else:
+                    self.__tap(direction, pressed, event.timestamp, now, gestures)
+            # repeated 'held' events are not needed, because the hold time is checked against 'now'
+        self.__expire(now, now, gestures)
+        if self._pressed and not self._held and now - self._pressed[1] >= self._hold_time:
+            self.__long_hold(self._pressed[0], self._pressed[1], now, gestures)
+            self._held = True
+        return gestures
+
+    def next_deadline(self)->float:
+        """
+        Method that returns the epoch time at which update() may resolve a gesture without new
+        events (i.e., the end of a window or of the hold time) or None if there is none, so that
+        callers can read the joystick again right then.
+        """
+        if self._pressed:
+            # windows do not close while a direction is held (see __expire()), only the hold time does
+            return None if self._held else self._pressed[1] + self._hold_time
+        return self._deadline
+
+    def stats(self)->dict:
+        """
+        Method that returns the number of gestures and their latencies (median and maximum of
+        the latest ones, in milliseconds) by gesture.
+        """
+        stats = {}
+        for gesture, latencies in self._latencies.items():
+            ordered = sorted(latencies)
+            stats[gesture] = {
+                'count': self._counts[gesture],
+                'latency_p50_ms': round(ordered[len(ordered) // 2] * 1000, 1) if ordered else None,
+                'latency_max_ms': round(ordered[-1] * 1000, 1) if ordered else None,
+            }
+        return stats
+
+    def __press(self, direction:str, pressed:float, now:float, gestures:list):
+        # a press that cannot continue the previous presses resolves them right away, instead of on its release
+        if not self._taps:
+            return
+        match, extendable = self.__match(self._taps + [(direction, pressed, pressed)])
+        previous = self.__match(self._taps)[0]
+        if previous and not (match or extendable):
+            gestures.append(self.__gesture(previous, self._taps, pressed, now))
+            self.__set_taps([])
+
+    def __tap(self, direction:str, pressed:float, released:float, now:float, gestures:list):
+        taps = self._taps + [(direction, pressed, released)]
+        match, extendable = self.__match(taps)
+        if not (match or extendable):
+            # the previous presses were a gesture unless this press continued them
+            previous = self.__match(self._taps)[0]
+            if previous:
+                gestures.append(self.__gesture(previous, self._taps, pressed, now))
+                taps = taps[-1:]
+                match, extendable = self.__match(taps)
+            # or a later part of them may start one
+            while not (match or extendable):
+                taps = taps[1:]
+                match, extendable = self.__match(taps)
+        if match and not extendable:
+            gestures.append(self.__gesture(match, taps, released, now))
+            taps = []
+        self.__set_taps(taps)
+
+    def __long_hold(self, direction:str, pressed:float, now:float, gestures:list):
+        resolved = pressed + self._hold_time
+        # the hold ends the presses before it, which could have been continued by this press until now
+        previous = self.__match(self._taps)[0]
+        if previous:
+            gestures.append(self.__gesture(previous, self._taps, resolved, now))
+        self.__set_taps([])
+        gestures.append(self.__gesture(GestureRecognizer.LONG_HOLD, [(direction, pressed, resolved)], resolved, now))
+
+    def __expire(self, timestamp:float, now:float, gestures:list):
+        if self._deadline is None or timestamp <= self._deadline or self._pressed:
+            return
+        match = self.__match(self._taps)[0]
+        if match:
+            gestures.append(self.__gesture(match, self._taps, self._deadline, now))
+        self.__set_taps([])
+
+    def __set_taps(self, taps:list):
+        self._taps = taps
+        self._deadline = None
+        if taps:
+            window = 0.0
+            if len(taps) == 1:
+                window = self._double_press_window
+            if self.__extends_sequence(tuple(t[0] for t in taps)):
+                window = max(window, self._sequence_window)
+            self._deadline = taps[-1][2] + window
+
+    def __match(self, taps:list)->tuple:
+        # returns the gesture that the presses make (or None) and whether they may become a longer one
+        if not taps:
+            return None, False
+        directions = tuple(t[0] for t in taps)
+        gaps = [taps[i][1] - taps[i - 1][2] for i in range(1, len(taps))]
+        in_window = all(gap <= self._sequence_window for gap in gaps)
+        match = None
+        if in_window and directions in self._sequences:
+            match = GestureRecognizer.SEQUENCE
+        elif len(taps) == 2 and directions[0] == directions[1] and gaps[0] <= self._double_press_window:
+            match = GestureRecognizer.DOUBLE_PRESS
+        extendable = len(taps) == 1 or (in_window and self.__extends_sequence(directions))
+        return match, extendable
+
+    def __extends_sequence(self, directions:tuple)->bool:
+        return any(len(s) > len(directions) and s[:len(directions)] == directions for s in self._sequences)
+
+    def __gesture(self, name:str, taps:list, resolved:float, now:float)->dict:
+        latency = max(0.0, now - resolved)
+        self._latencies[name].append(latency)
+        self._counts[name] += 1
+        directions = [t[0] for t in taps]
+        logger.info(f"Detected a '{name}' gesture '{'-'.join(directions)}' after '{latency * 1000:.1f}' ms.")
+        return {
+            GestureRecognizer.GESTURE : name,
+            GestureRecognizer.DIRECTION : directions[-1],
+            GestureRecognizer.DIRECTIONS : directions,
+            GestureRecognizer.TIME : asctime(),
+            GestureRecognizer.TIMESTAMP : round(resolved, 3),
+            GestureRecognizer.LATENCY : round(latency * 1000, 1),
+        }
@@ -0,0 +1,202 @@
+"""
+Module that contains an on-device orientation fusion filter.
+The filter is fed with batches of raw IMU samples (see SenseHatSensor.imu_values()) taken at
+a high rate and returns the fused orientation, which is published at a much lower rate.
+"""
+
+# local imports
+from src.constants import constants as const
+from src.errors import errors as err
+# external imports
+import logging
+from math import asin, atan2, cos, degrees, sin, sqrt
+from time import asctime, thread_time, time
+
+# start a loggin instance for this module using constants
+logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+class OrientationFilter():
+    """
+    Class that generates a Madgwick (MARG) orientation filter.
+    Gyroscope rates (radians/second) are integrated into a quaternion and, every sample, a
+    gradient descent step of size 'beta' pulls it towards the orientation given by gravity
+    (accelerometer) and magnetic north (magnetometer). Without a magnetometer reading, only
+    roll and pitch are corrected. The quaternion starts (and restarts after a gap longer than
+    'max_gap' seconds) from the accelerometer and magnetometer alone, so it does not need to converge.
+    Samples are (monotonic time, ax, ay, az, gx, gy, gz, mx, my, mz) tuples.
+    """
+    # orientation payload keys convention
+    TIME = 'time'
+    TIMESTAMP = 'timestamp'
+    ROLL = 'roll'
+    PITCH = 'pitch'
+    YAW = 'yaw'
+    QUATERNION = 'quaternion'
+    SAMPLES = 'samples'
+    CPU = 'cpu_us'
+    # maximum number of samples to hold before fusing them as a batch
+    BATCH = 250
+
+    def __init__(self, beta:float = 0.1, max_gap:float = 1.0, rounding:int = 4):
+        if beta < 0:
+            logger.info(f"The filter gain (beta) '{beta}' cannot be negative.")
+            raise err.InvalidAnalyticsAttr(f"The filter gain (beta) '{beta}' is invalid.", 'beta')
+        if max_gap <= 0:
+            logger.info(f"The maximum gap '{max_gap}' must be greater than 0.")
+            raise err.InvalidAnalyticsAttr(f"The maximum gap '{max_gap}' is invalid.", 'max_gap')
+        self._beta = beta
+        self._max_gap = max_gap
+        self._rounding = rounding
+        # orientation quaternion (w, x, y, z) and monotonic time of the last fused sample; None until the first one
+        self._q = None
+        self._last = None
+        # samples fused and their CPU time since the last orientation_data()
+        self._samples = 0
+        self._cpu = 0.0
+        logger.info(f"An orientation filter with a gain (beta) of '{beta}' was initialized.")
+
+    @property
+    def beta(self):
+        return self._beta
+    @beta.setter
+    def beta(self, beta:float):
+        if beta < 0:
+            logger.info(f"The filter gain (beta) '{beta}' cannot be negative.")
+            raise err.InvalidAnalyticsAttr(f"The filter gain (beta) '{beta}' is invalid.", 'beta')
+        self._beta = beta
+
+    @property
+    def quaternion(self):
+        return self._q
+
+    # class specific methods
+    def update(self, samples:list)->tuple:
+        """
+        Method that fuses a batch of samples, oldest first, and returns the (roll, pitch, yaw)
+        in degrees after the last of them (None if there is no orientation yet).
+        """
+        started = thread_time()
+        beta, max_gap = self._beta, self._max_gap
+        q, last = self._q, self._last
+        for sample in samples:
+            if q is None or sample[0] - last > max_gap:
+                q = OrientationFilter.__initial(*sample[1:])
+            else:
+                q = OrientationFilter.__step(q, sample[0] - last, beta, *sample[1:])
+            last = sample[0]
+        self._q, self._last = q, last
+        self._samples += len(samples)
+        self._cpu += thread_time() - started
+        return self.euler()
+
+    def euler(self)->tuple:
+        """
+        Method that returns the current (roll, pitch, yaw) in degrees; the yaw is a 0-360 heading.
+        """
+        if self._q is None:
+            return None
+        w, x, y, z = self._q
+        roll = degrees(atan2(w * x + y * z, 0.5 - x * x - y * y))
+        pitch = degrees(asin(max(-1.0, min(1.0, -2.0 * (x * z - w * y)))))
+        yaw = degrees(atan2(x * y + w * z, 0.5 - y * y - z * z)) % 360
+        return roll, pitch, yaw
+
+    def orientation_data(self)->dict:
+        """
+        Method that returns the current orientation and the mean CPU time (in microseconds)
+        per fused sample since the last call.
+        """
+        euler = self.euler() or (None, None, None)
+        data = {
+            OrientationFilter.TIME : asctime(),
+            OrientationFilter.TIMESTAMP : round(time(), 3),
+            OrientationFilter.ROLL : self.__round(euler[0]),
+            OrientationFilter.PITCH : self.__round(euler[1]),
+            OrientationFilter.YAW : self.__round(euler[2]),
+            OrientationFilter.QUATERNION : [self.__round(c) for c in self._q] if self._q else None,
+            OrientationFilter.SAMPLES : self._samples,
+            OrientationFilter.CPU : round(self._cpu / self._samples * 1e6, 1) if self._samples else None,
+        }
+        self._samples, self._cpu = 0, 0.0
+        return data
+
+    def __round(self, value:float):
+        return None if value is None else round(value, self._rounding)
+
+    @staticmethod
+    def __initial(ax:float, ay:float, az:float, gx:float, gy:float, gz:float, mx:float, my:float, mz:float)->tuple:
+        # roll and pitch from gravity and a tilt-compensated heading from the magnetic field
+        roll = atan2(ay, az)
+        pitch = atan2(-ax, sqrt(ay * ay + az * az))
+        yaw = 0.0
+        if mx or my or mz:
+            north = mx * cos(pitch) + (my * sin(roll) + mz * cos(roll)) * sin(pitch)
+            east = my * cos(roll) - mz * sin(roll)
+            yaw = atan2(-east, north)
+        cr, sr = cos(roll / 2), sin(roll / 2)
+        cp, sp = cos(pitch / 2), sin(pitch / 2)
+        cy, sy = cos(yaw / 2), sin(yaw / 2)
+        return (cr * cp * cy + sr * sp * sy, sr * cp * cy - cr * sp * sy,
+            cr * sp * cy + sr * cp * sy, cr * cp * sy - sr * sp * cy)
+
+    @staticmethod
+    def __step(q:tuple, dt:float, beta:float,
+                ax:float, ay:float, az:float, gx:float, gy:float, gz:float, mx:float, my:float, mz:float)->tuple:
+        # S. Madgwick, "An efficient orientation filter for inertial and inertial/magnetic sensor arrays", 2010
+        q0, q1, q2, q3 = q
+        # rate of change of the quaternion from the gyroscope
+        qd0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+        qd1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+        qd2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+        qd3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+        norm = sqrt(ax * ax + ay * ay + az * az)
+        # free fall (or a missing reading) leaves the gyroscope alone
+        if norm:
+            ax, ay, az = ax / norm, ay / norm, az / norm
+            q0q0, q1q1, q2q2, q3q3 = q0 * q0, q1 * q1, q2 * q2, q3 * q3
+            norm = sqrt(mx * mx + my * my + mz * mz)
+            if norm:
+                # gradient of the gravity and magnetic field errors
+                mx, my, mz = mx / norm, my / norm, mz / norm
+                q0q1, q0q2, q0q3 = q0 * q1, q0 * q2, q0 * q3
+                q1q2, q1q3, q2q3 = q1 * q2, q1 * q3, q2 * q3
+                # direction of the magnetic field in the earth frame, without its east component
+                hx = (mx * q0q0 - 2 * q0 * my * q3 + 2 * q0 * mz * q2 + mx * q1q1 + 2 * q1 * my * q2
+                    + 2 * q1 * mz * q3 - mx * q2q2 - mx * q3q3)
+                hy = (2 * q0 * mx * q3 + my * q0q0 - 2 * q0 * mz * q1 + 2 * q1 * mx * q2 - my * q1q1
+                    + my * q2q2 + 2 * q2 * mz * q3 - my * q3q3)
+                bx2 = sqrt(hx * hx + hy * hy) * 2
+                bz2 = (-2 * q0 * mx * q2 + 2 * q0 * my * q1 + mz * q0q0 + 2 * q1 * mx * q3 - mz * q1q1
+                    + 2 * q2 * my * q3 - mz * q2q2 + mz * q3q3) * 2
+                # errors of the estimated gravity (fx, fy, fz) and magnetic field (ex, ey, ez)
+                fx = 2 * (q1q3 - q0q2) - ax
+                fy = 2 * (q0q1 + q2q3) - ay
+                fz = 1 - 2 * (q1q1 + q2q2) - az
+                ex = bx2 * (0.5 - q2q2 - q3q3) + bz2 * (q1q3 - q0q2) - mx
+                ey = bx2 * (q1q2 - q0q3) + bz2 * (q0q1 + q2q3) - my
+                ez = bx2 * (q0q2 + q1q3) + bz2 * (0.5 - q1q1 - q2q2) - mz
+                s0 = (-2 * q2 * fx + 2 * q1 * fy - bz2 * q2 * ex + (-bx2 * q3 + bz2 * q1) * ey + bx2 * q2 * ez)
+                s1 = (2 * q3 * fx + 2 * q0 * fy - 4 * q1 * fz + bz2 * q3 * ex + (bx2 * q2 + bz2 * q0) * ey
+                    + (bx2 * q3 - 2 * bz2 * q1) * ez)
+                s2 = (-2 * q0 * fx + 2 * q3 * fy - 4 * q2 * fz + (-2 * bx2 * q2 - bz2 * q0) * ex
+                    + (bx2 * q1 + bz2 * q3) * ey + (bx2 * q0 - 2 * bz2 * q2) * ez)
+                s3 = (2 * q1 * fx + 2 * q2 * fy + (-2 * bx2 * q3 + bz2 * q1) * ex + (-bx2 * q0 + bz2 * q2) * ey
+                    + bx2 * q1 * ez)
+            else:
+                # gradient of the gravity error only
+                s0 = 4 * q0 * q2q2 + 2 * q2 * ax + 4 * q0 * q1q1 - 2 * q1 * ay
+                s1 = 4 * q1 * q3q3 - 2 * q3 * ax + 4 * q0q0 * q1 - 2 * q0 * ay - 4 * q1 + 8 * q1 * q1q1 + 8 * q1 * q2q2 + 4 * q1 * az
+                s2 = 4 * q0q0 * q2 + 2 * q0 * ax + 4 * q2 * q3q3 - 2 * q3 * ay - 4 * q2 + 8 * q2 * q1q1 + 8 * q2 * q2q2 + 4 * q2 * az
+                s3 = 4 * q1q1 * q3 - 2 * q1 * ax + 4 * q2q2 * q3 - 2 * q2 * ay
+            norm = sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+            if norm:
+                qd0 -= beta * s0 / norm
+                qd1 -= beta * s1 / norm
+                qd2 -= beta * s2 / norm
+                qd3 -= beta * s3 / norm
+        q0, q1, q2, q3 = q0 + qd0 * dt, q1 + qd1 * dt, q2 + qd2 * dt, q3 + qd3 * dt
+        norm = sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+        return q0 / norm, q1 / norm, q2 / norm, q3 / norm
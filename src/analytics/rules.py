@@ -0,0 +1,178 @@
+"""
+Module that contains an on-device rules engine that maps sensor conditions and joystick
+directions to LED commands, so that local feedback does not depend on a broker round trip.
+Rules are loaded from a JSON file (see 'rules.json.example').
+"""
+
+# local imports
+from src.constants import constants as const
+from src.errors import errors as err
+from src.sensehat.sensehat import SenseHatSensor
+# external imports
+import logging
+import json
+from numbers import Number
+
+# start a loggin instance for this module using constants
+logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+class RulesEngine():
+    """
+    Class that generates a rules engine.
+    Each rule has a 'when' condition on a single input, namely a sensor value such as
+    {"sensor": "humidity", "above": 60} or a joystick direction such as {"joystick": "middle"},
+    and lists of LED commands in the {'method': [*args]} format of the 'led/cmd' subtopic.
+    Rules are indexed by their input and an update only evaluates the rules of the inputs whose
+    value changed. Sensor rules are edge triggered: 'then' runs when the condition becomes true
+    (or is true on the first reading) and 'else', if any, when it stops being true. Joystick
+    rules run 'then' on every matching direction.
+    """
+    # rule keys convention
+    NAME = 'name'
+    WHEN = 'when'
+    THEN = 'then'
+    ELSE = 'else'
+    # condition keys convention
+    SENSOR = 'sensor'
+    JOYSTICK = 'joystick'
+    ABOVE = 'above'
+    BELOW = 'below'
+    BETWEEN = 'between'
+    HYSTERESIS = 'hysteresis'
+    # joystick direction that matches every direction
+    ANY = 'any'
+    # sensor inputs (e.g., 'temperature.from_humidity') by their index in SenseHatSensor.sensors_values()
+    PATHS = {field if isinstance(field, str) else '.'.join(field): index
+        for index, field in enumerate(SenseHatSensor.FIELDS) if index > 1}
+
+    def __init__(self, rules:list):
+        self._rules = [self.__check(rule, i) for i, rule in enumerate(rules)]
+        # rule indexes by input
+        self._sensor_rules = {}
+        self._joystick_rules = []
+        for i, rule in enumerate(self._rules):
+            condition = rule[RulesEngine.WHEN]
+            if RulesEngine.SENSOR in condition:
+                self._sensor_rules.setdefault(condition[RulesEngine.SENSOR], []).append(i)
+            else:
+                self._joystick_rules.append(i)
+        # last value of each sensor input and state of each sensor rule; None until the first reading
+        self._values = dict.fromkeys(self._sensor_rules)
+        self._states = [None] * len(self._rules)
+        logger.info(f"A rules engine with '{len(self._rules)}' rule(s) was initialized.")
+
+    @property
+    def rules(self):
+        return self._rules
+
+    @property
+    def inputs(self):
+        return list(self._sensor_rules) + ([RulesEngine.JOYSTICK] if self._joystick_rules else [])
+
+    # class specific methods
+    @staticmethod
+    def load(path:str)->'RulesEngine':
+        """
+        Method that returns a rules engine with the list of rules in the JSON file 'path'.
+        """
+        try:
+            with open(path, 'r') as rules_file:
+                rules = json.load(rules_file)
+        except (OSError, ValueError) as lerr:
+            logger.info(f"Unable to load rules from '{path}': '{lerr}'.")
+            raise err.InvalidAnalyticsAttr(f"Unable to load rules from '{path}'.", 'rules')
+        if not isinstance(rules, list):
+            logger.info(f"The rules file '{path}' does not contain a list.")
+            raise err.InvalidAnalyticsAttr(f"The rules file '{path}' does not contain a list.", 'rules')
+        return RulesEngine(rules)
+
+    def update(self, values:tuple)->list:
+        """
+        Method that takes a SenseHatSensor.sensors_values() tuple and returns the (possibly empty)
+        list of LED commands of the rules whose state changed.
+        """
+        triggered = []
+        for path, indexes in self._sensor_rules.items():
+            value = values[RulesEngine.PATHS[path]]
+            # unread values and values that did not change do not evaluate any rule
+            if value is None or value == self._values[path]:
+                continue
+            self._values[path] = value
+            for i in indexes:
+                state = self.__evaluate(self._rules[i][RulesEngine.WHEN], value, self._states[i])
+                if state != self._states[i]:
+                    if state or self._states[i] is not None:
+                        triggered.append((i, state))
+                    self._states[i] = state
+        commands = []
+        # rules run in file order, whatever input triggered them
+        for i, state in sorted(triggered):
+            rule = self._rules[i]
+            logger.info(f"The rule '{rule[RulesEngine.NAME]}' is now '{state}'.")
+            commands.extend(rule[RulesEngine.THEN] if state else rule.get(RulesEngine.ELSE, []))
+        return commands
+
+    def joystick(self, direction:str)->list:
+        """
+        Method that takes a joystick direction and returns the LED commands of the matching rules.
+        """
+        commands = []
+        for i in self._joystick_rules:
+            rule = self._rules[i]
+            if rule[RulesEngine.WHEN][RulesEngine.JOYSTICK] in [direction, RulesEngine.ANY]:
+                logger.info(f"The rule '{rule[RulesEngine.NAME]}' matched the direction '{direction}'.")
+                commands.extend(rule[RulesEngine.THEN])
+        return commands
+
+    @staticmethod
+    def __evaluate(condition:dict, value:float, state:bool)->bool:
+        hysteresis = condition.get(RulesEngine.HYSTERESIS, 0.0)
+        # become true at the threshold but only become false again past the hysteresis
+        if RulesEngine.ABOVE in condition:
+            return value > condition[RulesEngine.ABOVE] - hysteresis if state else value >= condition[RulesEngine.ABOVE]
+        if RulesEngine.BELOW in condition:
+            return value < condition[RulesEngine.BELOW] + hysteresis if state else value <= condition[RulesEngine.BELOW]
+        # between is half-open and, after the first reading, the range widens by the hysteresis
+        # while true and narrows by it while false, so adjacent ranges (e.g., the levels of a
+        # gauge) hand over at the same values and never overlap
+        low, high = condition[RulesEngine.BETWEEN]
+        margin = 0.0 if state is None else hysteresis if state else -hysteresis
+        return low - margin <= value < high + margin
+
+    @staticmethod
+    def __check(rule:dict, index:int)->dict:
+        def invalid(message:str):
+            logger.info(f"The rule '{index}' is invalid: {message}")
+            raise err.InvalidAnalyticsAttr(f"The rule '{index}' is invalid: {message}", 'rules')
+        if not isinstance(rule, dict):
+            invalid("it is not a dictionary.")
+        rule = dict(rule)
+        rule.setdefault(RulesEngine.NAME, str(index))
+        condition = rule.get(RulesEngine.WHEN)
+        if not isinstance(condition, dict) or (RulesEngine.SENSOR in condition) == (RulesEngine.JOYSTICK in condition):
+            invalid(f"'{RulesEngine.WHEN}' needs either a '{RulesEngine.SENSOR}' or a '{RulesEngine.JOYSTICK}' input.")
+        if RulesEngine.SENSOR in condition:
+            if condition[RulesEngine.SENSOR] not in RulesEngine.PATHS:
+                invalid(f"the sensor '{condition[RulesEngine.SENSOR]}' is not one of '{list(RulesEngine.PATHS)}'.")
+            tests = [key for key in [RulesEngine.ABOVE, RulesEngine.BELOW, RulesEngine.BETWEEN] if key in condition]
+            if len(tests) != 1:
+                invalid(f"a sensor condition needs one of '{RulesEngine.ABOVE}', '{RulesEngine.BELOW}' or '{RulesEngine.BETWEEN}'.")
+            limits = condition[tests[0]] if tests[0] == RulesEngine.BETWEEN else [condition[tests[0]]]
+            if (not isinstance(limits, list) or len(limits) != (2 if tests[0] == RulesEngine.BETWEEN else 1)
+                or not all(isinstance(limit, Number) for limit in limits) or sorted(limits) != limits):
+                invalid(f"the limits of '{tests[0]}' are not valid numbers.")
+            hysteresis = condition.get(RulesEngine.HYSTERESIS, 0.0)
+            if not isinstance(hysteresis, Number) or hysteresis < 0:
+                invalid(f"the '{RulesEngine.HYSTERESIS}' must be a non-negative number.")
+        elif not isinstance(condition[RulesEngine.JOYSTICK], str):
+            invalid(f"the '{RulesEngine.JOYSTICK}' direction is not a string.")
+        for key in [RulesEngine.THEN, RulesEngine.ELSE]:
+            if key == RulesEngine.ELSE and key not in rule:
+                continue
+            commands = rule.get(key)
+            if not isinstance(commands, list) or not all(isinstance(cmd, dict) for cmd in commands):
+                invalid(f"'{key}' is not a list of {{'method': [*args]}} commands.")
+        return rule
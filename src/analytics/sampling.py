@@ -0,0 +1,126 @@
+"""
+Module that contains an adaptive sampling controller for the sensor publishing loop.
+The controller looks at consecutive sensor readings and switches between an idle
+and an active resolution depending on the detected activity.
+"""
+
+# local imports
+from src.constants import constants as const
+from src.errors import errors as err
+from src.sensehat.sensehat import SenseHatSensor
+# external imports
+import logging
+from math import sqrt
+from time import monotonic
+
+# start a loggin instance for this module using constants
+logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+class AdaptiveSampler():
+    """
+    Class that generates an adaptive sampling controller.
+    Motion is the largest of the gyroscope magnitude and the change in the acceleration
+    vector between two readings. Change is the fastest rate (units per minute) among
+    temperature, humidity and pressure. Once either score reaches its 'up' threshold,
+    the controller switches to the active resolution and only goes back to the idle
+    resolution when both scores are at or below their 'down' thresholds.
+    """
+    # class state conventions
+    IDLE = 'idle'
+    ACTIVE = 'active'
+    STATES = [IDLE, ACTIVE]
+    # indexes of the values used by the sampler in SenseHatSensor.sensors_values()
+    GYROSCOPE = [SenseHatSensor.FIELDS.index((SenseHatSensor.GYROSCOPE, axis))
+        for axis in (SenseHatSensor.GYROSCOPE_01, SenseHatSensor.GYROSCOPE_02, SenseHatSensor.GYROSCOPE_03)]
+    ACCELERATION = [SenseHatSensor.FIELDS.index((SenseHatSensor.ACCELERATION, axis))
+        for axis in (SenseHatSensor.ACCELERATION_01, SenseHatSensor.ACCELERATION_02, SenseHatSensor.ACCELERATION_03)]
+    CHANGE = [SenseHatSensor.FIELDS.index(field) for field in ((SenseHatSensor.TEMPERATURE, SenseHatSensor.TEMPERATURE_01),
+        SenseHatSensor.HUMIDITY, SenseHatSensor.PRESSURE)]
+
+    def __init__(self,
+                idle_resolution:float,
+                active_resolution:float,
+                motion_up:float,
+                motion_down:float,
+                change_up:float,
+                change_down:float):
+        if not 0 <= active_resolution <= idle_resolution:
+            logger.info(f"The active resolution '{active_resolution}' must be between 0 and the idle resolution '{idle_resolution}'.")
+            raise err.InvalidAnalyticsAttr(f"The active resolution '{active_resolution}' is invalid.", 'active_resolution')
+        if not 0 <= motion_down <= motion_up:
+            logger.info(f"The motion thresholds (up '{motion_up}', down '{motion_down}') are invalid.")
+            raise err.InvalidAnalyticsAttr(f"The motion thresholds are invalid.", 'motion_down')
+        if not 0 <= change_down <= change_up:
+            logger.info(f"The change thresholds (up '{change_up}', down '{change_down}') are invalid.")
+            raise err.InvalidAnalyticsAttr(f"The change thresholds are invalid.", 'change_down')
+        self._idle_resolution = idle_resolution
+        self._active_resolution = active_resolution
+        self._motion_up = motion_up
+        self._motion_down = motion_down
+        self._change_up = change_up
+        self._change_down = change_down
+        # helpers
+        self._state = AdaptiveSampler.IDLE
+        self._previous = None
+        self._previous_time = None
+        self._motion = 0.0
+        self._change = 0.0
+        logger.info(f"An adaptive sampler with resolutions idle '{idle_resolution}' and active '{active_resolution}' was initialized.")
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def resolution(self):
+        return self._active_resolution if self._state == AdaptiveSampler.ACTIVE else self._idle_resolution
+
+    @property
+    def motion(self):
+        return self._motion
+
+    @property
+    def change(self):
+        return self._change
+
+    # class specific methods
+    def update(self, values:tuple)->float:
+        """
+        Method that takes a reading from SenseHatSensor.sensors_values(), updates the
+        activity state and returns the resolution (in seconds) to wait before the next reading.
+        """
+        now = monotonic()
+        self._motion = self.__motion_score(values)
+        self._change = self.__change_score(values, now)
+        # only the reading tuple is kept, never a nested structure
+        self._previous = values
+        self._previous_time = now
+        if self._state == AdaptiveSampler.IDLE:
+            if self._motion >= self._motion_up or self._change >= self._change_up:
+                self._state = AdaptiveSampler.ACTIVE
+                logger.info(f"Activity detected (motion '{self._motion:.4f}', change '{self._change:.4f}'). Sampling every '{self.resolution}' seconds.")
+        elif self._motion <= self._motion_down and self._change <= self._change_down:
+            self._state = AdaptiveSampler.IDLE
+            logger.info(f"Readings are quiet again. Sampling every '{self.resolution}' seconds.")
+        logger.debug(f"Sampler state '{self._state}' (motion '{self._motion:.4f}', change '{self._change:.4f}').")
+        return self.resolution
+
+    def __motion_score(self, values:tuple)->float:
+        # values never read are None
+        gyro = [values[i] for i in AdaptiveSampler.GYROSCOPE if values[i] is not None]
+        score = sqrt(sum(v**2 for v in gyro))
+        if self._previous is not None:
+            deltas = [values[i] - self._previous[i] for i in AdaptiveSampler.ACCELERATION
+                if values[i] is not None and self._previous[i] is not None]
+            score = max(score, sqrt(sum(d**2 for d in deltas)))
+        return score
+
+    def __change_score(self, values:tuple, now:float)->float:
+        if self._previous is None or now <= self._previous_time:
+            return 0.0
+        minutes = (now - self._previous_time) / 60
+        return max((abs(values[i] - self._previous[i]) / minutes for i in AdaptiveSampler.CHANGE
+            if values[i] is not None and self._previous[i] is not None), default=0.0)
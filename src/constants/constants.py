@@ -21,6 +21,19 @@ LOG_LEVEL = 'INFO'
 SENSEHAT_EMULATION = False
 
 # MQTT
-# TODO: after adding support for TLS, add 'mqtts' and 'wss' here
 # list of supported protocols/schema
-MQTT_PROTOCOLS = ['mqtt', 'ws', 'tcp']
+MQTT_PROTOCOLS = ['mqtt', 'ws', 'tcp', 'mqtts', 'wss']
+# protocols/schema that connect over TLS
+MQTT_TLS_PROTOCOLS = ['mqtts', 'wss']
+# default port of each protocol/schema, if the broker address has none
+MQTT_PORTS = {'mqtt': 1883, 'tcp': 1883, 'ws': 80, 'mqtts': 8883, 'wss': 443}
+# list of supported MQTT protocol versions; '3.1.1' is the default and the fallback of '5'
+MQTT_PROTOCOL_VERSIONS = ['3.1.1', '5']
+# version of the JSON payloads, sent as the 'schema' user property with MQTT v5
+MQTT_SCHEMA_VERSION = '1'
+# list of policies for bounded command queues (see src/mqtt/flow.py)
+MQTT_QUEUE_POLICIES = ['drop_oldest', 'drop_newest', 'latest_wins']
+# list of MQTT quality of service levels
+MQTT_QOS_LEVELS = [0, 1, 2]
+# list of payload encodings of extra brokers (see src/mqtt/fanout.py)
+MQTT_ENCODINGS = ['json', 'zdict']
@@ -0,0 +1 @@
+from src.diagnostics.diagnostics import *
@@ -0,0 +1,306 @@
+"""
+Module that contains on-demand diagnostics of the running process: time-boxed cProfile runs
+of the streaming loops and tracemalloc snapshots of memory allocations. Results are
+summarized (top functions or allocation sites) and compressed to be published over MQTT.
+"""
+
+# local imports
+from src.constants import constants as const
+from src.errors import errors as err
+# external imports
+import logging
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+import zlib
+from time import asctime, monotonic, time
+
+# start a loggin instance for this module using constants
+logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+class Diagnostics():
+    """
+    Class that generates a diagnostics runner.
+    Commands are dicts such as {"token": "...", "method": "profile", "duration": 10} and are
+    only run if their token matches the configured one. Only one command runs at a time.
+    From Python 3.12, a single cProfile profiler covers every thread, so a profile includes all
+    of them. Before that, cProfile only profiles the thread that enables it, so every loop that
+    should be profiled calls checkpoint() once per iteration: loops that do not iterate during a
+    run are not profiled and are reported as 'absent'. Each loop also disables its own profiler
+    and hands it over at its first checkpoint after the run; loops that do not do so within
+    HANDOVER seconds are reported as 'missing'.
+    """
+    # command payload keys convention
+    TOKEN = 'token'
+    METHOD = 'method'
+    DURATION = 'duration'
+    TOP = 'top'
+    SORT = 'sort'
+    # command methods
+    PROFILE = 'profile'
+    MEMORY = 'memory'
+    METHODS = [PROFILE, MEMORY]
+    # pstats sort keys allowed in profile commands
+    SORTS = ['cumulative', 'tottime', 'calls']
+    # number of frames kept per allocation by tracemalloc
+    FRAMES = 5
+    # time (in seconds) the loops have to hand over their profiles after a run
+    HANDOVER = 5.0
+    # whether a profiler enabled in one thread profiles all of them (cProfile on sys.monitoring)
+    PROCESS_WIDE = sys.version_info >= (3, 12)
+
+    def __init__(self, token:str, max_duration:float = 60.0, top:int = 20, event:threading.Event = None):
+        self.configure(token, max_duration, top)
+        # setting 'event' (e.g., on exit) ends a running command early
+        self._event = event if event is not None else threading.Event()
+        # helpers
+        self._busy = threading.Lock()
+        # generation of the running profile (None if there is none) and of the one being collected
+        self._generation = 0
+        self._profiling = None
+        self._collecting = None
+        # threads that profile the collected run and the stats they handed over, by thread name
+        self._pending = set()
+        self._collected = {}
+        self._handed = threading.Condition()
+        # names of the threads that ever called checkpoint()
+        self._loops = set()
+        # (generation, profile) of each thread
+        self._local = threading.local()
+        # paths are reported relative to the project root
+        self._root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) + os.sep
+
+    @property
+    def max_duration(self):
+        return self._max_duration
+
+    @property
+    def top(self):
+        return self._top
+
+    @property
+    def is_running(self):
+        return self._busy.locked()
+
+    # class specific methods
+    def configure(self, token:str, max_duration:float, top:int):
+        """
+        Method that (re)sets the token and limits of commands; a running command is not affected.
+        """
+        if not token:
+            logger.info("Diagnostics require a token.")
+            raise err.InvalidDiagnosticsAttr("Diagnostics require a token.", 'token')
+        if max_duration <= 0 or top <= 0:
+            logger.info(f"The max duration '{max_duration}' and top '{top}' must be positive.")
+            raise err.InvalidDiagnosticsAttr("The max duration and top must be positive.", 'max_duration')
+        self._token = token
+        self._max_duration = max_duration
+        self._top = top
+
+    def checkpoint(self):
+        """
+        Method that the profiled loops call once per iteration. It only checks two attributes
+        unless a profile starts or ends, in which case this thread's profiler is enabled, or
+        disabled and handed over to the run it belongs to.
+        """
+        if Diagnostics.PROCESS_WIDE:
+            return
+        if not getattr(self._local, 'known', False):
+            self._local.known = True
+            with self._handed:
+                self._loops.add(threading.current_thread().name)
+        generation = self._profiling
+        local = getattr(self._local, 'profile', None)
+        if local is not None and local[0] != generation:
+            # the run of this profile is over (maybe a new one started since)
+            self._local.profile = None
+            local[1].disable()
+            self.__hand_over(*local)
+            local = None
+        if generation is not None and local is None:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # another profiler is active (e.g., a process-wide one that already covers this thread)
+                return
+            self._local.profile = (generation, profile)
+            with self._handed:
+                if generation == self._collecting:
+                    self._pending.add(threading.current_thread().name)
+
+    def run(self, command:dict)->dict:
+        """
+        Method that checks and runs a command, blocking for its duration, and returns a summary.
+        """
+        if not isinstance(command, dict):
+            raise err.DiagnosticsCommandError("The command is not a dictionary.", 'command')
+        token = command.get(Diagnostics.TOKEN)
+        if not isinstance(token, str) or not hmac.compare_digest(token.encode('utf-8'), self._token.encode('utf-8')):
+            logger.warning("A diagnostics command with an invalid token was rejected.")
+            raise err.DiagnosticsCommandError("The token is invalid.", 'token')
+        method = command.get(Diagnostics.METHOD)
+        if method not in Diagnostics.METHODS:
+            raise err.DiagnosticsCommandError(f"The method '{method}' is not supported.", 'method')
+        try:
+            duration = min(float(command.get(Diagnostics.DURATION, 10)), self.max_duration)
+            top = min(int(command.get(Diagnostics.TOP, self.top)), self.top)
+        except (TypeError, ValueError):
+            raise err.DiagnosticsCommandError("The duration and top must be numbers.", 'duration')
+        if duration <= 0 or top <= 0:
+            raise err.DiagnosticsCommandError("The duration and top must be positive.", 'duration')
+        sort = command.get(Diagnostics.SORT, Diagnostics.SORTS[0])
+        if sort not in Diagnostics.SORTS:
+            raise err.DiagnosticsCommandError(f"The sort key '{sort}' is not supported.", 'sort')
+        if not self._busy.acquire(blocking=False):
+            raise err.DiagnosticsCommandError("Another diagnostics command is running.", 'busy')
+        try:
+            logger.info(f"Running diagnostics '{method}' for '{duration}' seconds.")
+            summary = {
+                Diagnostics.METHOD: method,
+                'time': asctime(),
+                'timestamp': round(time(), 3),
+                Diagnostics.DURATION: duration,
+            }
+            if method == Diagnostics.PROFILE:
+                summary.update(self.__profile(duration, top, sort))
+            else:
+                summary.update(self.__memory(duration, top))
+            return summary
+        finally:
+            self._busy.release()
+
+    @staticmethod
+    def compress(summary:dict)->bytes:
+        """
+        Method that returns a summary as zlib-compressed JSON.
+        """
+        return zlib.compress(json.dumps(summary, separators=(',', ':')).encode('utf-8'), 9)
+
+    def __site(self, filename:str, lineno:int)->str:
+        if filename.startswith(self._root):
+            filename = filename[len(self._root):]
+        return f"{filename}:{lineno}"
+
+    def __hand_over(self, generation:int, profile:cProfile.Profile):
+        # called by the thread of the (disabled) profile, so its stats are not read while it runs
+        try:
+            stats = pstats.Stats(profile)
+        except TypeError:
+            # nothing was profiled
+            stats = None
+        name = threading.current_thread().name
+        with self._handed:
+            if generation != self._collecting:
+                # handed over too late for its run
+                return
+            if stats is not None:
+                self._collected[name] = stats
+            self._pending.discard(name)
+            self._handed.notify_all()
+
+    def __profile(self, duration:float, top:int, sort:str)->dict:
+        if Diagnostics.PROCESS_WIDE:
+            stats, threads, missing, absent = self.__profile_process(duration)
+        else:
+            stats, threads, missing, absent = self.__profile_loops(duration)
+        functions = []
+        if stats is not None:
+            stats.sort_stats(sort)
+            for function in stats.fcn_list[:top]:
+                _, calls, tottime, cumtime, _ = stats.stats[function]
+                filename, lineno, name = function
+                functions.append({
+                    'function': name,
+                    'site': self.__site(filename, lineno),
+                    'calls': calls,
+                    'tottime': round(tottime, 6),
+                    'cumtime': round(cumtime, 6),
+                })
+        return {'threads': threads, 'missing': missing, 'absent': absent, Diagnostics.SORT: sort, 'functions': functions}
+
+    def __profile_process(self, duration:float)->tuple:
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            raise err.DiagnosticsCommandError("Another profiler is active.", 'busy')
+        started = monotonic()
+        try:
+            self._event.wait(duration)
+        finally:
+            profile.disable()
+        threads = sorted(t.name for t in threading.enumerate())
+        logger.info(f"Profiled all threads for '{monotonic() - started:.1f}' seconds.")
+        try:
+            return pstats.Stats(profile), threads, [], []
+        except TypeError:
+            # nothing was profiled
+            return None, threads, [], []
+
+    def __profile_loops(self, duration:float)->tuple:
+        with self._handed:
+            self._generation += 1
+            self._collecting = self._generation
+            self._pending = set()
+            self._collected = {}
+        self._profiling = self._generation
+        started = monotonic()
+        self._event.wait(duration)
+        self._profiling = None
+        elapsed = monotonic() - started
+        # the loops disable and hand over their profiles on their next checkpoint
+        with self._handed:
+            self._handed.wait_for(lambda: not self._pending, 0 if self._event.is_set() else Diagnostics.HANDOVER)
+            self._collecting = None
+            collected, missing = self._collected, sorted(self._pending)
+        threads = sorted(collected)
+        stats = None
+        for name in threads:
+            if stats is None:
+                stats = collected[name]
+            else:
+                stats.add(collected[name])
+        # loops that checked in before, but not during this run
+        with self._handed:
+            absent = sorted(self._loops - set(threads) - set(missing))
+        logger.info(f"Profiled threads '{threads}' for '{elapsed:.1f}' seconds.")
+        if missing:
+            logger.info(f"The threads '{missing}' did not hand over their profiles in time.")
+        if absent:
+            logger.info(f"The threads '{absent}' did not check in during the profile.")
+        return stats, threads, missing, absent
+
+    def __memory(self, duration:float, top:int)->dict:
+        # keep tracing if something else started it
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(Diagnostics.FRAMES)
+        try:
+            baseline = tracemalloc.take_snapshot()
+            self._event.wait(duration)
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started:
+                tracemalloc.stop()
+        # allocation sites sorted by growth during the run
+        sites = []
+        for stat in snapshot.compare_to(baseline, 'lineno')[:top]:
+            frame = stat.traceback[0]
+            sites.append({
+                'site': self.__site(frame.filename, frame.lineno),
+                'size': stat.size,
+                'size_diff': stat.size_diff,
+                'count': stat.count,
+                'count_diff': stat.count_diff,
+            })
+        return {'traced_current': current, 'traced_peak': peak, 'sites': sites}
@@ -40,6 +40,20 @@ class InvalidSenseAttr(InvalidAttribute):
     def __init__(self, message: str, attribute: str):
         super().__init__(message, attribute)
 
+# ANALYTICS errors
+class InvalidAnalyticsAttr(InvalidAttribute):
+    def __init__(self, message: str, attribute: str):
+        super().__init__(message, attribute)
+
+# DIAGNOSTICS errors
+class InvalidDiagnosticsAttr(InvalidAttribute):
+    def __init__(self, message: str, attribute: str):
+        super().__init__(message, attribute)
+
+class DiagnosticsCommandError(MethodError):
+    def __init__(self, message: str, error: str):
+        super().__init__(message, error)
+
 # CONFIGURATION errors
 class InvalidConfigAttr(InvalidAttribute):
     def __init__(self, message: str, attribute: str):
@@ -1 +1,5 @@
-from src.mqtt.mqtt import *
\ No newline at end of file
+from src.mqtt.mqtt import *
+from src.mqtt.flow import *
+from src.mqtt.reconnect import *
+from src.mqtt.tls import *
+from src.mqtt.fanout import *
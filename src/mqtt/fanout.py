@@ -0,0 +1,223 @@
+"""
+Module that contains the fan-out of payloads to extra brokers, e.g., a central aggregation
+broker next to the local one. Every extra broker has its own client, bounded queue and thread,
+so a slow or unreachable broker only fills its own queue and never delays the others.
+"""
+
+# local imports
+from src.constants import constants as const
+from src.errors import errors as err
+from src.utils import validate as val
+from src.mqtt.mqtt import MqttClient, MqttClientPub
+from src.mqtt.reconnect import ReconnectManager
+from src.mqtt.tls import TlsContext
+# external imports
+import logging
+from collections import deque
+from threading import Event, Lock, Thread
+
+# start a loggin instance for this module using constants
+logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+class BrokerTarget():
+    """
+    Class that generates an extra broker with its own QoS, topic prefix, encoding and bounded
+    queue. Messages wait in the queue while the broker is unreachable (the oldest are dropped
+    first when it is full) and a thread of its own publishes them, oldest first, once connected.
+    Topics are the ones of the main broker (e.g., 'zone/room/client_name/sensor/status') after
+    the optional prefix.
+    """
+    # class encoding conventions
+    JSON = 'json'
+    ZDICT = 'zdict'
+    ENCODINGS = const.MQTT_ENCODINGS
+    # seconds between checks of the connection while the queue is idle
+    IDLE = 1.0
+
+    def __init__(self,
+                name:str,
+                broker_address:str,
+                zone:str,
+                room:str,
+                client_name:str,
+                user:str = None,
+                password:str = None,
+                qos:int = 0,
+                prefix:str = '',
+                encoding:str = JSON,
+                queue_size:int = 1000,
+                reconnect:ReconnectManager = None,
+                protocol_version:str = '3.1.1',
+                message_expiry:int = 0,
+                tls:TlsContext = None):
+        if not val.qos(qos):
+            logger.info(f"The QoS '{qos}' of the broker '{name}' is not one of '{const.MQTT_QOS_LEVELS}'.")
+            raise err.InvalidMqttAttr(f"The QoS '{qos}' is invalid.", 'qos')
+        if not val.encoding(encoding):
+            logger.info(f"The encoding '{encoding}' of the broker '{name}' is not one of '{BrokerTarget.ENCODINGS}'.")
+            raise err.InvalidMqttAttr(f"The encoding '{encoding}' is invalid.", 'encoding')
+        if not val.queue_size(queue_size):
+            logger.info(f"The queue size of the broker '{name}' must be at least 1, not '{queue_size}'.")
+            raise err.InvalidMqttAttr(f"The queue size '{queue_size}' is invalid.", 'queue_size')
+        self._name = name
+        self._qos = qos
+        self._prefix = prefix.strip('/')
+        self._encoding = encoding
+        self._queue_size = queue_size
+        # (topic, payload, retain) messages waiting to be published
+        self._messages = deque()
+        self._lock = Lock()
+        self._wakeup = Event()
+        self._stop = Event()
+        self._topics = {}
+        # counters
+        self._published = 0
+        self._dropped = 0
+        self._dropping = False
+        client_id = f"{client_name}_{name}"
+        # the type is part of each topic instead, so a single client publishes all of them
+        self._client = MqttClientPub(broker_address=broker_address,
+            zone=zone,
+            room=room,
+            client_name=client_name,
+            type=None,
+            client_id=client_id,
+            user=user,
+            password=password,
+            reconnect=reconnect if reconnect is not None else ReconnectManager(client_id),
+            protocol_version=protocol_version,
+            message_expiry=message_expiry,
+            tls=tls)
+        self._thread = Thread(target=self.__run, name=f"broker_{name}", daemon=True)
+        self._thread.start()
+        logger.info(f"An extra broker '{name}' ('{self._client.broker_url.hostname}') with QoS '{qos}' and encoding '{encoding}' was initialized.")
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def qos(self):
+        return self._qos
+
+    @property
+    def prefix(self):
+        return self._prefix
+
+    @property
+    def encoding(self):
+        return self._encoding
+
+    @property
+    def client(self):
+        return self._client
+
+    @property
+    def is_connected(self):
+        return self._client.is_connected
+
+    # class specific methods
+    def topic(self, type:str)->str:
+        topic = self._topics.get(type)
+        if topic is None:
+            topic = self._topics[type] = '/'.join(t for t in [self._prefix, self._client.topic, type, MqttClient.STATUS] if t)
+        return topic
+
+    def put(self, type:str, payload:bytes, retain:bool = True):
+        """
+        Method that queues a payload (already in this broker's encoding) to the STATUS topic of 'type'.
+        It never blocks on the network.
+        """
+        with self._lock:
+            if len(self._messages) >= self._queue_size:
+                self._messages.popleft()
+                self.__drop()
+            self._messages.append((self.topic(type), payload, retain))
+        self._wakeup.set()
+
+    def stats(self)->dict:
+        with self._lock:
+            return {'connected': self.is_connected, 'queued': len(self._messages),
+                'published': self._published, 'dropped': self._dropped}
+
+    def disable(self):
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join(timeout=2)
+        if self._client.is_enabled:
+            self._client.disable()
+
+    def __drop(self):
+        # called with the lock
+        self._dropped += 1
+        if not self._dropping:
+            self._dropping = True
+            logger.info(f"The queue of the broker '{self._name}' is full, so its oldest messages are dropped.")
+
+    def __run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(BrokerTarget.IDLE)
+            self._wakeup.clear()
+            # paho keeps QoS 1 and 2 messages until they are acknowledged, so bound its queue too;
+            # its client is recreated on a fallback to MQTT 3.1.1, hence on every pass
+            self._client.client.max_queued_messages_set(self._queue_size)
+            while self._client.is_connected and not self._stop.is_set():
+                with self._lock:
+                    if not self._messages:
+                        self._dropping = False
+                        break
+                    message = self._messages.popleft()
+                if not self._client.publish_topic(message[0], message[1], qos=self._qos, retain=message[2]):
+                    # retry later, unless newer messages filled the queue in the meantime
+                    with self._lock:
+                        if len(self._messages) < self._queue_size:
+                            self._messages.appendleft(message)
+                        else:
+                            self.__drop()
+                    break
+                self._published += 1
+
+class Fanout():
+    """
+    Class that generates the fan-out of payloads to several BrokerTarget objects. Callers
+    serialize a payload once; it is encoded once per encoding that the brokers use (e.g., with
+    a PayloadCompressor for 'zdict'), and all the brokers share the same bytes.
+    """
+    def __init__(self, targets:list, compressor = None):
+        if compressor is None and any(t.encoding == BrokerTarget.ZDICT for t in targets):
+            logger.info(f"The '{BrokerTarget.ZDICT}' encoding needs a compressor.")
+            raise err.InvalidMqttAttr(f"The '{BrokerTarget.ZDICT}' encoding needs a compressor.", 'encoding')
+        self._targets = targets
+        self._compressor = compressor
+
+    @property
+    def targets(self):
+        return self._targets
+
+    # class specific methods
+    def publish(self, type:str, payload:bytes, retain:bool = True):
+        """
+        Method that queues a serialized payload to the STATUS topic of 'type' on every broker.
+        """
+        encoded = {}
+        for target in self._targets:
+            data = encoded.get(target.encoding)
+            if data is None:
+                data = encoded[target.encoding] = self.__encode(payload, target.encoding)
+            target.put(type, data, retain)
+
+    def stats(self)->dict:
+        return {target.name: target.stats() for target in self._targets}
+
+    def disable(self):
+        for target in self._targets:
+            target.disable()
+
+    def __encode(self, payload:bytes, encoding:str)->bytes:
+        if encoding == BrokerTarget.ZDICT:
+            # a batch of one, so consumers decode it like the history batches
+            return self._compressor.compress([payload])
+        return payload
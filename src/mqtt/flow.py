@@ -0,0 +1,192 @@
+"""
+Module that contains flow control helpers for MQTT messages, namely a compact record of
+received messages, a token bucket rate limiter and the bounded command queue of subscribers.
+"""
+# local imports
+from src.constants import constants as const
+from src.errors import errors as err
+# external imports
+import logging
+import json
+from collections import deque
+from threading import Lock
+from time import monotonic
+
+# start a loggin instance for this module using constants
+logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+class QueuedMessage():
+    """
+    Class that generates the record of a received message that waits in a subscriber's queue.
+    It only keeps what consumers use, i.e., the payload and the 'publisher' user property of
+    MQTT v5 messages (None otherwise), instead of the whole paho message.
+    """
+    __slots__ = ('payload', 'publisher')
+
+    def __init__(self, payload:bytes, publisher:str = None):
+        self.payload = payload
+        self.publisher = publisher
+
+    @staticmethod
+    def from_message(message)->'QueuedMessage':
+        publisher = None
+        properties = getattr(message, 'properties', None)
+        for key, value in getattr(properties, 'UserProperty', None) or []:
+            if key == 'publisher':
+                publisher = value
+                break
+        return QueuedMessage(message.payload, publisher)
+
+class TokenBucket():
+    """
+    Class that generates a token bucket that refills at 'rate' tokens per second up to 'burst' tokens.
+    """
+    __slots__ = ('_rate', '_burst', '_tokens', '_updated')
+
+    def __init__(self, rate:float, burst:float):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._updated = monotonic()
+
+    def consume(self, tokens:float = 1.0)->bool:
+        """
+        Method that takes 'tokens' from the bucket and returns True if there were enough of them.
+        """
+        now = monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+        if self._tokens < tokens:
+            return False
+        self._tokens -= tokens
+        return True
+
+class CommandQueue():
+    """
+    Class that generates a bounded, thread-safe queue of QueuedMessage records with the subset
+    of the queue.Queue interface used by MqttClient (put, get, empty, qsize); every subscriber
+    has one in its 'messages' attribute. When full, the policy decides what is dropped:
+    - drop_oldest: the oldest pending message is dropped to make room for the new one;
+    - drop_newest: the new message is dropped;
+    - latest_wins: like drop_oldest, but a new full-frame command (i.e., one that starts by
+      redrawing the whole matrix) also replaces every pending message.
+    Optionally, each publisher is rate limited with its own token bucket. MQTT 3.1.1 does not
+    tell who published a message, so publishers are told apart by the 'publisher' user property
+    (MQTT v5) and share a single bucket otherwise. Only the buckets of the latest MAX_PUBLISHERS
+    publishers are kept, so made-up publisher names cannot grow the queue's memory. Since senders
+    choose that property, every message also takes a token from a bucket shared by all of them,
+    which allows SHARED_PUBLISHERS times the rate and burst of a single publisher; a sender that
+    makes up new names for each message gets a fresh bucket each time but cannot get past it.
+    """
+    # class policy conventions
+    DROP_OLDEST = 'drop_oldest'
+    DROP_NEWEST = 'drop_newest'
+    LATEST_WINS = 'latest_wins'
+    POLICIES = const.MQTT_QUEUE_POLICIES
+    # LED methods that redraw the whole matrix
+    FULL_FRAME = ['clear', 'set_pixels', 'load_image', 'show_message', 'show_letter']
+    # key of the shared bucket
+    ANY_PUBLISHER = ''
+    # maximum number of publishers with their own bucket
+    MAX_PUBLISHERS = 32
+    # number of publishers at their full rate that the shared bucket allows at once
+    SHARED_PUBLISHERS = 4
+
+    def __init__(self, maxsize:int = 16, policy:str = DROP_OLDEST, rate:float = 0.0, burst:float = 1.0):
+        # helpers
+        self._items = deque()
+        self._lock = Lock()
+        self._counters = {'received': 0, 'dropped_oldest': 0, 'dropped_newest': 0, 'coalesced': 0, 'rate_limited': 0}
+        self.configure(maxsize, policy, rate, burst)
+
+    def configure(self, maxsize:int, policy:str, rate:float, burst:float):
+        """
+        Method that (re)sets the limits of the queue. Pending messages beyond a smaller
+        size are dropped from the oldest ones.
+        """
+        if maxsize < 1:
+            logger.info(f"The command queue size must be at least 1, not '{maxsize}'.")
+            raise err.InvalidMqttAttr(f"The command queue size '{maxsize}' is invalid.", 'queue_size')
+        if policy not in CommandQueue.POLICIES:
+            logger.info(f"The command queue policy '{policy}' is not one of '{CommandQueue.POLICIES}'.")
+            raise err.InvalidMqttAttr(f"The command queue policy '{policy}' is invalid.", 'queue_policy')
+        with self._lock:
+            self._maxsize = maxsize
+            self._policy = policy
+            # rate limiting is disabled when rate is 0
+            self._rate = rate
+            self._burst = burst
+            self._buckets = {}
+            self._shared = TokenBucket(rate * CommandQueue.SHARED_PUBLISHERS, burst * CommandQueue.SHARED_PUBLISHERS)
+            while len(self._items) > self._maxsize:
+                self._items.popleft()
+                self._counters['dropped_oldest'] += 1
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    @property
+    def policy(self):
+        return self._policy
+
+    @property
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    # queue.Queue interface
+    def put(self, message:QueuedMessage):
+        with self._lock:
+            self._counters['received'] += 1
+            if self._rate > 0 and not (self.__bucket(message).consume() and self._shared.consume()):
+                self._counters['rate_limited'] += 1
+                logger.debug(f"A message was rate limited ({self._counters['rate_limited']} so far).")
+                return
+            if self._policy == CommandQueue.LATEST_WINS and self._items and self.__is_full_frame(message):
+                self._counters['coalesced'] += len(self._items)
+                self._items.clear()
+                logger.debug(f"A full-frame command replaced pending ones ({self._counters['coalesced']} so far).")
+            if len(self._items) >= self._maxsize:
+                if self._policy == CommandQueue.DROP_NEWEST:
+                    self._counters['dropped_newest'] += 1
+                    logger.info(f"The command queue is full. Dropped the newest message ({self._counters['dropped_newest']} so far).")
+                    return
+                self._items.popleft()
+                self._counters['dropped_oldest'] += 1
+                logger.info(f"The command queue is full. Dropped the oldest message ({self._counters['dropped_oldest']} so far).")
+            self._items.append(message)
+
+    def get(self):
+        with self._lock:
+            return self._items.popleft()
+
+    def empty(self)->bool:
+        with self._lock:
+            return not self._items
+
+    def qsize(self)->int:
+        with self._lock:
+            return len(self._items)
+
+    def __bucket(self, message:QueuedMessage)->TokenBucket:
+        publisher = message.publisher or CommandQueue.ANY_PUBLISHER
+        if publisher not in self._buckets:
+            if len(self._buckets) >= CommandQueue.MAX_PUBLISHERS:
+                # dicts keep insertion order, so this forgets the publisher seen first
+                del self._buckets[next(iter(self._buckets))]
+            self._buckets[publisher] = TokenBucket(self._rate, self._burst)
+        return self._buckets[publisher]
+
+    @staticmethod
+    def __is_full_frame(message:QueuedMessage)->bool:
+        # payloads are lists of {'method' : [*args]} commands; see MqttClientSub
+        try:
+            payload = json.loads(message.payload)
+            return isinstance(payload, list) and isinstance(payload[0], dict) \
+                and next(iter(payload[0])) in CommandQueue.FULL_FRAME
+        except (ValueError, TypeError, IndexError, StopIteration):
+            return False
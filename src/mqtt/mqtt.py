@@ -6,14 +6,19 @@ This module is meant to be use in conjunction with the paho-mqtt package.
 from src.constants import constants as const
 from src.utils import validate as val
 from src.errors import errors as err
+from src.mqtt.reconnect import ReconnectManager
+from src.mqtt.flow import CommandQueue, QueuedMessage
+from src.mqtt.tls import TlsContext
 # external imports
 import logging
 from abc import ABC, abstractmethod
 from paho.mqtt import client as mqttc
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
 from urllib.parse import urlparse
+from threading import Lock, Thread, Timer
+from time import monotonic
 import json
-# message handling via queue
-from queue import Queue
 
 # start a loggin instance for this module using constants
 logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
@@ -31,13 +36,23 @@ class MqttClient(ABC):
     SENSOR = 'sensor'
     LED = 'led'
     JOYSTICK = 'joystick'
-    TYPES = [SENSOR, LED, JOYSTICK]
+    EVENTS = 'events'
+    DIAGNOSTICS = 'diagnostics'
+    WATCHDOG = 'watchdog'
+    ORIENTATION = 'orientation'
+    TYPES = [SENSOR, LED, JOYSTICK, EVENTS, DIAGNOSTICS, WATCHDOG, ORIENTATION]
     # valid payload names for each function; this is appended to the topic after type
     COMMAND = 'cmd'
     STATUS = 'status'
-    FUNCTIONS = [COMMAND, STATUS]
+    HISTORY = 'history'
+    FUNCTIONS = [COMMAND, STATUS, HISTORY]
+    # MQTT v5 reason code of a broker that only speaks 3.1.1
+    UNSUPPORTED_PROTOCOL_VERSION = 132
+    # maximum number of received messages waiting to be parsed (the oldest are dropped first)
+    MESSAGES = 16
 
-    def __init__(self, broker_address, zone, room, client_name, type, client_id, user, password):
+    def __init__(self, broker_address, zone, room, client_name, type, client_id, user, password, threaded=True, reconnect=None,
+                protocol_version='3.1.1', message_expiry=0, tls=None):
         # check broker_url first
         try:
             b_url = urlparse(broker_address)
@@ -48,6 +63,13 @@ class MqttClient(ABC):
         except ValueError as verr:
             logger.info(f"There was a value error parsing the address {broker_address}: '{verr.args}'")
             raise err.InvalidMqttAttr(f"Unable to parse the address {broker_address}: '{verr.args}'", 'broker_address')
+        if not val.protocol_version(protocol_version):
+            logger.info(f"The MQTT protocol version '{protocol_version}' is not supported.")
+            raise err.InvalidMqttAttr(f"The MQTT protocol version '{protocol_version}' is not supported.", 'protocol_version')
+        # clients that share a TLS context resume each other's TLS sessions; without one, verify the broker with the system CAs
+        self._tls = None
+        if self._broker_url.scheme in const.MQTT_TLS_PROTOCOLS:
+            self._tls = tls if tls is not None else TlsContext()
         self._zone = zone
         self._room = room
         self._client_name = client_name
@@ -55,6 +77,20 @@ class MqttClient(ABC):
         self._client_id = client_id
         self._user = user
         self._password = password
+        # if not threaded, the owner must drive the network loop via loop_socket() and loop_io()
+        self._threaded = threaded
+        self._needs_connect = False
+        self._connect_at = 0.0
+        self._startup_timer = None
+        # backoff, startup delay and statistics of (re)connections
+        self._reconnect = reconnect if reconnect is not None else ReconnectManager(client_id)
+        # MQTT v5 settings and the topic aliases (topic -> alias) of the current connection
+        self._protocol_version = protocol_version
+        self.message_expiry = message_expiry
+        self._topic_alias_maximum = 0
+        self._aliases = {}
+        self._aliases_lock = Lock()
+        self._fall_back = False
         # build topic from zone, room, client_name, and type
         topics = [t for t in [self._zone, self._room, self._client_name, self._type] if t]
         self._topic = "/".join(map(str, topics))
@@ -63,7 +99,7 @@ class MqttClient(ABC):
         # other common class object helpers
         self._is_enabled = False
         self._is_connected = False
-        self._messages = Queue()
+        self._messages = CommandQueue(maxsize=MqttClient.MESSAGES)
         # initialize connection procedure
         self.connect()
         # MQTT client object has been fully initialized
@@ -94,6 +130,10 @@ class MqttClient(ABC):
     @property
     def broker_url(self):
         return self._broker_url
+
+    @property
+    def tls(self):
+        return self._tls
     
     @property
     def client_name(self):
@@ -130,11 +170,38 @@ class MqttClient(ABC):
     def password(self):
         return self._password
 
+    @property
+    def reconnect(self):
+        return self._reconnect
+
+    @property
+    def protocol_version(self):
+        return self._protocol_version
+
+    @property
+    def is_v5(self):
+        return self._protocol_version == '5'
+
+    @property
+    def message_expiry(self):
+        return self._message_expiry
+    @message_expiry.setter
+    def message_expiry(self, expiry:int):
+        # applies from the next message
+        if not val.threshold(expiry):
+            logger.info(f"The message expiry '{expiry}' cannot be negative.")
+            raise err.InvalidMqttAttr(f"The message expiry '{expiry}' is invalid.", 'message_expiry')
+        self._message_expiry = expiry
+
+    @property
+    def topic_alias_maximum(self):
+        return self._topic_alias_maximum
+
     @property
     def messages(self):
         return self._messages
     @messages.setter
-    def messages(self, messages:Queue):
+    def messages(self, messages:CommandQueue):
         self._messages = messages
 
     @abstractmethod
@@ -147,9 +214,105 @@ class MqttClient(ABC):
 
     def on_message(self, client, userdata, message):
         # clients that parse messages should message.get() them if not messages.empty()
-        self.messages.put(message)
+        self.messages.put(QueuedMessage.from_message(message))
         logger.debug(f"The cliet/type '{self.client_name}/{self.type}' enqueued an encoded message.")
 
+    def on_connect_fail(self, client, userdata):
+        # paho calls this when a connection attempt fails, right before waiting to retry
+        logger.debug(f"The client/type '{self.client_name}/{self.type}' failed to connect to '{self.broker_url.hostname}'.")
+        self.reconnect.failed()
+        self.schedule_reconnect()
+
+    def connection_changed(self, rc:int, connected:bool):
+        """
+        Method that subclasses call from on_connect() and on_disconnect() to keep track of
+        connection states and to schedule reconnects with backoff.
+        """
+        if connected:
+            self.reconnect.connected()
+        elif rc != 0:
+            self.reconnect.disconnected(rc)
+            self.schedule_reconnect()
+
+    def schedule_reconnect(self):
+        """
+        Method that sets the delay before the next connection attempt from the reconnect manager
+        """
+        delay = self.reconnect.next_delay()
+        logger.debug(f"The client/type '{self.client_name}/{self.type}' will try to reconnect in '{delay:.3f}' seconds.")
+        if self._threaded:
+            # with equal min and max, paho waits exactly 'delay' before its next attempt
+            self.client.reconnect_delay_set(min_delay=delay, max_delay=delay)
+        else:
+            self._connect_at = monotonic() + delay
+
+    def on_connect_v5(self, client, userdata, flags, reason, properties=None):
+        # MQTT v5 callbacks get reason codes and properties; translate them for on_connect()
+        rc = getattr(reason, 'value', reason)
+        with self._aliases_lock:
+            self._aliases.clear()
+            self._topic_alias_maximum = getattr(properties, 'TopicAliasMaximum', 0) if properties else 0
+        self.on_connect(client, userdata, flags, rc)
+        if rc == MqttClient.UNSUPPORTED_PROTOCOL_VERSION:
+            self.fall_back()
+
+    def on_disconnect_v5(self, client, userdata, reason, properties=None):
+        with self._aliases_lock:
+            self._aliases.clear()
+        self.on_disconnect(client, userdata, getattr(reason, 'value', reason))
+
+    def on_subscribe_v5(self, client, userdata, mid, reasons, properties=None):
+        self.on_subscribe(client, userdata, mid, [getattr(r, 'value', r) for r in reasons])
+
+    def fall_back(self):
+        """
+        Method that replaces an MQTT v5 client with a 3.1.1 one, e.g., if the broker does not support v5
+        """
+        logger.info(f"The broker '{self.broker_url.hostname}' does not support MQTT v5, so the client/type '{self.client_name}/{self.type}' falls back to MQTT 3.1.1.")
+        self._protocol_version = '3.1.1'
+        if self._threaded:
+            # the paho loop thread calls this method, so it cannot stop itself
+            Thread(target=self.__recreate, daemon=True).start()
+        else:
+            self._fall_back = True
+
+    def __recreate(self):
+        self.disable()
+        self.connect()
+        self.is_enabled = True
+
+    def publish_args(self, topic:str):
+        """
+        Method that returns the topic and properties to publish to 'topic'. With MQTT v5, the topic
+        is replaced by an alias once the broker knows it, and the message expiry and schema version
+        are set as properties. With MQTT 3.1.1, it returns the topic and no properties.
+        """
+        if not self.is_v5:
+            return topic, None
+        properties = Properties(PacketTypes.PUBLISH)
+        properties.UserProperty = ('schema', const.MQTT_SCHEMA_VERSION)
+        if self.message_expiry:
+            properties.MessageExpiryInterval = self.message_expiry
+        with self._aliases_lock:
+            alias = self._aliases.get(topic)
+            if alias is not None:
+                # the broker already maps this alias to the topic
+                properties.TopicAlias = alias
+                return '', properties
+            if len(self._aliases) < self.topic_alias_maximum:
+                # set the alias along with the full topic once
+                alias = len(self._aliases) + 1
+                self._aliases[topic] = alias
+                properties.TopicAlias = alias
+        return topic, properties
+
+    def forget_alias(self, topic:str):
+        """
+        Method that drops the alias of 'topic', e.g., if the publish that would set it failed
+        """
+        with self._aliases_lock:
+            self._aliases.pop(topic, None)
+
     def on_log(client, userdata, level, buff):
         # only for logging purposes
         # log to our log file any log messages caught by paho.mqtt (e.g., exceptions)
@@ -166,31 +329,96 @@ class MqttClient(ABC):
     def connect(self):
         """
         Init helper to connect this object's client to its broker.
-        Beware that this method calls both connect_async() and loop_start(), so
-        cleanup is required afterwards--see disable().
+        Beware that this method calls both connect_async() and loop_start() (the latter after
+        the startup delay, if any), so cleanup is required afterwards--see disable().
         """
         # protocol selection
-        if self.broker_url.scheme == 'ws':
-            self.client = mqttc.Client(client_id=self.client_id, transport='websockets')
+        protocol = mqttc.MQTTv5 if self.is_v5 else mqttc.MQTTv311
+        if self.broker_url.scheme in ['ws', 'wss']:
+            self.client = mqttc.Client(client_id=self.client_id, transport='websockets', protocol=protocol)
         else:
             # assume default protocol
-            self.client = mqttc.Client(client_id=self.client_id)
+            self.client = mqttc.Client(client_id=self.client_id, protocol=protocol)
         # custom mqtt function references
-        self.client.on_connect = self.on_connect
-        self.client.on_disconnect = self.on_disconnect
+        if self.is_v5:
+            self.client.on_connect = self.on_connect_v5
+            self.client.on_disconnect = self.on_disconnect_v5
+            self.client.on_subscribe = self.on_subscribe_v5
+        else:
+            self.client.on_connect = self.on_connect
+            self.client.on_disconnect = self.on_disconnect
+            self.client.on_subscribe = self.on_subscribe
+        self.client.on_connect_fail = self.on_connect_fail
         self.client.on_message = self.on_message
         self.client.on_log = self.on_log
         self.client.on_publish = self.on_publish
-        self.client.on_subscribe = self.on_subscribe
-        # TODO: TLS support
+        # TLS handshakes use (and update) the session cache of the shared context
+        if self.tls is not None:
+            self.client.tls_set_context(self.tls)
         # credentials handling
         if self.user:
             self.client.username_pw_set(username=self.user, password=self.password)
         # connect to the broker in a non-blocking way
         self.client.connect_async(host=self.broker_url.hostname,
-                                port=self.broker_url.port,
+                                port=self.broker_url.port or const.MQTT_PORTS[self.broker_url.scheme],
                                 keepalive=30)
-        self.client.loop_start()
+        # optionally, spread the first connections of many clients over time
+        startup_delay = self.reconnect.startup_delay
+        if startup_delay:
+            logger.info(f"The client/type '{self.client_name}/{self.type}' will connect in '{startup_delay:.3f}' seconds.")
+        if self._threaded:
+            if startup_delay:
+                self._startup_timer = Timer(startup_delay, self.client.loop_start)
+                self._startup_timer.daemon = True
+                self._startup_timer.start()
+            else:
+                self.client.loop_start()
+        else:
+            self._needs_connect = True
+            self._connect_at = monotonic() + startup_delay
+
+    def loop_socket(self):
+        """
+        Method for non-threaded clients that connects to the broker if needed and returns the
+        socket to watch for reads in an external event loop (None if not connected).
+        """
+        if self._fall_back:
+            self._fall_back = False
+            self.__recreate()
+        if self._needs_connect:
+            if monotonic() < self._connect_at:
+                return None
+            try:
+                self.client.reconnect()
+            except OSError as oerr:
+                logger.debug(f"The client/type '{self.client_name}/{self.type}' could not connect: '{oerr}'.")
+                self.reconnect.failed()
+                self.schedule_reconnect()
+                return None
+            self._needs_connect = False
+        return self.client.socket()
+
+    def loop_io(self, readable:bool = True, misc:bool = True, max_reads:int = 1)->bool:
+        """
+        Method for non-threaded clients that reads up to 'max_reads' packets (if 'readable'),
+        writes pending packets and, if 'misc', handles keepalives (once a second is enough).
+        Returns False if the connection was lost (loop_socket() reconnects).
+        """
+        rc = mqttc.MQTT_ERR_SUCCESS
+        # paho reads a single QoS 0 packet per call and returns success once there's no data
+        for _ in range(max_reads if readable else 0):
+            rc = self.client.loop_read()
+            if rc != mqttc.MQTT_ERR_SUCCESS:
+                break
+        if rc == mqttc.MQTT_ERR_SUCCESS and self.client.want_write():
+            rc = self.client.loop_write()
+        if rc == mqttc.MQTT_ERR_SUCCESS and misc:
+            rc = self.client.loop_misc()
+        if rc != mqttc.MQTT_ERR_SUCCESS:
+            # paho already called on_disconnect(), which scheduled the reconnect
+            self._needs_connect = True
+            return False
+        return True
 
     def disable(self):
         """
@@ -200,8 +428,11 @@ class MqttClient(ABC):
         logger.debug(f"Received a call to disable the client and type '{self.client_name}/{self.type}'.")
         # disconnect and stop object's client
         if self.is_enabled:
+            if self._startup_timer is not None:
+                self._startup_timer.cancel()
             self.client.disconnect()
-            self.client.loop_stop()
+            if self._threaded:
+                self.client.loop_stop()
             self.is_enabled=False
 
 class MqttClientSub(MqttClient):
@@ -216,7 +447,12 @@ class MqttClientSub(MqttClient):
                 type:str,
                 client_id:str,
                 user:str = None,
-                password:str = None):
+                password:str = None,
+                threaded:bool = True,
+                reconnect:ReconnectManager = None,
+                protocol_version:str = '3.1.1',
+                message_expiry:int = 0,
+                tls:TlsContext = None):
         super().__init__(broker_address=broker_address,
                         zone=zone,
                         room=room,
@@ -224,7 +460,12 @@ class MqttClientSub(MqttClient):
                         type=type,
                         client_id=client_id,
                         user=user,
-                        password=password)
+                        password=password,
+                        threaded=threaded,
+                        reconnect=reconnect,
+                        protocol_version=protocol_version,
+                        message_expiry=message_expiry,
+                        tls=tls)
         # Subs subscribe to the COMMAND topic because they just need to parse commands to this client type
         self._full_topic = self.topic+'/'+MqttClient.COMMAND
 
@@ -239,22 +480,40 @@ class MqttClientSub(MqttClient):
         if rc == 0:
             # MQTT connected
             self.is_connected = True
+            self.connection_changed(rc, connected=True)
             logger.info(f"The client/type '{self.client_name}/{self.type}' connected successfully to '{self.broker_url.hostname}'.")
             self.client.subscribe(topic=self.full_topic, qos=0)
             logger.debug(f"Subscribed to topic '{self.full_topic}' from broker '{self.broker_url.hostname}'.")
         else:
             # Connection error
+            self.reconnect.failed(rc)
             logger.info(f"The client/type '{self.client_name}/{self.type}' got an error ({rc}) trying to connect to '{self.broker_url.hostname}'.")
 
     def on_disconnect(self, client, userdata, rc):
         if rc != 0:
             # MQTT disconnected
             self.is_connected = False
+            self.connection_changed(rc, connected=False)
             logger.info(f"The client/type '{self.client_name}/{self.type}' was disconnected from '{self.broker_url.hostname}'.")
             self.client.unsubscribe(topic=self.full_topic)
             logger.debug(f"Unsubscribed from topic '{self.full_topic}' from broker '{self.broker_url.hostname}'.")
     
     # class specific methods
+    def publish_status(self, payload:bytes, retain:bool=False)->None:
+        """
+        Method to publish a raw payload to the STATUS topic of this subscriber's type, e.g., to
+        report the result of a command received on its COMMAND topic.
+        """
+        topic, properties = self.publish_args(self.topic+'/'+MqttClient.STATUS)
+        info = self.client.publish(topic=topic,
+                            payload=payload,
+                            qos=0,
+                            retain=retain,
+                            properties=properties)
+        if info.rc != mqttc.MQTT_ERR_SUCCESS and topic:
+            self.forget_alias(topic)
+        logger.debug(f"A publish request to topic '{self.topic}/{MqttClient.STATUS}' was made by the subscriber '{self.client_name}/{self.type}'.")
+
     def decoded_message(self)->dict:
         """
         Method that decodes a message from this object's queue and returns a dict containig its contents
@@ -286,7 +545,12 @@ class MqttClientPub(MqttClient):
                 type:str,
                 client_id:str,
                 user:str = None,
-                password:str = None):
+                password:str = None,
+                threaded:bool = True,
+                reconnect:ReconnectManager = None,
+                protocol_version:str = '3.1.1',
+                message_expiry:int = 0,
+                tls:TlsContext = None):
         super().__init__(broker_address=broker_address,
                         zone=zone,
                         room=room,
@@ -294,7 +558,12 @@ class MqttClientPub(MqttClient):
                         type=type,
                         client_id=client_id,
                         user=user,
-                        password=password)
+                        password=password,
+                        threaded=threaded,
+                        reconnect=reconnect,
+                        protocol_version=protocol_version,
+                        message_expiry=message_expiry,
+                        tls=tls)
         # Pubs publish to the STATUS topic because they just need to set status to this client type
         self._full_topic = self.topic+'/'+MqttClient.STATUS
 
@@ -309,28 +578,76 @@ class MqttClientPub(MqttClient):
         if rc == 0:
             # MQTT connected
             self.is_connected = True
+            self.connection_changed(rc, connected=True)
             logger.info(f"The client/type '{self.client_name}/{self.type}' connected successfully to '{self.broker_url.hostname}'.")
         else:
             # Connection error
+            self.reconnect.failed(rc)
             logger.info(f"The client/type '{self.client_name}/{self.type}' got an error ({rc}) trying to connect to '{self.broker_url.hostname}'.")
 
     def on_disconnect(self, client, userdata, rc):
         if rc != 0:
             # MQTT disconnected
             self.is_connected = False
+            self.connection_changed(rc, connected=False)
             logger.info(f"The client/type '{self.client_name}/{self.type}' was disconnected from '{self.broker_url.hostname}'.")
 
     # class specific methods
-    def publish(self, data:dict)->None:
+    def publish(self, data:dict, retain:bool=True)->None:
         """
         Method to publish data in dict format to the MQTT broker.
         Make sure the topic is right for the data dict format and function is a string
         that indicates the last topic for this publisher (e.g., 'status' to publish
         sensor data; 'cmd' to publish a command that will be digested by a topic subscriber).
+        Set retain to False for one-off messages, such as events.
         """
         json_data = json.dumps(data)
-        self.client.publish(topic=self.full_topic,
-                            payload=json_data,
-                            qos=0,
-                            retain=True)
+        self.publish_raw(json_data, retain=retain)
         logger.debug(f"A publish request to topic '{self.full_topic}' was made to publish the following JSON data: {json_data}.")
+
+    def publish_raw(self, payload:bytes, retain:bool=True)->None:
+        """
+        Method to publish an already serialized payload (e.g., from SensorSerializer) as is.
+        paho copies the payload into its outgoing packet, so the caller may reuse it right away.
+        """
+        topic, properties = self.publish_args(self.full_topic)
+        info = self.client.publish(topic=topic,
+                            payload=payload,
+                            qos=0,
+                            retain=retain,
+                            properties=properties)
+        if info.rc != mqttc.MQTT_ERR_SUCCESS and topic:
+            self.forget_alias(topic)
+
+    def publish_history(self, payload:bytes)->bool:
+        """
+        Method to publish a batch of past payloads (e.g., from SensorHistory) to the HISTORY topic of
+        this publisher's type. Batches are sent with QoS 1, so paho resends them if the connection
+        drops before the broker has them. Returns False if paho did not accept the batch.
+        """
+        topic, properties = self.publish_args(self.topic+'/'+MqttClient.HISTORY)
+        info = self.client.publish(topic=topic,
+                            payload=payload,
+                            qos=1,
+                            retain=False,
+                            properties=properties)
+        if info.rc != mqttc.MQTT_ERR_SUCCESS and topic:
+            self.forget_alias(topic)
+        logger.debug(f"A publish request of a '{len(payload)}' bytes batch to topic '{self.topic}/{MqttClient.HISTORY}' was made.")
+        return info.rc == mqttc.MQTT_ERR_SUCCESS
+
+    def publish_topic(self, topic:str, payload:bytes, qos:int = 0, retain:bool = False)->bool:
+        """
+        Method to publish a payload to any 'topic', e.g., the prefixed topics of an extra broker.
+        Returns False if paho dropped it, i.e., QoS 0 while disconnected or a full queue. QoS 1
+        and 2 messages that could not be sent are kept by paho and sent after a reconnect.
+        """
+        alias_topic, properties = self.publish_args(topic)
+        info = self.client.publish(topic=alias_topic,
+                            payload=payload,
+                            qos=qos,
+                            retain=retain,
+                            properties=properties)
+        if info.rc != mqttc.MQTT_ERR_SUCCESS and alias_topic:
+            self.forget_alias(alias_topic)
+        return info.rc == mqttc.MQTT_ERR_SUCCESS or (qos > 0 and info.rc == mqttc.MQTT_ERR_NO_CONN)
@@ -0,0 +1,144 @@
+"""
+Module that contains a reconnect manager for MQTT clients, namely exponential backoff with
+full jitter, an optional startup delay spread by client id, and connection statistics.
+"""
+# local imports
+from src.constants import constants as const
+from src.errors import errors as err
+# external imports
+import logging
+import random
+from collections import deque
+from threading import Lock
+from time import monotonic, time
+from zlib import crc32
+
+# start a loggin instance for this module using constants
+logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+class ReconnectManager():
+    """
+    Class that generates a reconnect manager for a single MQTT client.
+    The n-th delay after losing a connection is a random value between 0 and
+    min(max_delay, min_delay * 2^n) ('full jitter'), so clients that lost their broker at the
+    same time do not come back at the same time. The startup delay is a fixed fraction of
+    'startup_delay' derived from the client id, which spreads first connections of a fleet.
+    """
+    # number of state changes kept in the history
+    HISTORY = 50
+    # number of the latest state changes in status payloads (see status())
+    RECENT = 5
+    # connection state conventions
+    CONNECTED = 'connected'
+    DISCONNECTED = 'disconnected'
+    FAILED = 'failed'
+
+    def __init__(self, client_id:str, min_delay:float = 1.0, max_delay:float = 120.0, startup_delay:float = 0.0):
+        self._client_id = client_id
+        # helpers
+        self._lock = Lock()
+        self._random = random.Random()
+        self._attempts = 0
+        self._ever_connected = False
+        self._lost_at = None
+        # statistics
+        self._state = None
+        self._history = deque(maxlen=ReconnectManager.HISTORY)
+        self._reconnects = 0
+        self._ttr_last = None
+        self._ttr_max = None
+        self._ttr_total = 0.0
+        self.configure(min_delay, max_delay, startup_delay)
+
+    def configure(self, min_delay:float, max_delay:float, startup_delay:float):
+        """
+        Method that (re)sets the delays. The next backoff uses the new ones; a startup delay
+        only applies to connections that were not started yet.
+        """
+        if not 0 < min_delay <= max_delay:
+            logger.info(f"The reconnect delays (min '{min_delay}', max '{max_delay}') are invalid.")
+            raise err.InvalidMqttAttr(f"The reconnect delays are invalid.", 'reconnect_min_delay')
+        if startup_delay < 0:
+            logger.info(f"The startup delay '{startup_delay}' cannot be negative.")
+            raise err.InvalidMqttAttr(f"The startup delay '{startup_delay}' is invalid.", 'startup_delay')
+        with self._lock:
+            self._min_delay = min_delay
+            self._max_delay = max_delay
+            self._startup_delay = startup_delay * crc32(self._client_id.encode('utf-8')) / 2**32
+
+    @property
+    def startup_delay(self):
+        return self._startup_delay
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def history(self):
+        """
+        List of the latest connection state changes as {'time', 'state', 'rc'} dicts
+        """
+        with self._lock:
+            return list(self._history)
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self._state,
+                'reconnects': self._reconnects,
+                'attempts': self._attempts,
+                'time_to_reconnect_last': self._ttr_last,
+                'time_to_reconnect_max': self._ttr_max,
+                'time_to_reconnect_mean': round(self._ttr_total / self._reconnects, 3) if self._reconnects else None,
+            }
+
+    # class specific methods
+    def status(self)->dict:
+        """
+        Method that returns the stats and the latest state changes in a single dict.
+        """
+        return dict(self.stats, history=self.history[-ReconnectManager.RECENT:])
+
+    def next_delay(self)->float:
+        """
+        Method that returns the time (in seconds) to wait before the next connection attempt.
+        """
+        with self._lock:
+            cap = min(self._max_delay, self._min_delay * 2**self._attempts)
+            self._attempts += 1
+            return self._random.uniform(0, cap)
+
+    def connected(self):
+        with self._lock:
+            self.__record(ReconnectManager.CONNECTED, 0)
+            if self._ever_connected and self._lost_at is not None:
+                ttr = round(monotonic() - self._lost_at, 3)
+                self._reconnects += 1
+                self._ttr_last = ttr
+                self._ttr_max = ttr if self._ttr_max is None else max(self._ttr_max, ttr)
+                self._ttr_total += ttr
+                logger.info(f"The client '{self._client_id}' reconnected after '{ttr}' seconds and '{self._attempts}' attempt(s).")
+            self._ever_connected = True
+            self._attempts = 0
+            self._lost_at = None
+
+    def disconnected(self, rc:int):
+        with self._lock:
+            self.__record(ReconnectManager.DISCONNECTED, rc)
+            if self._lost_at is None:
+                self._lost_at = monotonic()
+
+    def failed(self, rc:int = None):
+        with self._lock:
+            self.__record(ReconnectManager.FAILED, rc)
+            if self._lost_at is None:
+                self._lost_at = monotonic()
+
+    def __record(self, state:str, rc:int):
+        self._state = state
+        self._history.append({'time': round(time(), 3), 'state': state, 'rc': rc})
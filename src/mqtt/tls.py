@@ -0,0 +1,149 @@
+"""
+Module that contains the TLS context of MQTT clients that connect with 'mqtts' or 'wss'.
+The context caches the TLS session of each broker, so that reconnects (and the other clients
+of this device) resume it instead of doing a full handshake with certificate verification.
+"""
+
+# local imports
+from src.constants import constants as const
+from src.errors import errors as err
+from src.utils import validate as val
+# external imports
+import logging
+import ssl
+from threading import Lock
+
+# start a loggin instance for this module using constants
+logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+class TlsSocket(ssl.SSLSocket):
+    """
+    Class that generates the TLS sockets of a TlsContext.
+    With TLS 1.3, the session ticket arrives after the handshake, so the session is only
+    stored once it has a ticket, i.e., after the first reads (e.g., the CONNACK).
+    """
+    # reads after the handshake that may bring the session ticket
+    SESSION_READS = 4
+
+    def do_handshake(self, block:bool = False):
+        super().do_handshake(block)
+        self._session_reads = TlsSocket.SESSION_READS if self.context.handshake_done(self) else 0
+
+    def recv(self, buflen:int = 1024, flags:int = 0):
+        data = super().recv(buflen, flags)
+        if getattr(self, '_session_reads', 0):
+            self._session_reads = self._session_reads - 1 if self.context.save_session(self) else 0
+        return data
+
+class TlsContext(ssl.SSLContext):
+    """
+    Class that generates a client SSL context that keeps the last TLS session of each broker
+    (host, port) and offers it on the next connection. Sessions only resume with the context
+    that created them, so all the MQTT clients of a device must share one TlsContext.
+    """
+    # maximum number of brokers whose sessions are kept
+    SESSIONS = 8
+
+    def __init__(self, ca_certs:str = None, certfile:str = None, keyfile:str = None, insecure:bool = False,
+                cache:bool = True):
+        # SSLContext.__new__() gets the same arguments, so the protocol is fixed there
+        super().__init__()
+        for path_file, name in [(ca_certs, 'ca_certs'), (certfile, 'certfile'), (keyfile, 'keyfile')]:
+            if path_file and not val.file_exists(path_file):
+                logger.info(f"The file '{path_file}' of '{name}' does not exist.")
+                raise err.InvalidMqttAttr(f"The file '{path_file}' of '{name}' does not exist.", name)
+        if keyfile and not certfile:
+            logger.info("A client key needs a client certificate.")
+            raise err.InvalidMqttAttr("A client key needs a client certificate.", 'certfile')
+        try:
+            if ca_certs:
+                self.load_verify_locations(cafile=ca_certs)
+            else:
+                self.load_default_certs(ssl.Purpose.SERVER_AUTH)
+            if certfile:
+                self.load_cert_chain(certfile=certfile, keyfile=keyfile or None)
+        except ssl.SSLError as serr:
+            logger.info(f"Unable to load the TLS certificates: '{serr}'.")
+            raise err.InvalidMqttAttr(f"Unable to load the TLS certificates: '{serr}'.", 'certfile' if certfile else 'ca_certs')
+        if insecure:
+            # encrypt but do not verify the broker, e.g., for self-signed certificates on a LAN
+            self.check_hostname = False
+            self.verify_mode = ssl.CERT_NONE
+        self.sslsocket_class = TlsSocket
+        self._cache = cache
+        self._sessions = {}
+        self._lock = Lock()
+        # handshake counters
+        self._full = 0
+        self._resumed = 0
+
+    def __new__(cls, *args, **kwargs):
+        return super().__new__(cls, ssl.PROTOCOL_TLS_CLIENT)
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def full(self):
+        return self._full
+
+    @property
+    def resumed(self):
+        return self._resumed
+
+    # class specific methods
+    def wrap_socket(self, sock, server_side:bool = False, do_handshake_on_connect:bool = True,
+                    suppress_ragged_eofs:bool = True, server_hostname:str = None, session = None):
+        """
+        Method that wraps 'sock' and, if there is no 'session', offers the cached session of its broker.
+        """
+        if session is None and self._cache:
+            with self._lock:
+                session = self._sessions.get(self.__key(sock, server_hostname))
+        return super().wrap_socket(sock, server_side=server_side, do_handshake_on_connect=do_handshake_on_connect,
+            suppress_ragged_eofs=suppress_ragged_eofs, server_hostname=server_hostname, session=session)
+
+    def handshake_done(self, sock:TlsSocket)->bool:
+        """
+        Method that counts a finished handshake and returns whether its session must still be saved.
+        """
+        with self._lock:
+            if sock.session_reused:
+                self._resumed += 1
+            else:
+                self._full += 1
+        logger.debug(f"A TLS handshake with '{sock.server_hostname}' was {'resumed' if sock.session_reused else 'full'}.")
+        # a resumed session is saved again, in case the broker sent a new ticket with it
+        return self._cache and self.save_session(sock)
+
+    def save_session(self, sock:TlsSocket)->bool:
+        """
+        Method that caches the session of 'sock' and returns whether it must still be saved.
+        """
+        session = sock.session
+        # TLS 1.3 sessions are only resumable with a ticket; TLS 1.2 ones also with a session id
+        if session is None or (sock.version() == 'TLSv1.3' and not session.has_ticket):
+            return True
+        with self._lock:
+            key = self.__key(sock, sock.server_hostname)
+            self._sessions.pop(key, None)
+            if len(self._sessions) >= TlsContext.SESSIONS:
+                # forget the broker that was saved first
+                self._sessions.pop(next(iter(self._sessions)))
+            self._sessions[key] = session
+        return False
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    @staticmethod
+    def __key(sock, server_hostname:str)->tuple:
+        try:
+            return server_hostname, sock.getpeername()[1]
+        except OSError:
+            return server_hostname, None
@@ -1 +1,4 @@
-from src.sensehat.sensehat import *
\ No newline at end of file
+from src.sensehat.sensehat import *
+from src.sensehat.reader import *
+from src.sensehat.payload import *
+from src.sensehat.worker import *
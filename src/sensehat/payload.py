@@ -0,0 +1,227 @@
+"""
+Module that contains a precompiled serializer for the fixed schema of sensor payloads.
+It writes the JSON text of SenseHatSensor.sensors_values() directly, without building the
+nested dict of sensors_data() or going through the generic JSON encoder.
+It also contains a bounded history of sensor payloads that are backfilled in batches and a
+compressor of those batches that uses a preset dictionary derived from the same schema.
+"""
+
+# local imports
+from src.constants import constants as const
+from src.errors import errors as err
+from src.sensehat.sensehat import SenseHatSensor
+# external imports
+import logging
+import json
+import zlib
+from collections import deque
+from json.encoder import encode_basestring_ascii
+from threading import Lock
+
+# start a loggin instance for this module using constants
+logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+class SensorSerializer():
+    """
+    Class that generates a serializer for sensor payloads.
+    serialize() returns exactly the bytes of json.dumps(SenseHatSensor.to_dict(values, stale)),
+    but formats them with a single call on a template compiled once from the schema.
+    """
+    # placeholder of each value while compiling the template
+    MARK = '@@{}@@'
+
+    def __init__(self):
+        # the template follows the structure (and key order) of SenseHatSensor.to_dict()
+        marks = tuple(SensorSerializer.MARK.format(i) for i in range(len(SenseHatSensor.FIELDS)))
+        text = json.dumps(SenseHatSensor.to_dict(marks)).replace('%', '%%')
+        # the last slot holds the optional 'stale' key
+        text = text[:-1] + '%s}'
+        # the fast template lets '%r' format numbers, which matches the JSON encoder for finite floats and ints
+        fast, slow = text, text
+        for i, mark in enumerate(marks):
+            fast = fast.replace(json.dumps(mark), '%s' if i == 0 else '%r')
+            slow = slow.replace(json.dumps(mark), '%s')
+        self._fast = fast.encode('ascii')
+        self._slow = slow.encode('ascii')
+        self._stale_key = f", {json.dumps(SenseHatSensor.STALE)}: ".encode('ascii')
+        logger.debug(f"A sensor serializer was compiled.")
+
+    # class specific methods
+    def serialize(self, values:tuple, stale:list = None) -> bytes:
+        """
+        Method that returns the JSON payload (as bytes) of a SenseHatSensor.sensors_values() tuple
+        and its stale sensors, if any.
+        """
+        stale = self._stale_key + json.dumps(stale).encode('ascii') if stale else b''
+        numbers = values[1:]
+        try:
+            # a single C-level check for values that the fast template cannot format: None
+            # raises and NaN or infinity make the sum non-finite
+            total = sum(numbers)
+            fast = total - total == 0
+        except TypeError:
+            fast = False
+        if fast:
+            return self._fast % ((encode_basestring_ascii(values[0]).encode('ascii'),) + numbers + (stale,))
+        return self._slow % (tuple(json.dumps(v).encode('ascii') for v in values) + (stale,))
+
+class PayloadCompressor():
+    """
+    Class that generates a compressor of batches of payloads, i.e., JSON payloads joined by new
+    lines. Small payloads compress poorly on their own, because every message starts with an
+    empty zlib window; a preset dictionary (zlib 'zdict') fills that window with the keys and
+    typical values of the sensor schema, so even short batches compress well.
+    Compressed batches start with HEADER, followed by a zlib stream that carries the Adler-32 of
+    its dictionary, so decoders can tell a wrong dictionary from corrupt data. Batches without
+    HEADER are plain JSON lines.
+    """
+    # content-encoding marker of compressed batches
+    HEADER = b'zdict\n'
+    # zlib only uses the last 32 KiB of a dictionary
+    DICTIONARY_SIZE = 32768
+
+    def __init__(self, dictionary:bytes = None, level:int = 9):
+        self._dictionary = dictionary[-PayloadCompressor.DICTIONARY_SIZE:] if dictionary else PayloadCompressor.schema_dictionary()
+        self._level = level
+
+    @property
+    def dictionary(self):
+        return self._dictionary
+
+    @property
+    def dictionary_id(self):
+        """
+        Adler-32 of the dictionary, as found in the header of the zlib streams
+        """
+        return zlib.adler32(self._dictionary)
+
+    # class specific methods
+    def compress(self, payloads:list)->bytes:
+        """
+        Method that returns a list of JSON payloads (as bytes) as a single compressed batch.
+        """
+        compressor = zlib.compressobj(level=self._level, zdict=self._dictionary)
+        return PayloadCompressor.HEADER + compressor.compress(b'\n'.join(payloads)) + compressor.flush()
+
+    def decompress(self, batch:bytes)->list:
+        """
+        Method that returns the list of JSON payloads (as bytes) of a batch, compressed or not.
+        """
+        if not batch.startswith(PayloadCompressor.HEADER):
+            return batch.split(b'\n')
+        decompressor = zlib.decompressobj(zdict=self._dictionary)
+        try:
+            data = decompressor.decompress(batch[len(PayloadCompressor.HEADER):]) + decompressor.flush()
+        except zlib.error as zerr:
+            logger.info(f"Unable to decompress a batch: '{zerr}'.")
+            raise err.MqttDecodingError("Unable to decompress a batch (is it the same dictionary?).", str(zerr))
+        return data.split(b'\n')
+
+    @staticmethod
+    def load(path_file:str)->'PayloadCompressor':
+        """
+        Method that returns a compressor with the dictionary in the file 'path_file' (e.g., from train()).
+        """
+        with open(path_file, 'rb') as dictionary_file:
+            return PayloadCompressor(dictionary_file.read())
+
+    @staticmethod
+    def train(payloads:list, size:int = DICTIONARY_SIZE)->bytes:
+        """
+        Method that returns a dictionary made of recorded payloads, oldest first, e.g., to match
+        the values of a given site better than the schema dictionary does. Distinct payloads are
+        kept, newest last (zlib finds matches closer to the end of a dictionary with shorter codes).
+        """
+        kept, total = [], 0
+        for payload in reversed(list(dict.fromkeys(payloads))):
+            if total + len(payload) + 1 > size:
+                break
+            kept.append(payload)
+            total += len(payload) + 1
+        return b'\n'.join(reversed(kept)) + b'\n'
+
+    @staticmethod
+    def schema_dictionary()->bytes:
+        """
+        Method that returns the default dictionary: payloads of made-up readings serialized by
+        SensorSerializer, so it changes (and so does its id) whenever the schema does.
+        """
+        serializer = SensorSerializer()
+        readings = [
+            ('Mon Jan  1 00:00:00 2024', 1704067200.0, 1013.2512, 21.4567, 22.1234, 45.6789, 0.0012, -0.0034, 0.0056,
+                123.4567, 0.0123, -0.0456, 0.9876),
+            ('Sat Jun 15 12:30:45 2024', 1718454645.123, 998.7654, 24.5678, 25.0123, 55.4321, -0.0021, 0.0043, -0.0065,
+                301.2345, -0.0234, 0.0567, 9.8012),
+        ]
+        stale = [[], [SenseHatSensor.PRESSURE, SenseHatSensor.TEMPERATURE, SenseHatSensor.HUMIDITY]]
+        return b'\n'.join(serializer.serialize(values, s) for values, s in zip(readings, stale)) + b'\n'
+
+class SensorHistory():
+    """
+    Class that generates a bounded history of sensor payloads that could not be published (e.g.,
+    while the broker was unreachable), to be backfilled in batches of up to 'batch' payloads once
+    it is reachable again. The oldest payloads are dropped first when the history is full.
+    Batches are compressed if there is a compressor and are plain JSON lines otherwise.
+    """
+    def __init__(self, size:int, batch:int, compressor:PayloadCompressor = None):
+        self._lock = Lock()
+        self._payloads = deque()
+        self._dropped = 0
+        self.configure(size, batch, compressor)
+
+    def configure(self, size:int, batch:int, compressor:PayloadCompressor = None):
+        """
+        Method that (re)sets the limits of the history. Payloads beyond a smaller size are
+        dropped from the oldest ones.
+        """
+        if size < 1 or batch < 1:
+            logger.info(f"The history size '{size}' and batch '{batch}' must be at least 1.")
+            raise err.InvalidSenseAttr(f"The history size '{size}' or batch '{batch}' is invalid.", 'size' if size < 1 else 'batch')
+        with self._lock:
+            self._size = size
+            self._batch = batch
+            self._compressor = compressor
+            while len(self._payloads) > size:
+                self._payloads.popleft()
+                self._dropped += 1
+
+    def __len__(self):
+        return len(self._payloads)
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def dropped(self):
+        return self._dropped
+
+    # class specific methods
+    def append(self, payload:bytes):
+        with self._lock:
+            if len(self._payloads) >= self._size:
+                self._payloads.popleft()
+                self._dropped += 1
+            self._payloads.append(payload)
+
+    def peek(self)->tuple:
+        """
+        Method that returns the oldest batch (as a single payload) and the number of payloads in
+        it, without removing them; see pop().
+        """
+        with self._lock:
+            payloads = [self._payloads[i] for i in range(min(self._batch, len(self._payloads)))]
+            compressor = self._compressor
+        batch = compressor.compress(payloads) if compressor else b'\n'.join(payloads)
+        return batch, len(payloads)
+
+    def pop(self, count:int):
+        """
+        Method that removes the 'count' oldest payloads, e.g., once their batch was published.
+        """
+        with self._lock:
+            for _ in range(min(count, len(self._payloads))):
+                self._payloads.popleft()
@@ -0,0 +1,192 @@
+"""
+Module that isolates blocking SenseHAT reads in a dedicated worker thread.
+Every read is time-bounded, so a stuck I2C transaction cannot stall the caller.
+"""
+
+# local imports
+from src.constants import constants as const
+# external imports
+import logging
+from queue import Queue, Empty, Full
+from threading import Event, Lock, Thread
+from time import sleep
+
+# start a loggin instance for this module using constants
+logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+class ReadRequest():
+    """
+    Class that holds a single read request and its result.
+    """
+    def __init__(self, method:str):
+        self.method = method
+        self.value = None
+        self.error = None
+        self.done = Event()
+
+class SensorReader():
+    """
+    Class that generates a time-bounded reader for a SenseHat object.
+    Reads are executed by a worker thread that owns the SenseHat object. If a read does not
+    return within 'timeout' seconds, the last known value is returned and marked as stale,
+    the timeout is counted and the worker is abandoned (a stuck call cannot be interrupted)
+    and replaced by a new one that reinitializes the SenseHat object in the background.
+    While the SenseHat object is reinitialized, or when requests pile up behind a stuck read,
+    the last known value is returned right away instead of waiting for the timeout.
+    If 'timeout' is None, reads are done in the caller's thread instead (e.g., for virtual
+    SenseHat objects that never block); this cannot be changed after creation.
+    """
+    # requests waiting for the worker (one per calling thread at most, so more means it is stuck)
+    QUEUE_SIZE = 8
+
+    def __init__(self, sense, factory, timeout:float = 2.0):
+        # factory is a callable that returns a new SenseHat object (e.g., the SenseHat class)
+        self._factory = factory
+        self._timeout = timeout
+        # values and counters per read name
+        self._last = {}
+        self._stale = set()
+        self._timeouts = {}
+        self._errors = {}
+        # helpers
+        self._lock = Lock()
+        self._requests = None
+        self._reinitializing = False
+        self._sense = None
+        if timeout is None:
+            self._sense = sense
+            logger.debug("A sensor reader without a worker was initialized.")
+            return
+        self.__start_worker(sense)
+        logger.info(f"A sensor reader with a timeout of '{timeout}' seconds was initialized.")
+
+    @property
+    def timeout(self):
+        return self._timeout
+    @timeout.setter
+    def timeout(self, timeout:float):
+        self._timeout = timeout
+
+    @property
+    def stale(self):
+        return sorted(self._stale)
+
+    @property
+    def timeouts(self):
+        return dict(self._timeouts)
+
+    @property
+    def errors(self):
+        return dict(self._errors)
+
+    @property
+    def is_reinitializing(self):
+        return self._reinitializing
+
+    # class specific methods
+    def read(self, name:str, method:str, fresh:bool = False):
+        """
+        Method that calls 'method' on the SenseHat object and returns its value. On timeout
+        or error, returns the last known value for 'name' (None if there is none yet), or
+        None if 'fresh' is True (e.g., for time series that must not repeat old values).
+        """
+        request = ReadRequest(method)
+        requests = self._requests
+        if requests is None:
+            self.__execute(self._sense, request)
+        elif self._reinitializing:
+            return self.__skip(name, "the SenseHat object is being reinitialized", fresh)
+        else:
+            try:
+                requests.put_nowait(request)
+            except Full:
+                return self.__skip(name, "the worker is stuck", fresh)
+        if not request.done.wait(self._timeout):
+            with self._lock:
+                self._timeouts[name] = self._timeouts.get(name, 0) + 1
+                self._stale.add(name)
+            logger.warning(f"Reading '{name}' timed out after '{self._timeout}' seconds. Using its last known value.")
+            self.__restart_worker(requests)
+            return None if fresh else self._last.get(name)
+        if request.error is not None:
+            with self._lock:
+                self._errors[name] = self._errors.get(name, 0) + 1
+                self._stale.add(name)
+            logger.warning(f"Reading '{name}' failed: '{request.error}'. Using its last known value.")
+            return None if fresh else self._last.get(name)
+        with self._lock:
+            self._last[name] = request.value
+            self._stale.discard(name)
+        return request.value
+
+    def disable(self):
+        """
+        Method that stops the current worker. Abandoned workers are daemons and die with the process.
+        """
+        if self._requests is not None:
+            self.__stop_worker(self._requests)
+
+    def __skip(self, name:str, reason:str, fresh:bool):
+        with self._lock:
+            self._stale.add(name)
+        logger.debug(f"Reading '{name}' was skipped because {reason}. Using its last known value.")
+        return None if fresh else self._last.get(name)
+
+    def __start_worker(self, sense=None):
+        requests = Queue(maxsize=SensorReader.QUEUE_SIZE)
+        self._requests = requests
+        Thread(target=self.__work, args=(requests, sense), daemon=True).start()
+
+    def __restart_worker(self, requests:Queue):
+        with self._lock:
+            # only restart once per stuck worker and never while a new one is initializing
+            if requests is not self._requests or self._reinitializing:
+                return
+            self._reinitializing = True
+            logger.info("Restarting the sensor reader worker and reinitializing the SenseHat object.")
+            self.__stop_worker(requests)
+            self.__start_worker()
+
+    @staticmethod
+    def __stop_worker(requests:Queue):
+        # the requests behind a stuck read fail right away instead of waiting for the timeout
+        while True:
+            try:
+                request = requests.get_nowait()
+            except Empty:
+                break
+            if request is not None:
+                request.error = TimeoutError("The sensor reader worker was restarted.")
+                request.done.set()
+        # stop the worker (if it ever comes back from a stuck read)
+        requests.put_nowait(None)
+
+    def __work(self, requests:Queue, sense):
+        # reinitialize first when started without a SenseHat object; reads meanwhile
+        # return stale values right away (see read())
+        while sense is None:
+            try:
+                sense = self._factory()
+                logger.info("The SenseHat object was reinitialized.")
+            except Exception as e:
+                logger.warning(f"Unable to reinitialize the SenseHat object: '{e}'. Retrying.")
+                sleep(self._timeout)
+        with self._lock:
+            self._reinitializing = False
+        while True:
+            request = requests.get()
+            if request is None:
+                return
+            self.__execute(sense, request)
+
+    @staticmethod
+    def __execute(sense, request:ReadRequest):
+        try:
+            request.value = getattr(sense, request.method)()
+        except Exception as e:
+            # hardware errors (e.g., OSError) are reported back to the caller
+            request.error = e
+        request.done.set()
@@ -8,6 +8,7 @@ Related doc: https://pythonhosted.org/sense-hat/api/
 from src.constants import constants as const
 from src.utils import validate as val
 from src.errors import errors as err
+from src.sensehat.reader import SensorReader
 # local emulation settings
 if const.SENSEHAT_EMULATION:
     from sense_emu import SenseHat as Sense
@@ -17,9 +18,9 @@ else:
     from sense_hat import ACTION_PRESSED, ACTION_HELD, ACTION_RELEASED
 # external imports
 import logging
-from time import asctime
+from time import asctime, monotonic, sleep, time
 from abc import ABC, abstractmethod
-from queue import Queue
+from queue import Queue, Empty, Full
 from threading import Event
 
 # start a loggin instance for this module using constants
@@ -33,9 +34,10 @@ class SenseHat(ABC):
     ABC for SenseHat Joystick, LED, and Sensor subclasses.
     Add any arg or method that should be common to subclasses here.
     """
-    def __init__(self):
-        # create a private SenseHat object to interact with the sensors API
-        self._sense = Sense()
+    def __init__(self, sense=None):
+        # create a private SenseHat object to interact with the sensors API,
+        # unless a (e.g., virtual) object with the same API is given
+        self._sense = sense if sense is not None else Sense()
         # helpers
         self._is_enabled = False
     
@@ -63,14 +65,24 @@ class SenseHat(ABC):
 class SenseHatJoystick(SenseHat):
     """
     Generates a SenseHAT Joystick object.
+    With a gesture 'recognizer' (e.g., analytics.GestureRecognizer), the raw events are also
+    fed to it and the gestures it resolves are queued in 'gestures'.
     """
     # class direction conventions
     DIRECTION = 'direction'
+    # maximum number of directions (and gestures) waiting to be published (the oldest are dropped first)
+    DIRECTIONS = 16
 
-    def __init__(self):
-        super().__init__()
-        # queue for directions made by the joystick
-        self._directions = Queue()
+    def __init__(self, sense=None, recognizer=None, poll_interval:float=1.0):
+        super().__init__(sense=sense)
+        if not val.timeout(poll_interval):
+            logger.info(f"The joystick poll interval '{poll_interval}' must be greater than 0.")
+            raise err.InvalidSenseAttr(f"The joystick poll interval '{poll_interval}' is invalid.", 'poll_interval')
+        # bounded queues for directions and gestures made by the joystick
+        self._directions = Queue(maxsize=SenseHatJoystick.DIRECTIONS)
+        self._gestures = Queue(maxsize=SenseHatJoystick.DIRECTIONS)
+        self._recognizer = recognizer
+        self._poll_interval = poll_interval
         # init flag for the detection of joystick directions
         self._stop_flag = Event()
         self.is_enabled = True
@@ -83,6 +95,27 @@ class SenseHatJoystick(SenseHat):
     def directions(self, directions:Queue):
         self._directions = directions
 
+    @property
+    def gestures(self):
+        return self._gestures
+
+    @property
+    def recognizer(self):
+        return self._recognizer
+    @recognizer.setter
+    def recognizer(self, recognizer):
+        self._recognizer = recognizer
+
+    @property
+    def poll_interval(self):
+        return self._poll_interval
+    @poll_interval.setter
+    def poll_interval(self, poll_interval:float):
+        if not val.timeout(poll_interval):
+            logger.info(f"The joystick poll interval '{poll_interval}' must be greater than 0.")
+            raise err.InvalidSenseAttr(f"The joystick poll interval '{poll_interval}' is invalid.", 'poll_interval')
+        self._poll_interval = poll_interval
+
     @property
     def stop_flag(self):
         return self._stop_flag
@@ -97,30 +130,72 @@ class SenseHatJoystick(SenseHat):
             self.is_enabled = False
 
     # class specific methods
-    def wait_directions(self, external_event:Event=False):
+    def wait_directions(self, external_event:Event=False, heartbeat=None):
         """
         Method to put this class object into wait for stick directions mode.
-        Receives an optional external (threading) event to control loop.
-        Directions are queued in 'directions', so if not 'directions.empty()',
-        dequeue and process them.
+        Receives an optional external (threading) event to control loop and an optional
+        'heartbeat' callable that is called once per poll (e.g., for a watchdog).
+        Directions are queued in 'directions' (and gestures in 'gestures'), so if not
+        'directions.empty()', dequeue and process them. It returns as soon as there is any.
         """
         logger.info(f"Waiting for joystick directions.")
         while not external_event.is_set() and not self.stop_flag.is_set():
-            for event in self.sense.stick.get_events():
-                if event.action == ACTION_RELEASED:
-                    logger.info(f"Detected a joystick release for direction '{event.direction}.'.")
-                    self.directions.put(event.direction)
-                    self.stop_flag.set()
-            # wait before next loop
-            external_event.wait(1)
+            if heartbeat: heartbeat()
+            if self.poll():
+                break
+            # wait before next loop, or until a pending gesture can be resolved
+            timeout = self.poll_interval
+            deadline = self.recognizer.next_deadline() if self.recognizer else None
+            if deadline is not None:
+                timeout = min(timeout, max(0.0, deadline - time()))
+            external_event.wait(timeout)
         # reset the stop flag before the next call
         self.stop_flag.clear()
 
+    def poll(self)->bool:
+        """
+        Method that queues the directions released (and the gestures resolved) since the last
+        call and returns True if there was any. Directions are the (shared) strings of the
+        SenseHat API, so a queued direction costs a single reference.
+        """
+        released = False
+        events = self.sense.stick.get_events()
+        for event in events:
+            if event.action == ACTION_RELEASED:
+                logger.info(f"Detected a joystick release for direction '{event.direction}.'.")
+                SenseHatJoystick.__put(self.directions, event.direction)
+                released = True
+        recognizer = self.recognizer
+        if recognizer is not None:
+            # the recognizer also needs the current time to resolve holds and windows without new events
+            for gesture in recognizer.update(events, time()):
+                SenseHatJoystick.__put(self.gestures, gesture)
+                released = True
+        return released
+
     def joystick_data(self) -> dict:
         if self.directions.empty():
             return {SenseHatJoystick.DIRECTION : ''}
         return {SenseHatJoystick.DIRECTION : self.directions.get()}
 
+    def gesture_data(self) -> dict:
+        if self.gestures.empty():
+            return {}
+        return self.gestures.get()
+
+    @staticmethod
+    def __put(queue:Queue, item):
+        while True:
+            try:
+                queue.put_nowait(item)
+                break
+            except Full:
+                # nobody is publishing them; keep the latest ones
+                try:
+                    queue.get_nowait()
+                except Empty:
+                    pass
+
 class SenseHatLed(SenseHat):
     """
     Generates a SenseHAT LED object.
@@ -128,10 +203,18 @@ class SenseHatLed(SenseHat):
     This is convenient because the SenseHAT API already has many methods for the LED matrix.
     For more info, see https://pythonhosted.org/sense-hat/api/#led-matrix.
     """
+    # longest 'delay' command (in seconds); longer ones are cut to it
+    MAX_DELAY = 60.0
+    # time (in seconds) between heartbeats during a 'delay' command
+    HEARTBEAT_INTERVAL = 1.0
+    # columns scrolled per character by show_message() (at most 5 of the letter and 1 of space)
+    SCROLL_COLUMNS = 6
+
     def __init__(self,
                 set_rotation:int=0,
-                low_light:bool=True):
-        super().__init__()
+                low_light:bool=True,
+                sense=None):
+        super().__init__(sense=sense)
         # LED variables
         self._set_rotation = set_rotation
         self._low_light = low_light
@@ -171,6 +254,95 @@ class SenseHatLed(SenseHat):
             raise err.InvalidSenseAttr(f"The pixels LED of length '{len(pixels)}' is invalid.", 'pixels')
         self._pixels = pixels
 
+    def run(self, commands:list, heartbeat=None):
+        """
+        Method that runs a list of LED commands in the {'method' : [*args]} format, where 'method'
+        is a SenseHat LED method or 'delay'. Invalid commands are logged and skipped.
+        'heartbeat', if given, is called after each command and every HEARTBEAT_INTERVAL of a
+        'delay'; before a 'show_message', it is called with how long the scroll should take
+        (in seconds), so that a watchdog can expect the next heartbeat that much later.
+        """
+        for cmd in commands:
+            if not isinstance(cmd, dict):
+                logger.warning(f"The command '{cmd}' is not a dictionary. Skipping it.")
+                continue
+            for func_name, func_args in cmd.items():
+                if func_name == "delay":
+                    self.__delay(func_args, heartbeat)
+                else:
+                    try:
+                        # https://pythonhosted.org/sense-hat/api/#led-matrix
+                        # if a valid setter, call with kwargs; else, log and skip.
+                        func = getattr(self.sense, func_name, None)
+                        if func is None:
+                            logger.warning(f"The method '{func_name}' is not supported by SenseHat.")
+                            continue
+                        elif not callable(func):
+                            logger.warning(f"The method '{func_name}' is not callable.")
+                            continue
+                        if heartbeat and func_name == 'show_message':
+                            heartbeat(SenseHatLed.__scroll_time(func_args))
+                        func(*func_args)
+                    except TypeError as terr:
+                        logger.info(f"Unable to call '{func_name}' with args '{func_args}': {terr}")
+                    except Exception as e:
+                        # catch other exceptions that might propagate from SenseHat methods
+                        logger.warning(f"There was a non-specific error running method '{func_name}': {e}")
+                # a long sequence of commands is not a stuck loop
+                if heartbeat: heartbeat()
+
+    @staticmethod
+    def duration(commands:list)->float:
+        """
+        Method that returns how long (in seconds) a list of LED commands should take at most,
+        i.e., its 'delay' commands (cut to MAX_DELAY) and show_message() scrolls.
+        """
+        seconds = 0.0
+        for cmd in commands:
+            if not isinstance(cmd, dict):
+                continue
+            for func_name, func_args in cmd.items():
+                if not isinstance(func_args, list):
+                    continue
+                if func_name == 'delay':
+                    seconds += min(SenseHatLed.__delay_time(func_args) or 0.0, SenseHatLed.MAX_DELAY)
+                elif func_name == 'show_message':
+                    seconds += SenseHatLed.__scroll_time(func_args)
+        return seconds
+
+    def __delay(self, args:list, heartbeat=None):
+        seconds = SenseHatLed.__delay_time(args)
+        if seconds is None:
+            logger.info(f"The args '{args}' of method 'delay' are not a single number of seconds. Skipping it.")
+            return
+        if seconds > SenseHatLed.MAX_DELAY:
+            logger.warning(f"The delay of '{seconds}' seconds is longer than '{SenseHatLed.MAX_DELAY}'. Cutting it.")
+            seconds = SenseHatLed.MAX_DELAY
+        # sleep in slices, so that a long delay is not a stuck loop
+        ends = monotonic() + seconds
+        while True:
+            remaining = ends - monotonic()
+            if remaining <= 0:
+                break
+            sleep(min(remaining, SenseHatLed.HEARTBEAT_INTERVAL))
+            if heartbeat and remaining > SenseHatLed.HEARTBEAT_INTERVAL: heartbeat()
+
+    @staticmethod
+    def __delay_time(args:list)->float:
+        # seconds of a valid 'delay' command or None
+        if len(args) != 1 or isinstance(args[0], bool) or not isinstance(args[0], (int, float)) or args[0] < 0:
+            return None
+        return args[0]
+
+    @staticmethod
+    def __scroll_time(args:list)->float:
+        # upper bound of the time show_message(text_string, scroll_speed=.1, ...) takes
+        try:
+            text, speed = str(args[0]), float(args[1]) if len(args) > 1 else 0.1
+        except (IndexError, TypeError, ValueError):
+            return 0.0
+        return max(0.0, (len(text) * SenseHatLed.SCROLL_COLUMNS + 8) * speed)
+
     def disable(self):
         logger.debug(f"Received a call to disable an LED sense object.")
         # Must turn off the LED matrix before disabling the object
@@ -184,6 +356,7 @@ class SenseHatSensor(SenseHat):
     """
     # data keys label convention for the class objects
     TIME = 'time'
+    TIMESTAMP = 'timestamp'
     PRESSURE = 'pressure'
     TEMPERATURE = 'temperature'
     TEMPERATURE_01 = 'from_humidity'
@@ -199,75 +372,164 @@ class SenseHatSensor(SenseHat):
     ACCELERATION_01 = 'x'
     ACCELERATION_02 = 'y'
     ACCELERATION_03 = 'z'
+    MAGNETOMETER = 'magnetometer'
+    STALE = 'stale'
+    # order of the values returned by sensors_values()
+    FIELDS = (TIME, TIMESTAMP, PRESSURE, (TEMPERATURE, TEMPERATURE_01), (TEMPERATURE, TEMPERATURE_02), HUMIDITY,
+        (GYROSCOPE, GYROSCOPE_01), (GYROSCOPE, GYROSCOPE_02), (GYROSCOPE, GYROSCOPE_03), (COMPASS, COMPASS_NORTH),
+        (ACCELERATION, ACCELERATION_01), (ACCELERATION, ACCELERATION_02), (ACCELERATION, ACCELERATION_03))
 
     def __init__(self,
                 rounding:int = 4,
                 acceleration_multiplier:float = 1.0,
-                gyroscope_multiplier:float = 1.0):
-        super().__init__()
+                gyroscope_multiplier:float = 1.0,
+                read_timeout:float = 2.0,
+                sense = None):
+        super().__init__(sense)
         self.rounding = rounding
         self.acceleration_multiplier = acceleration_multiplier
         self.gyroscope_multiplier = gyroscope_multiplier
-        # sensors variables
-        self.__time = None
-        self.__pressure = None
-        self.__temperature_01 = self.__temperature_02 = None
-        self.__humidity = None
-        self.__gyroscope_01 = self.__gyroscope_02 = self.__gyroscope_03 = None
-        self.__compass_north = None
-        self.__acceleration_01 = self.__acceleration_02 = self.__acceleration_03 = None
+        # hardware reads go through a time-bounded worker that owns the sense object,
+        # which also serializes reads between the publishing and the event detection loops
+        # (read_timeout None reads in the caller's thread, e.g., for virtual sense objects)
+        self._reader = SensorReader(sense=self.sense, factory=Sense if sense is None else type(sense), timeout=read_timeout)
         # read initial sensor values
         self.data = self.sensors_data()
         self.is_enabled = True
         logger.info(f"A sensehat object for its sensors was initialized.")
-    
-    def sensors_data(self) -> dict:
+
+    @property
+    def reader(self):
+        return self._reader
+
+    @property
+    def stale(self):
+        return self._reader.stale
+
+    def sensors_values(self) -> tuple:
+        """
+        Method that reads all of the sensors and returns their current values as a flat tuple
+        in the order of SenseHatSensor.FIELDS, i.e., without building the nested data structure.
+        Values that could not be read in time hold their last known value (see 'stale').
+        """
+        # epoch time (in seconds, millisecond precision) captured right before reading the sensors
+        timestamp = round(time(), 3)
+        values = (
+            # https://docs.python.org/3/library/time.html#time.asctime
+            asctime(),
+            timestamp,
+            self.__round(self._reader.read(SenseHatSensor.PRESSURE, 'get_pressure')),
+            self.__round(self._reader.read(SenseHatSensor.TEMPERATURE, 'get_temperature')),
+            self.__round(self._reader.read(SenseHatSensor.TEMPERATURE_02, 'get_temperature_from_pressure')),
+            self.__round(self._reader.read(SenseHatSensor.HUMIDITY, 'get_humidity')),
+        )
+        gyroscope = self._reader.read(SenseHatSensor.GYROSCOPE, 'get_gyroscope_raw') or {}
+        compass = self.__round(self._reader.read(SenseHatSensor.COMPASS, 'get_compass'))
+        acceleration = self._reader.read(SenseHatSensor.ACCELERATION, 'get_accelerometer_raw') or {}
+        values += (
+            self.__round(gyroscope.get("x"), self.gyroscope_multiplier),
+            self.__round(gyroscope.get("y"), self.gyroscope_multiplier),
+            self.__round(gyroscope.get("z"), self.gyroscope_multiplier),
+            compass,
+            self.__round(acceleration.get("x"), self.acceleration_multiplier),
+            self.__round(acceleration.get("y"), self.acceleration_multiplier),
+            self.__round(acceleration.get("z"), self.acceleration_multiplier),
+        )
+        # only report degraded sensors, so the payload is unchanged while all is well
+        stale = self._reader.stale
+        if stale:
+            logger.warning(f"The following sensors are degraded: '{stale}'. Timeouts so far: '{self._reader.timeouts}'.")
+        logger.info(f"A call to read updated sensor data was made.")
+        return values
+
+    @staticmethod
+    def to_dict(values:tuple, stale:list = None) -> dict:
         """
-        Method that updates all of the private sensor variables and 
-        returns a dict containing the current values of each.
+        Method that returns the nested data structure of a sensors_values() tuple.
         """
-        # https://docs.python.org/3/library/time.html#time.asctime
-        self.__time = asctime()
-        self.__pressure = round(self.sense.get_pressure(), self.rounding)
-        self.__temperature_01 = round(self.sense.get_temperature(), self.rounding)
-        self.__temperature_02 = round(self.sense.get_temperature_from_pressure(), self.rounding)
-        self.__humidity = round(self.sense.get_humidity(), self.rounding)
-        self.__gyroscope_01 = round(self.sense.get_gyroscope_raw().get("x") * self.gyroscope_multiplier, self.rounding)
-        self.__gyroscope_02 = round(self.sense.get_gyroscope_raw().get("y") * self.gyroscope_multiplier, self.rounding)
-        self.__gyroscope_03 = round(self.sense.get_gyroscope_raw().get("z") * self.gyroscope_multiplier, self.rounding)
-        self.__compass_north = round(self.sense.get_compass(), self.rounding)
-        self.__acceleration_01 = round(self.sense.get_accelerometer_raw().get("x") * self.acceleration_multiplier, self.rounding)
-        self.__acceleration_02 = round(self.sense.get_accelerometer_raw().get("y") * self.acceleration_multiplier, self.rounding)
-        self.__acceleration_03 = round(self.sense.get_accelerometer_raw().get("z") * self.acceleration_multiplier, self.rounding)
-        # generate and update data structure
         data = {
-            SenseHatSensor.TIME : self.__time,
-            SenseHatSensor.PRESSURE : self.__pressure,
+            SenseHatSensor.TIME : values[0],
+            SenseHatSensor.TIMESTAMP : values[1],
+            SenseHatSensor.PRESSURE : values[2],
             SenseHatSensor.TEMPERATURE : {
-                SenseHatSensor.TEMPERATURE_01 : self.__temperature_01,
-                SenseHatSensor.TEMPERATURE_02 : self.__temperature_02
+                SenseHatSensor.TEMPERATURE_01 : values[3],
+                SenseHatSensor.TEMPERATURE_02 : values[4]
             },
-            SenseHatSensor.HUMIDITY : self.__humidity,
+            SenseHatSensor.HUMIDITY : values[5],
             SenseHatSensor.GYROSCOPE : {
-                SenseHatSensor.GYROSCOPE_01 : self.__gyroscope_01,
-                SenseHatSensor.GYROSCOPE_02 : self.__gyroscope_02,
-                SenseHatSensor.GYROSCOPE_03 : self.__gyroscope_03
+                SenseHatSensor.GYROSCOPE_01 : values[6],
+                SenseHatSensor.GYROSCOPE_02 : values[7],
+                SenseHatSensor.GYROSCOPE_03 : values[8]
             },
             SenseHatSensor.COMPASS : {
-                SenseHatSensor.COMPASS_NORTH : self.__compass_north
+                SenseHatSensor.COMPASS_NORTH : values[9]
             },
             SenseHatSensor.ACCELERATION : {
-                SenseHatSensor.ACCELERATION_01 : self.__acceleration_01,
-                SenseHatSensor.ACCELERATION_02 : self.__acceleration_02,
-                SenseHatSensor.ACCELERATION_03 : self.__acceleration_03
+                SenseHatSensor.ACCELERATION_01 : values[10],
+                SenseHatSensor.ACCELERATION_02 : values[11],
+                SenseHatSensor.ACCELERATION_03 : values[12]
             },
         }
-        logger.info(f"A call to read and assign updated sensor data was made.")
+        if stale:
+            data[SenseHatSensor.STALE] = stale
+        return data
+
+    def sensors_data(self) -> dict:
+        """
+        Method that reads all of the sensors and returns a dict containing the current values of each.
+        Values that could not be read in time hold their last known value and their
+        sensors are listed under 'stale' (a value is None if it was never read).
+        """
+        data = SenseHatSensor.to_dict(self.sensors_values(), self._reader.stale)
         logger.debug(f"Data: '{data}'")
         return data
 
+    def events_data(self) -> dict:
+        """
+        Method that reads only the sensors used for event detection and returns them
+        in a subset of the sensors_data() structure. Cheaper to call at high rates.
+        """
+        timestamp = round(time(), 3)
+        temperature = self.__round(self._reader.read(SenseHatSensor.TEMPERATURE, 'get_temperature'))
+        humidity = self.__round(self._reader.read(SenseHatSensor.HUMIDITY, 'get_humidity'))
+        acceleration = self._reader.read(SenseHatSensor.ACCELERATION, 'get_accelerometer_raw') or {}
+        return {
+            SenseHatSensor.TIMESTAMP : timestamp,
+            SenseHatSensor.TEMPERATURE : {
+                SenseHatSensor.TEMPERATURE_01 : temperature
+            },
+            SenseHatSensor.HUMIDITY : humidity,
+            SenseHatSensor.ACCELERATION : {
+                SenseHatSensor.ACCELERATION_01 : self.__round(acceleration.get("x"), self.acceleration_multiplier),
+                SenseHatSensor.ACCELERATION_02 : self.__round(acceleration.get("y"), self.acceleration_multiplier),
+                SenseHatSensor.ACCELERATION_03 : self.__round(acceleration.get("z"), self.acceleration_multiplier)
+            },
+        }
+
+    def imu_values(self) -> tuple:
+        """
+        Method that reads the IMU and returns a (monotonic time, ax, ay, az, gx, gy, gz, mx, my, mz)
+        tuple of raw values for orientation fusion, i.e., in Gs, radians/second and microteslas,
+        without rounding or multipliers. Returns None if a sensor could not be read right now
+        (e.g., on timeout or while the SenseHat object is reinitialized), instead of last known
+        values with a new time, so that the gap shows in the samples.
+        """
+        timestamp = monotonic()
+        acceleration = self._reader.read(SenseHatSensor.ACCELERATION, 'get_accelerometer_raw', fresh=True)
+        gyroscope = self._reader.read(SenseHatSensor.GYROSCOPE, 'get_gyroscope_raw', fresh=True)
+        magnetometer = self._reader.read(SenseHatSensor.MAGNETOMETER, 'get_compass_raw', fresh=True)
+        if acceleration is None or gyroscope is None or magnetometer is None:
+            return None
+        return (timestamp, acceleration['x'], acceleration['y'], acceleration['z'], gyroscope['x'], gyroscope['y'],
+            gyroscope['z'], magnetometer['x'], magnetometer['y'], magnetometer['z'])
+
+    def __round(self, value:float, multiplier:float = 1.0):
+        # keep None for values that were never read
+        return None if value is None else round(value * multiplier, self.rounding)
+
     def disable(self):
         logger.debug(f"Received a call to disable a sensor sense object.")
-        # This clas does not change the state of SenseHAT components, so nothing else to do here
+        # This clas does not change the state of SenseHAT components, so only stop the reader
         if self.is_enabled:
+            self._reader.disable()
             self.is_enabled = False
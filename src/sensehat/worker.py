@@ -0,0 +1,264 @@
+"""
+Module that contains a process-isolated LED worker. The worker process owns the LED matrix
+(a SenseHatLed object), so long scrolls and image decoding do not compete with the sensor and
+joystick loops for the GIL. Commands are sent to it through a pipe using LedProtocol frames.
+"""
+
+# local imports
+from src.constants import constants as const
+from src.sensehat.sensehat import SenseHatLed
+# external imports
+import logging
+import json
+import multiprocessing
+import signal
+import struct
+from time import monotonic
+
+# start a loggin instance for this module using constants
+logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+class LedProtocol():
+    """
+    Class that encodes and decodes the frames sent to the LED worker.
+    Each frame is a single pipe message made of a 1-byte opcode and a body. The most frequent
+    commands have fixed-size bodies (e.g., 'set_pixels' is 192 bytes of RGB values); any other
+    command, or a command whose arguments do not fit its fixed format, is sent as CALL with a
+    JSON body of [method, args].
+    """
+    # opcodes
+    STOP = 0
+    CALL = 1
+    CLEAR = 2
+    SET_PIXEL = 3
+    SET_PIXELS = 4
+    DELAY = 5
+    LOW_LIGHT = 6
+    SYNC = 7
+    # fixed-size bodies
+    DELAY_FORMAT = struct.Struct('!d')
+    # LED matrix size
+    PIXELS = 64
+
+    # class specific methods
+    @staticmethod
+    def encode(method:str, args:list)->bytes:
+        """
+        Method that returns the frame of a single {'method' : [*args]} command.
+        """
+        try:
+            if method == 'clear' and len(args) in [0, 1, 3]:
+                rgb = args[0] if len(args) == 1 else args
+                return bytes([LedProtocol.CLEAR]) + bytes(LedProtocol.__rgb(rgb) if rgb else [])
+            if method == 'set_pixel' and len(args) in [3, 5]:
+                rgb = args[2] if len(args) == 3 else args[2:]
+                return bytes([LedProtocol.SET_PIXEL, args[0], args[1]] + LedProtocol.__rgb(rgb))
+            if method == 'set_pixels' and len(args) == 1 and len(args[0]) == LedProtocol.PIXELS:
+                return bytes([LedProtocol.SET_PIXELS] + [c for rgb in args[0] for c in LedProtocol.__rgb(rgb)])
+            if method == 'delay' and len(args) == 1:
+                return bytes([LedProtocol.DELAY]) + LedProtocol.DELAY_FORMAT.pack(args[0])
+        except (TypeError, ValueError, IndexError, struct.error):
+            # let the worker report what is wrong with the arguments
+            pass
+        return bytes([LedProtocol.CALL]) + json.dumps([method, args], separators=(',', ':')).encode('utf-8')
+
+    @staticmethod
+    def decode(frame:bytes)->tuple:
+        """
+        Method that returns the (opcode, method, args) of a frame.
+        """
+        opcode, body = frame[0], frame[1:]
+        if opcode == LedProtocol.CALL:
+            method, args = json.loads(body)
+            return opcode, method, args
+        if opcode == LedProtocol.CLEAR:
+            return opcode, 'clear', [list(body)] if body else []
+        if opcode == LedProtocol.SET_PIXEL:
+            return opcode, 'set_pixel', [body[0], body[1], list(body[2:5])]
+        if opcode == LedProtocol.SET_PIXELS:
+            return opcode, 'set_pixels', [[list(body[i:i + 3]) for i in range(0, len(body), 3)]]
+        if opcode == LedProtocol.DELAY:
+            return opcode, 'delay', list(LedProtocol.DELAY_FORMAT.unpack(body))
+        if opcode == LedProtocol.LOW_LIGHT:
+            return opcode, 'low_light', [bool(body[0])]
+        if opcode in [LedProtocol.STOP, LedProtocol.SYNC]:
+            return opcode, None, None
+        raise ValueError(f"Unknown opcode '{opcode}'.")
+
+    @staticmethod
+    def __rgb(rgb:list)->list:
+        if len(rgb) != 3 or not all(isinstance(c, int) and 0 <= c <= 255 for c in rgb):
+            raise ValueError(f"The pixel '{rgb}' is not a list of 3 integers between 0 and 255.")
+        return list(rgb)
+
+def serve(connection, set_rotation:int, low_light:bool, sense_factory=None):
+    """
+    Main function of the LED worker process: runs the commands received through 'connection'
+    until a STOP frame arrives or the main process goes away.
+    """
+    # the main process handles signals and stops the worker
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    led = SenseHatLed(set_rotation=set_rotation, low_light=low_light,
+        sense=sense_factory() if sense_factory else None)
+    logger.info("The LED worker process is running.")
+    try:
+        while True:
+            try:
+                opcode, method, args = LedProtocol.decode(connection.recv_bytes())
+            except EOFError:
+                logger.info("The main process closed the LED pipe.")
+                break
+            except (ValueError, IndexError, struct.error) as derr:
+                logger.warning(f"Unable to decode an LED frame. Skipping it. Error: {derr}")
+                continue
+            if opcode == LedProtocol.STOP:
+                break
+            if opcode == LedProtocol.SYNC:
+                # the commands before it are done, so the main process may send more
+                connection.send_bytes(bytes([LedProtocol.SYNC]))
+            elif opcode == LedProtocol.LOW_LIGHT:
+                led.low_light = args[0]
+            else:
+                led.run([{method: args}])
+    finally:
+        led.disable()
+        logger.info("The LED worker process stopped.")
+
+class LedWorker():
+    """
+    Class that generates the main process side of an LED worker.
+    It has the same interface as SenseHatLed (run(), set_rotation, low_light, disable()) but
+    only encodes commands and writes them to the pipe; the worker process runs them in order.
+    The worker is restarted if it dies. Like SenseHatLed, run() returns once the worker has
+    run its commands, so there is never more than one list of commands in the pipe and the
+    next ones wait in the caller's bounded queue (where 'latest_wins' can still coalesce them).
+    """
+    # time (in seconds) the worker has to clear the LED matrix when disabled
+    STOP_TIMEOUT = 2.0
+    # time (in seconds) between heartbeats while waiting for the worker
+    SYNC_INTERVAL = 0.5
+    # time (in seconds) the worker may take beyond the delays and scrolls of a list of commands
+    SYNC_MARGIN = 10.0
+
+    def __init__(self, set_rotation:int = 0, low_light:bool = True, sense_factory = None):
+        self._set_rotation = set_rotation
+        self._low_light = low_light
+        # picklable callable that returns a SenseHat-like object in the worker (e.g., for benchmarks)
+        self._sense_factory = sense_factory
+        # spawn instead of fork, because the main process runs threads (e.g., MQTT network loops)
+        self._context = multiprocessing.get_context('spawn')
+        self._process = None
+        self._connection = None
+        self._is_enabled = False
+        self.__start()
+
+    @property
+    def is_enabled(self):
+        return self._is_enabled
+
+    @property
+    def process(self):
+        return self._process
+
+    @property
+    def set_rotation(self):
+        return self._set_rotation
+    @set_rotation.setter
+    def set_rotation(self, degree:int):
+        self._set_rotation = degree
+        self.__send(LedProtocol.encode('set_rotation', [degree]))
+
+    @property
+    def low_light(self):
+        return self._low_light
+    @low_light.setter
+    def low_light(self, state:bool):
+        self._low_light = state
+        self.__send(bytes([LedProtocol.LOW_LIGHT, bool(state)]))
+
+    # class specific methods
+    def run(self, commands:list, heartbeat=None):
+        """
+        Method that sends a list of LED commands in the {'method' : [*args]} format to the worker
+        and waits until the worker has run them, calling 'heartbeat' meanwhile. A worker that
+        takes SYNC_MARGIN seconds longer than the commands should (see SenseHatLed.duration())
+        is stuck, so it is terminated and restarted.
+        """
+        for cmd in commands:
+            if not isinstance(cmd, dict):
+                logger.warning(f"The command '{cmd}' is not a dictionary. Skipping it.")
+                continue
+            for func_name, func_args in cmd.items():
+                if not isinstance(func_args, list):
+                    logger.warning(f"The args '{func_args}' of method '{func_name}' are not a list. Skipping it.")
+                    continue
+                self.__send(LedProtocol.encode(func_name, func_args))
+        if self.__send(bytes([LedProtocol.SYNC])):
+            self.__sync(SenseHatLed.duration(commands) + LedWorker.SYNC_MARGIN, heartbeat)
+
+    def disable(self):
+        logger.debug(f"Received a call to disable an LED worker.")
+        if not self.is_enabled:
+            return
+        self._is_enabled = False
+        try:
+            self._connection.send_bytes(bytes([LedProtocol.STOP]))
+        except (OSError, ValueError):
+            pass
+        self._process.join(LedWorker.STOP_TIMEOUT)
+        if self._process.is_alive():
+            logger.warning("The LED worker did not stop in time. Terminating it.")
+            self._process.terminate()
+        self._connection.close()
+
+    def __start(self):
+        # duplex, so that the worker can acknowledge SYNC frames
+        receiver, self._connection = self._context.Pipe()
+        self._process = self._context.Process(target=serve, name='led_worker', daemon=True,
+            args=(receiver, self._set_rotation, self._low_light, self._sense_factory))
+        self._process.start()
+        # only the worker uses the other end of the pipe
+        receiver.close()
+        self._is_enabled = True
+        logger.info(f"Started an LED worker process (pid '{self._process.pid}').")
+
+    def __send(self, frame:bytes)->bool:
+        if not self.is_enabled:
+            return False
+        if not self._process.is_alive():
+            logger.warning(f"The LED worker exited with code '{self._process.exitcode}'. Restarting it.")
+            self._connection.close()
+            self.__start()
+        try:
+            self._connection.send_bytes(frame)
+        except OSError as oerr:
+            logger.warning(f"Unable to send a command to the LED worker. Dropping it. Error: {oerr}")
+            return False
+        return True
+
+    def __sync(self, timeout:float, heartbeat=None):
+        # wait for the acknowledgement of the SYNC frame, unless the worker dies, is disabled or is stuck
+        connection = self._connection
+        ends = monotonic() + timeout
+        while self.is_enabled and self._process.is_alive():
+            remaining = ends - monotonic()
+            if remaining <= 0:
+                # no more heartbeats for a stuck worker
+                logger.warning(f"The LED worker did not run its commands within '{timeout:.1f}' seconds. Restarting it.")
+                self._process.terminate()
+                self._process.join(LedWorker.STOP_TIMEOUT)
+                if self._process.is_alive():
+                    self._process.kill()
+                self._connection.close()
+                self.__start()
+                return
+            if heartbeat: heartbeat()
+            try:
+                if connection.poll(min(remaining, LedWorker.SYNC_INTERVAL)):
+                    connection.recv_bytes()
+                    return
+            except (OSError, EOFError):
+                return
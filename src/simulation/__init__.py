@@ -0,0 +1,4 @@
+from src.simulation.backends import *
+from src.simulation.broker import *
+from src.simulation.fleet import *
+from src.simulation.soak import *
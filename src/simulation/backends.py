@@ -0,0 +1,250 @@
+"""
+Module that contains virtual SenseHAT backends, i.e., objects with the subset of the
+SenseHat API used by SenseHatSensor that return synthetic or recorded values, and a virtual
+LED matrix for SenseHatLed.
+"""
+
+# local imports
+from src.constants import constants as const
+from src.errors import errors as err
+# external imports
+import logging
+import json
+import random
+from collections import namedtuple
+from math import cos, pi, radians, sin
+from threading import Lock
+from time import sleep, time
+from zlib import crc32
+
+# start a loggin instance for this module using constants
+logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+# same fields as the events of sense_hat's joystick (sense_hat.stick.InputEvent)
+InputEvent = namedtuple('InputEvent', ('timestamp', 'direction', 'action'))
+
+class VirtualStick():
+    """
+    Class that generates a virtual SenseHat joystick whose directions are pressed by calling press(),
+    or down() and then up() to hold them. It may be pressed from another thread than the reader's.
+    """
+    # same values as the sense_hat ACTION_* constants
+    PRESSED = 'pressed'
+    RELEASED = 'released'
+
+    def __init__(self, clock = time):
+        self._clock = clock
+        self._events = []
+        self._lock = Lock()
+
+    def press(self, direction:str):
+        self.down(direction)
+        self.up(direction)
+
+    def down(self, direction:str):
+        with self._lock:
+            self._events.append(InputEvent(self._clock(), direction, VirtualStick.PRESSED))
+
+    def up(self, direction:str):
+        with self._lock:
+            self._events.append(InputEvent(self._clock(), direction, VirtualStick.RELEASED))
+
+    def get_events(self)->list:
+        with self._lock:
+            events, self._events = self._events, []
+        return events
+
+class SyntheticSense():
+    """
+    Class that generates a virtual SenseHat with plausible, slowly changing readings and a
+    virtual joystick ('stick'). Each seed produces a different (but reproducible) device.
+    Pass a 'clock' (a callable that returns epoch seconds) to simulate days in minutes.
+    """
+    # one simulated day, in seconds
+    DAY = 86400
+    # horizontal and vertical (z up) components of the magnetic field, in microteslas
+    FIELD = (20.0, -40.0)
+
+    def __init__(self, seed:int = None, clock = time):
+        self._clock = clock
+        self.stick = VirtualStick(clock)
+        self._random = random.Random(seed)
+        self._pressure = self._random.uniform(995, 1025)
+        self._temperature = self._random.uniform(18, 24)
+        self._humidity = self._random.uniform(35, 55)
+        self._compass = self._random.uniform(0, 360)
+        # phase of the daily temperature cycle
+        self._phase = self._random.uniform(0, 2 * pi)
+
+    def get_pressure(self):
+        self._pressure += self._random.gauss(0, 0.05)
+        return self._pressure
+
+    def get_temperature(self):
+        return self._temperature + 2 * sin(2 * pi * self._clock() / SyntheticSense.DAY + self._phase) + self._random.gauss(0, 0.05)
+
+    def get_temperature_from_pressure(self):
+        return self.get_temperature() + 1.5
+
+    def get_humidity(self):
+        self._humidity = min(100.0, max(0.0, self._humidity + self._random.gauss(0, 0.1)))
+        return self._humidity
+
+    def get_gyroscope_raw(self):
+        return {axis: self._random.gauss(0, 0.01) for axis in ('x', 'y', 'z')}
+
+    def get_compass(self):
+        self._compass = (self._compass + self._random.gauss(0, 0.2)) % 360
+        return self._compass
+
+    def get_compass_raw(self):
+        # the field of a level device that points 'compass' degrees away from north
+        horizontal, vertical = SyntheticSense.FIELD
+        heading = radians(self._compass)
+        return {'x': horizontal * cos(heading) + self._random.gauss(0, 0.1),
+            'y': -horizontal * sin(heading) + self._random.gauss(0, 0.1), 'z': vertical + self._random.gauss(0, 0.1)}
+
+    def get_accelerometer_raw(self):
+        return {'x': self._random.gauss(0, 0.01), 'y': self._random.gauss(0, 0.01), 'z': 1 + self._random.gauss(0, 0.01)}
+
+class ReplaySense():
+    """
+    Class that generates a virtual SenseHat that replays recorded sensor payloads.
+    Records are dicts in the SenseHatSensor.sensors_data() format (e.g., one JSON payload per
+    line captured from a 'sensor/status' topic) and are replayed in a loop, starting at 'offset'.
+    Recorded values already include multipliers, so use multipliers of 1.0 with this backend.
+    """
+    def __init__(self, records:list, offset:int = 0):
+        if not records:
+            logger.info("A replay backend needs at least one record.")
+            raise err.InvalidSenseAttr("A replay backend needs at least one record.", 'records')
+        self._records = records
+        self._index = offset % len(records)
+        self._record = records[self._index]
+
+    @staticmethod
+    def load(path_file:str)->list:
+        """
+        Method that loads records from a file with one JSON payload per line.
+        """
+        with open(path_file) as records_file:
+            return [json.loads(line) for line in records_file if line.strip()]
+
+    def __next(self):
+        # the first read of each cycle (see SenseHatSensor.sensors_data()) moves to the next record
+        self._index = (self._index + 1) % len(self._records)
+        self._record = self._records[self._index]
+
+    def get_pressure(self):
+        self.__next()
+        return self._record['pressure']
+
+    def get_temperature(self):
+        return self._record['temperature']['from_humidity']
+
+    def get_temperature_from_pressure(self):
+        return self._record['temperature']['from_pressure']
+
+    def get_humidity(self):
+        return self._record['humidity']
+
+    def get_gyroscope_raw(self):
+        gyroscope = self._record['gyroscope']
+        return {'x': gyroscope['pitch'], 'y': gyroscope['roll'], 'z': gyroscope['yaw']}
+
+    def get_compass(self):
+        return self._record['compass']['north']
+
+    def get_compass_raw(self):
+        # recorded payloads only have the heading, so assume a level device
+        horizontal, vertical = SyntheticSense.FIELD
+        heading = radians(self._record['compass']['north'])
+        return {'x': horizontal * cos(heading), 'y': -horizontal * sin(heading), 'z': vertical}
+
+    def get_accelerometer_raw(self):
+        return dict(self._record['acceleration'])
+
+class VirtualLed():
+    """
+    Class that generates a virtual SenseHat LED matrix.
+    It does the same kind of pure Python work as the sense_hat library, namely per-pixel
+    validation, RGB565 packing into a framebuffer and one frame per column of scrolled text,
+    so it loads the interpreter like a real matrix does. Glyphs and images are made up.
+    """
+    # width and height of the matrix
+    SIZE = 8
+    # columns of each glyph, followed by a blank one
+    GLYPH_WIDTH = 4
+
+    def __init__(self):
+        self.low_light = False
+        self._rotation = 0
+        self._pixels = [[0, 0, 0]] * VirtualLed.SIZE**2
+        self._framebuffer = bytearray(VirtualLed.SIZE**2 * 2)
+
+    def set_rotation(self, r:int = 0, redraw:bool = True):
+        self._rotation = r
+
+    def get_pixels(self)->list:
+        return [list(pixel) for pixel in self._pixels]
+
+    def set_pixels(self, pixel_list:list):
+        if len(pixel_list) != VirtualLed.SIZE**2:
+            raise ValueError('Pixel lists must have 64 elements')
+        for index, pixel in enumerate(pixel_list):
+            if len(pixel) != 3 or not all(0 <= c <= 255 for c in pixel):
+                raise ValueError(f"Pixel at index {index} is invalid")
+            # RGB565, as written to the framebuffer device
+            value = ((pixel[0] >> 3) << 11) | ((pixel[1] >> 2) << 5) | (pixel[2] >> 3)
+            self._framebuffer[index * 2:index * 2 + 2] = value.to_bytes(2, 'little')
+        self._pixels = [list(pixel) for pixel in pixel_list]
+
+    def set_pixel(self, x:int, y:int, *args):
+        pixels = self.get_pixels()
+        pixels[y * VirtualLed.SIZE + x] = list(args[0] if len(args) == 1 else args)
+        self.set_pixels(pixels)
+
+    def clear(self, *args):
+        colour = list(args[0] if len(args) == 1 else args) if args else [0, 0, 0]
+        self.set_pixels([colour] * VirtualLed.SIZE**2)
+
+    def load_image(self, file_path:str, redraw:bool = True)->list:
+        with open(file_path, 'rb') as image_file:
+            data = image_file.read()
+        pixels = [[data[i % len(data)], data[(i * 7) % len(data)], data[(i * 13) % len(data)]]
+            for i in range(VirtualLed.SIZE**2)]
+        if redraw:
+            self.set_pixels(pixels)
+        return pixels
+
+    def show_letter(self, s:str, text_colour:list = [255, 255, 255], back_colour:list = [0, 0, 0]):
+        columns = self.__columns(s[:1])
+        self.set_pixels(self.__frame(columns + [0] * (VirtualLed.SIZE - len(columns)), text_colour, back_colour))
+
+    def show_message(self, text_string:str, scroll_speed:float = .1, text_colour:list = [255, 255, 255],
+                    back_colour:list = [0, 0, 0]):
+        # like sense_hat, render every frame of the text scrolling from right to left before showing them
+        columns = [0] * VirtualLed.SIZE + self.__columns(text_string) + [0] * VirtualLed.SIZE
+        frames = [self.__frame(columns[offset:offset + VirtualLed.SIZE], text_colour, back_colour)
+            for offset in range(len(columns) - VirtualLed.SIZE + 1)]
+        for frame in frames:
+            self.set_pixels(frame)
+            sleep(scroll_speed)
+        self.set_pixels(self.__frame([0] * VirtualLed.SIZE, text_colour, back_colour))
+
+    @staticmethod
+    def __columns(text:str)->list:
+        # each column is a byte whose bits are the rows that are on
+        columns = []
+        for char in text:
+            columns.extend(crc32(char.encode('utf-8')).to_bytes(VirtualLed.GLYPH_WIDTH, 'big'))
+            columns.append(0)
+        return columns
+
+    @staticmethod
+    def __frame(columns:list, text_colour:list, back_colour:list)->list:
+        return [list(text_colour) if columns[x] >> y & 1 else list(back_colour)
+            for y in range(VirtualLed.SIZE) for x in range(VirtualLed.SIZE)]
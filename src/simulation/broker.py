@@ -0,0 +1,212 @@
+"""
+Module that contains a minimal, in-process MQTT 3.1.1 broker to stand in for a real one
+in simulations and benchmarks. It supports QoS 0 and 1 publishing (delivery is always QoS 0),
+retained messages, wildcard subscriptions and keepalive pings. Do not use it in production.
+"""
+
+# local imports
+from src.constants import constants as const
+# external imports
+import asyncio
+import logging
+import struct
+from threading import Event, Thread
+
+# start a loggin instance for this module using constants
+logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+def topic_matches(topic_filter:str, topic:str)->bool:
+    """
+    Returns True if 'topic' matches the subscription 'topic_filter' (with '+' and '#' wildcards).
+    """
+    filter_levels = topic_filter.split('/')
+    topic_levels = topic.split('/')
+    for i, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if i >= len(topic_levels) or (level != '+' and level != topic_levels[i]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+class BrokerStandIn():
+    """
+    Class that generates a minimal MQTT broker that runs its own asyncio loop in a daemon thread.
+    Use port 0 to bind to a free port and read it from 'port' after start().
+    """
+    # control packet types
+    CONNECT = 1
+    CONNACK = 2
+    PUBLISH = 3
+    PUBACK = 4
+    SUBSCRIBE = 8
+    SUBACK = 9
+    UNSUBSCRIBE = 10
+    UNSUBACK = 11
+    PINGREQ = 12
+    PINGRESP = 13
+    DISCONNECT = 14
+
+    def __init__(self, host:str = '127.0.0.1', port:int = 0, ssl_context = None):
+        self._host = host
+        self._port = port
+        # optional ssl.SSLContext to serve MQTT over TLS
+        self._ssl_context = ssl_context
+        # sessions by client id and the subscriptions (filter -> writer) of each
+        self._sessions = {}
+        self._retained = {}
+        # counters
+        self._received = 0
+        self._delivered = 0
+        self._connections = 0
+        # helpers
+        self._loop = None
+        self._server = None
+        self._started = Event()
+
+    @property
+    def port(self):
+        return self._port
+
+    @property
+    def url(self):
+        scheme = 'mqtts' if self._ssl_context else 'mqtt'
+        return f"{scheme}://{self._host}:{self._port}"
+
+    @property
+    def received(self):
+        return self._received
+
+    @property
+    def delivered(self):
+        return self._delivered
+
+    @property
+    def connections(self):
+        return self._connections
+
+    def start(self):
+        """
+        Method that starts the broker in a daemon thread and blocks until it is listening.
+        """
+        Thread(target=self.__run, daemon=True).start()
+        self._started.wait()
+        logger.info(f"A broker stand-in is listening on '{self.url}'.")
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def __run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self.__handle, self._host, self._port, ssl=self._ssl_context))
+        self._port = self._server.sockets[0].getsockname()[1]
+        self._started.set()
+        self._loop.run_forever()
+
+    @staticmethod
+    def __packet(packet_type:int, flags:int, body:bytes)->bytes:
+        # fixed header with a variable length 'remaining length'
+        header = bytearray([packet_type << 4 | flags])
+        length = len(body)
+        while True:
+            byte = length % 128
+            length //= 128
+            header.append(byte | 0x80 if length else byte)
+            if not length:
+                return bytes(header) + body
+
+    @staticmethod
+    def __string(data:bytes, offset:int):
+        length = struct.unpack_from('!H', data, offset)[0]
+        return data[offset + 2:offset + 2 + length].decode('utf-8'), offset + 2 + length
+
+    async def __read_packet(self, reader:asyncio.StreamReader):
+        first = (await reader.readexactly(1))[0]
+        length, multiplier = 0, 1
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7f) * multiplier
+            multiplier *= 128
+            if not byte & 0x80:
+                break
+        return first >> 4, first & 0x0f, await reader.readexactly(length)
+
+    async def __handle(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter):
+        self._connections += 1
+        client_id = None
+        subscriptions = set()
+        try:
+            while True:
+                packet_type, flags, body = await self.__read_packet(reader)
+                if packet_type == BrokerStandIn.CONNECT:
+                    # protocol name, level, flags, keepalive, then the client id
+                    _, offset = self.__string(body, 0)
+                    if body[offset] != 4:
+                        # only MQTT 3.1.1; refuse other versions like a 3.1.1 broker does
+                        writer.write(self.__packet(BrokerStandIn.CONNACK, 0, b'\x00\x01'))
+                        break
+                    client_id, _ = self.__string(body, offset + 4)
+                    # take over sessions with the same client id
+                    previous = self._sessions.get(client_id)
+                    if previous is not None:
+                        previous[0].close()
+                    self._sessions[client_id] = (writer, subscriptions)
+                    writer.write(self.__packet(BrokerStandIn.CONNACK, 0, b'\x00\x00'))
+                elif packet_type == BrokerStandIn.PUBLISH:
+                    topic, offset = self.__string(body, 0)
+                    qos = (flags >> 1) & 0x03
+                    if qos:
+                        writer.write(self.__packet(BrokerStandIn.PUBACK, 0, body[offset:offset + 2]))
+                        offset += 2
+                    payload = body[offset:]
+                    self._received += 1
+                    if flags & 0x01:
+                        if payload:
+                            self._retained[topic] = payload
+                        else:
+                            self._retained.pop(topic, None)
+                    self.__route(topic, payload)
+                elif packet_type == BrokerStandIn.SUBSCRIBE:
+                    packet_id, offset = body[:2], 2
+                    granted = bytearray()
+                    while offset < len(body):
+                        topic_filter, offset = self.__string(body, offset)
+                        offset += 1
+                        subscriptions.add(topic_filter)
+                        granted.append(0)
+                    writer.write(self.__packet(BrokerStandIn.SUBACK, 0, packet_id + bytes(granted)))
+                    for topic, payload in list(self._retained.items()):
+                        if any(topic_matches(f, topic) for f in subscriptions):
+                            self.__send(writer, topic, payload, retain=True)
+                elif packet_type == BrokerStandIn.UNSUBSCRIBE:
+                    offset = 2
+                    while offset < len(body):
+                        topic_filter, offset = self.__string(body, offset)
+                        subscriptions.discard(topic_filter)
+                    writer.write(self.__packet(BrokerStandIn.UNSUBACK, 0, body[:2]))
+                elif packet_type == BrokerStandIn.PINGREQ:
+                    writer.write(self.__packet(BrokerStandIn.PINGRESP, 0, b''))
+                elif packet_type == BrokerStandIn.DISCONNECT:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        finally:
+            if client_id is not None and self._sessions.get(client_id, (None,))[0] is writer:
+                del self._sessions[client_id]
+            writer.close()
+
+    def __route(self, topic:str, payload:bytes):
+        for writer, subscriptions in list(self._sessions.values()):
+            if any(topic_matches(f, topic) for f in subscriptions):
+                self.__send(writer, topic, payload)
+
+    def __send(self, writer:asyncio.StreamWriter, topic:str, payload:bytes, retain:bool = False):
+        encoded = topic.encode('utf-8')
+        body = struct.pack('!H', len(encoded)) + encoded + payload
+        writer.write(self.__packet(BrokerStandIn.PUBLISH, 0x01 if retain else 0, body))
+        self._delivered += 1
@@ -0,0 +1,219 @@
+"""
+Module that simulates a fleet of virtual SenseHATs in a single process.
+Each virtual device has its own 'zone/room/client_name' topic tree and uses the regular
+SenseHatSensor, MqttClientPub and MqttClientSub classes with a virtual backend. All devices
+share a small pool of worker threads that drive their (non-threaded) MQTT clients.
+"""
+
+# local imports
+from src.constants import constants as const
+from src.mqtt import mqtt
+from src.sensehat import payload, sensehat
+# external imports
+import logging
+import json
+import selectors
+from collections import deque
+from threading import Event, Lock, Thread
+from time import monotonic, time
+
+# start a loggin instance for this module using constants
+logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+class FleetStats():
+    """
+    Class that aggregates publish counts and end-to-end latencies across a fleet.
+    """
+    # number of latency samples kept for percentiles
+    SAMPLES = 100000
+
+    def __init__(self):
+        self._lock = Lock()
+        self._published = 0
+        self._received = 0
+        self._latencies = deque(maxlen=FleetStats.SAMPLES)
+        self._started = monotonic()
+
+    def published(self):
+        with self._lock:
+            self._published += 1
+
+    def received(self, latency:float):
+        with self._lock:
+            self._received += 1
+            self._latencies.append(latency)
+
+    def report(self)->dict:
+        """
+        Method that returns a dict with throughput (messages/second) and latency percentiles (ms).
+        """
+        with self._lock:
+            elapsed = max(monotonic() - self._started, 1e-9)
+            latencies = sorted(self._latencies)
+            published, received = self._published, self._received
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 3) if latencies else None
+        return {
+            'elapsed': round(elapsed, 1),
+            'published': published,
+            'received': received,
+            'publish_rate': round(published / elapsed, 1),
+            'receive_rate': round(received / elapsed, 1),
+            'latency_p50_ms': percentile(0.50),
+            'latency_p95_ms': percentile(0.95),
+            'latency_p99_ms': percentile(0.99),
+            'latency_max_ms': percentile(1.0),
+        }
+
+class MonitorClient(mqtt.MqttClientSub):
+    """
+    Class that generates a subscriber that measures the latency of sensor payloads, i.e., the
+    time between the 'timestamp' of a reading and its delivery by the broker.
+    """
+    def __init__(self, stats:FleetStats, topic:str, **kwargs):
+        super().__init__(**kwargs)
+        self._stats = stats
+        self.full_topic = topic
+
+    def on_message(self, client, userdata, message):
+        # retained messages may come from previous runs
+        if message.retain:
+            return
+        try:
+            timestamp = float(json.loads(message.payload)['timestamp'])
+        except (ValueError, KeyError, TypeError):
+            return
+        self._stats.received(time() - timestamp)
+
+class VirtualDevice():
+    """
+    Class that generates a virtual SenseHAT device that publishes sensor data every
+    'resolution' seconds and consumes (counts) LED commands.
+    """
+    def __init__(self, broker_address:str, zone:str, room:str, client_name:str, backend,
+                resolution:float, stats:FleetStats, offset:float = 0.0, user:str = None, password:str = None,
+                acceleration_multiplier:float = 1.0, gyroscope_multiplier:float = 1.0):
+        self._client_name = client_name
+        self._resolution = resolution
+        self._stats = stats
+        self._commands = 0
+        self._next = monotonic() + offset
+        # virtual backends never block, so read them in the worker thread
+        self._sensor = sensehat.SenseHatSensor(acceleration_multiplier=acceleration_multiplier,
+            gyroscope_multiplier=gyroscope_multiplier, read_timeout=None, sense=backend)
+        self._serializer = payload.SensorSerializer()
+        common = dict(broker_address=broker_address, zone=zone, room=room, client_name=client_name,
+            user=user, password=password, threaded=False)
+        self._pub = mqtt.MqttClientPub(type='sensor', client_id=f"{client_name}_sensor", **common)
+        self._sub = mqtt.MqttClientSub(type='led', client_id=f"{client_name}_led", **common)
+
+    @property
+    def client_name(self):
+        return self._client_name
+
+    @property
+    def clients(self):
+        return [self._pub, self._sub]
+
+    @property
+    def commands(self):
+        return self._commands
+
+    @property
+    def is_connected(self):
+        return self._pub.is_connected and self._sub.is_connected
+
+    def step(self, now:float):
+        """
+        Method that consumes LED commands and publishes a reading if one is due.
+        """
+        while not self._sub.messages.empty():
+            self._sub.messages.get()
+            self._commands += 1
+        if now >= self._next and self._pub.is_connected:
+            self._pub.publish_raw(self._serializer.serialize(self._sensor.sensors_values(), self._sensor.stale))
+            self._stats.published()
+            # stay on the same phase and skip missed ticks
+            self._next += self._resolution * (int((now - self._next) / self._resolution) + 1)
+
+    def disable(self):
+        for client in self.clients:
+            client.disable()
+        self._sensor.disable()
+
+class Fleet():
+    """
+    Class that generates a fleet of virtual devices driven by 'workers' threads. Each worker
+    runs a single event loop (epoll, where available) over the sockets of all of its clients.
+    """
+    # maximum time (in seconds) a worker waits for socket events between passes over its devices
+    IDLE_WAIT = 0.005
+    # time (in seconds) between keepalive checks of each client
+    MISC_INTERVAL = 1.0
+    # maximum packets read from a readable socket per pass
+    MAX_READS = 64
+
+    def __init__(self, devices:list, workers:int = 4, monitor:MonitorClient = None):
+        self._devices = devices
+        self._workers = max(1, workers)
+        self._monitor = monitor
+        self._stop = Event()
+        self._threads = []
+
+    @property
+    def devices(self):
+        return self._devices
+
+    @property
+    def connected(self):
+        return sum(1 for d in self._devices if d.is_connected)
+
+    def start(self):
+        for i in range(self._workers):
+            devices = self._devices[i::self._workers]
+            thread = Thread(target=self.__work, args=(devices, self._monitor if i == 0 else None), daemon=True)
+            self._threads.append(thread)
+            thread.start()
+        logger.info(f"Started a fleet of '{len(self._devices)}' virtual devices on '{self._workers}' workers.")
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        for device in self._devices:
+            device.disable()
+        if self._monitor:
+            self._monitor.disable()
+
+    def __work(self, devices:list, monitor:MonitorClient):
+        selector = selectors.DefaultSelector()
+        clients = [client for device in devices for client in device.clients] + ([monitor] if monitor else [])
+        sockets = {}
+        next_misc = monotonic()
+        while not self._stop.is_set():
+            current = {client: client.loop_socket() for client in clients}
+            # unregister every replaced socket before registering new ones, because a closed
+            # socket's file descriptor may have been reused by another client
+            for client in [c for c in sockets if sockets[c] is not current[c]]:
+                try:
+                    selector.unregister(sockets.pop(client))
+                except (KeyError, ValueError):
+                    pass
+            for client, sock in current.items():
+                if sock is not None and client not in sockets:
+                    selector.register(sock, selectors.EVENT_READ, client)
+                    sockets[client] = sock
+            readable = {key.data for key, _ in selector.select(Fleet.IDLE_WAIT)}
+            now = monotonic()
+            misc = now >= next_misc
+            if misc:
+                next_misc = now + Fleet.MISC_INTERVAL
+            for client in list(sockets):
+                if misc or client in readable or client.client.want_write():
+                    client.loop_io(client in readable, misc=misc, max_reads=Fleet.MAX_READS)
+            for device in devices:
+                device.step(now)
+        selector.close()
@@ -0,0 +1,184 @@
+"""
+Module that contains a soak test of the daemon's pipeline: the sensor, LED and joystick paths
+of rpi_sensehat_mqtt.py run against a virtual SenseHAT with a simulated clock, so days of
+readings pass in minutes, while the memory of the process is sampled.
+"""
+
+# local imports
+from src.analytics import AdaptiveSampler, EventDetector, RulesEngine
+from src.constants import constants as const
+from src.errors import errors as err
+from src.mqtt import mqtt
+from src.sensehat import payload, sensehat
+from src.simulation.backends import SyntheticSense, VirtualLed
+from src.utils.watchdog import Watchdog
+# external imports
+import logging
+import gc
+import os
+import random
+from collections import Counter
+from time import monotonic, sleep, time
+
+# start a loggin instance for this module using constants
+logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+class MemoryProbe():
+    """
+    Class that generates a probe of the memory used by this process, namely its resident set
+    size (RSS) and the number of objects tracked by the garbage collector.
+    """
+    # sample record keys convention
+    RSS = 'rss_kb'
+    OBJECTS = 'objects'
+
+    def __init__(self):
+        self._page_kb = os.sysconf('SC_PAGE_SIZE') // 1024 if hasattr(os, 'sysconf') else 4
+
+    # class specific methods
+    def rss(self)->int:
+        """
+        Method that returns the current RSS in KiB (the peak RSS where /proc is not available).
+        """
+        try:
+            with open('/proc/self/statm', 'r') as statm:
+                return int(statm.read().split()[1]) * self._page_kb
+        except OSError:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def sample(self)->dict:
+        # collect first, so garbage that is merely waiting for a collection does not count
+        gc.collect()
+        return {MemoryProbe.RSS: self.rss(), MemoryProbe.OBJECTS: len(gc.get_objects())}
+
+    @staticmethod
+    def types()->Counter:
+        """
+        Method that returns the number of objects tracked by the garbage collector by type.
+        """
+        gc.collect()
+        return Counter(type(o).__qualname__ for o in gc.get_objects())
+
+class SoakPipeline():
+    """
+    Class that generates the pipeline of a single device, with the same objects as the daemon:
+    sensor readings are serialized and published, go through the adaptive sampler, the event
+    detector and the rules engine; LED commands are published by a controller client, queued
+    by the LED subscriber and run on a virtual LED matrix; joystick directions are published
+    and matched against the rules. MQTT clients are not threaded and every step() pumps them.
+    """
+    # LED commands sent by the controller, in turn
+    LED_COMMANDS = [
+        [{'clear': []}],
+        [{'load_image': ['assets/battery/battery-50.png']}],
+        [{'set_pixel': [0, 0, [255, 0, 0]]}, {'set_pixel': [7, 7, [0, 255, 0]]}],
+        [{'show_letter': ['S', [0, 0, 255]]}],
+    ]
+    DIRECTIONS = ['up', 'down', 'left', 'right', 'middle']
+
+    def __init__(self, broker_address:str, resolution:float = 5.0, led_every:int = 10, joystick_every:int = 25,
+                rules_file:str = None, seed:int = 0, user:str = None, password:str = None):
+        self._resolution = resolution
+        self._led_every = led_every
+        self._joystick_every = joystick_every
+        self._random = random.Random(seed)
+        self._steps = 0
+        # simulated epoch time of the current step
+        self._now = time()
+        self._backend = SyntheticSense(seed=seed, clock=lambda: self._now)
+        self._sensor = sensehat.SenseHatSensor(sense=self._backend, read_timeout=None)
+        self._led = sensehat.SenseHatLed(sense=VirtualLed())
+        self._joystick = sensehat.SenseHatJoystick(sense=self._backend)
+        self._serializer = payload.SensorSerializer()
+        self._sampler = AdaptiveSampler(idle_resolution=resolution, active_resolution=resolution,
+            motion_up=0.5, motion_down=0.2, change_up=1.0, change_down=0.2)
+        self._detector = EventDetector(shake_threshold=14.7, tilt_angle=45.0,
+            temperature_threshold=21.0, temperature_hysteresis=0.5, humidity_threshold=45.0, humidity_hysteresis=2.0)
+        self._rules = RulesEngine.load(rules_file) if rules_file else None
+        self._watchdog = Watchdog()
+        self._watchdog.watch('sensor', resolution, resolution)
+        common = dict(broker_address=broker_address, zone='soak', room='room', client_name=f"soak{seed:03d}",
+            user=user, password=password, threaded=False)
+        self._pub_sensor = mqtt.MqttClientPub(type='sensor', client_id=f"soak{seed:03d}_sensor", **common)
+        self._pub_joystick = mqtt.MqttClientPub(type='joystick', client_id=f"soak{seed:03d}_joystick", **common)
+        self._pub_events = mqtt.MqttClientPub(type='events', client_id=f"soak{seed:03d}_events", **common)
+        self._sub_led = mqtt.MqttClientSub(type='led', client_id=f"soak{seed:03d}_led", **common)
+        # the remote controller publishes to the LED subscriber's command topic
+        self._controller = mqtt.MqttClientPub(type='led', client_id=f"soak{seed:03d}_controller", **common)
+        self._controller.full_topic = self._sub_led.full_topic
+        self._clients = [self._pub_sensor, self._pub_joystick, self._pub_events, self._sub_led, self._controller]
+
+    @property
+    def steps(self):
+        return self._steps
+
+    @property
+    def simulated(self):
+        """
+        Simulated time (in seconds) since the first step
+        """
+        return self._steps * self._resolution
+
+    @property
+    def is_connected(self):
+        return all(client.is_connected for client in self._clients)
+
+    # class specific methods
+    def connect(self, timeout:float = 10.0)->bool:
+        """
+        Method that pumps the MQTT clients until all of them are connected or 'timeout' passes.
+        """
+        ends = monotonic() + timeout
+        while not self.is_connected and monotonic() < ends:
+            self.__pump(misc=True)
+            sleep(0.01)
+        return self.is_connected
+
+    def step(self):
+        """
+        Method that runs one reading (i.e., 'resolution' simulated seconds) through the pipeline.
+        """
+        self._steps += 1
+        self._now += self._resolution
+        values = self._sensor.sensors_values()
+        self._pub_sensor.publish_raw(self._serializer.serialize(values, self._sensor.stale))
+        self._sampler.update(values)
+        for event in self._detector.update(self._sensor.events_data()):
+            self._pub_events.publish(event, retain=False)
+        if self._rules:
+            self._led.run(self._rules.update(values))
+        if self._steps % self._led_every == 0:
+            self._controller.publish(SoakPipeline.LED_COMMANDS[self._steps // self._led_every % len(SoakPipeline.LED_COMMANDS)], retain=False)
+        if self._steps % self._joystick_every == 0:
+            self._backend.stick.press(self._random.choice(SoakPipeline.DIRECTIONS))
+        if self._joystick.poll():
+            while not self._joystick.directions.empty():
+                data = self._joystick.joystick_data()
+                self._pub_joystick.publish(data)
+                if self._rules:
+                    self._led.run(self._rules.joystick(data[sensehat.SenseHatJoystick.DIRECTION]))
+        while not self._sub_led.messages.empty():
+            try:
+                commands = self._sub_led.decoded_message()
+            except err.MqttDecodingError as mderr:
+                logger.warning(f"Could not decode an LED command: '{mderr.error}'.")
+                continue
+            self._led.run(commands if isinstance(commands, list) else [])
+        self._watchdog.beat('sensor')
+        self._watchdog.late()
+        self.__pump(misc=self._steps % 10 == 0)
+
+    def disable(self):
+        for client in self._clients:
+            client.disable()
+        for sense in [self._sensor, self._led, self._joystick]:
+            sense.disable()
+
+    def __pump(self, misc:bool):
+        for client in self._clients:
+            if client.loop_socket() is not None:
+                client.loop_io(readable=True, misc=misc, max_reads=8)
@@ -1,2 +1,4 @@
 from src.utils.config import *
 from src.utils.validate import *
+from src.utils.scheduler import *
+from src.utils.watchdog import *
@@ -28,12 +28,72 @@ class Configuration():
     MQTT_BROKER_ADDRESS = 'mqtt://127.0.0.1:1883'
     MQTT_ZONE = "downstairs"
     MQTT_ROOM = "livingroom"
+    MQTT_RECONNECT_MIN_DELAY = 1.0
+    MQTT_RECONNECT_MAX_DELAY = 120.0
+    MQTT_STARTUP_DELAY = 0.0
+    MQTT_PROTOCOL_VERSION = '3.1.1'
+    MQTT_MESSAGE_EXPIRY = 0
+    MQTT_TLS_INSECURE = False
     # SENSEHAT
     SENSEHAT_SET_ROTATION = 0
     SENSEHAT_LOW_LIGHT = True
     SENSEHAT_ROUNDING = 4
     SENSEHAT_ACCELERATION_MULTIPLIER = 9.80665
     SENSEHAT_GYROSCOPE_MULTIPLIER = 1.0
+    SENSEHAT_READ_TIMEOUT = 2.0
+    # LED
+    LED_QUEUE_SIZE = 16
+    LED_QUEUE_POLICY = 'drop_oldest'
+    LED_RATE = 0.0
+    LED_BURST = 5.0
+    LED_WORKER = False
+    # SAMPLING
+    SAMPLING_ADAPTIVE = False
+    SAMPLING_ACTIVE_RESOLUTION = 5
+    SAMPLING_MOTION_UP = 0.5
+    SAMPLING_MOTION_DOWN = 0.2
+    SAMPLING_CHANGE_UP = 1.0
+    SAMPLING_CHANGE_DOWN = 0.2
+    # EVENTS
+    EVENTS_ENABLED = False
+    EVENTS_RESOLUTION = 0.2
+    EVENTS_SHAKE_THRESHOLD = 14.7
+    EVENTS_TILT_ANGLE = 45.0
+    EVENTS_TEMPERATURE_HYSTERESIS = 0.5
+    EVENTS_HUMIDITY_HYSTERESIS = 2.0
+    # DIAGNOSTICS
+    DIAGNOSTICS_ENABLED = False
+    DIAGNOSTICS_MAX_DURATION = 60.0
+    DIAGNOSTICS_TOP = 20
+    # WATCHDOG
+    WATCHDOG_BUDGET = 30.0
+    WATCHDOG_INTERVAL = 10.0
+    WATCHDOG_PUBLISH_INTERVAL = 60.0
+    # RULES
+    RULES_ENABLED = False
+    RULES_FILE = 'rules.json'
+    # ORIENTATION
+    ORIENTATION_ENABLED = False
+    ORIENTATION_RESOLUTION = 0.02
+    ORIENTATION_PUBLISH_INTERVAL = 1.0
+    ORIENTATION_BETA = 0.1
+    # HISTORY
+    HISTORY_ENABLED = False
+    HISTORY_SIZE = 2880
+    HISTORY_BATCH = 100
+    HISTORY_COMPRESSION = True
+    # JOYSTICK
+    JOYSTICK_POLL_INTERVAL = 1.0
+    JOYSTICK_GESTURES = False
+    JOYSTICK_DOUBLE_PRESS_WINDOW = 0.4
+    JOYSTICK_HOLD_TIME = 1.0
+    JOYSTICK_SEQUENCE_WINDOW = 0.6
+    # BROKERS; extra brokers are '[broker:<name>]' sections
+    BROKER_SECTION = 'broker:'
+    BROKER_QOS = 0
+    BROKER_PREFIX = ''
+    BROKER_ENCODING = 'json'
+    BROKER_QUEUE_SIZE = 1000
 
     def __init__(self, config_dir = './', config_file = 'CONFIG.ini'):
         if not val.file_exists(config_dir + config_file):
@@ -54,11 +114,66 @@ class Configuration():
         self.__mqtt_credentials_enabled = False
         self.__mqtt_zone = Configuration.MQTT_ZONE
         self.__mqtt_room = Configuration.MQTT_ROOM
+        self.__mqtt_reconnect_min_delay = Configuration.MQTT_RECONNECT_MIN_DELAY
+        self.__mqtt_reconnect_max_delay = Configuration.MQTT_RECONNECT_MAX_DELAY
+        self.__mqtt_startup_delay = Configuration.MQTT_STARTUP_DELAY
+        self.__mqtt_protocol_version = Configuration.MQTT_PROTOCOL_VERSION
+        self.__mqtt_message_expiry = Configuration.MQTT_MESSAGE_EXPIRY
+        self.__mqtt_ca_certs = None
+        self.__mqtt_certfile = None
+        self.__mqtt_keyfile = None
+        self.__mqtt_tls_insecure = Configuration.MQTT_TLS_INSECURE
         self.__sensehat_set_rotation = Configuration.SENSEHAT_SET_ROTATION
         self.__sensehat_low_light = Configuration.SENSEHAT_LOW_LIGHT
         self.__sensehat_rounding = Configuration.SENSEHAT_ROUNDING
         self.__sensehat_acceleration_multiplier = Configuration.SENSEHAT_ACCELERATION_MULTIPLIER
         self.__sensehat_gyroscope_multiplier = Configuration.SENSEHAT_GYROSCOPE_MULTIPLIER
+        self.__sensehat_read_timeout = Configuration.SENSEHAT_READ_TIMEOUT
+        self.__led_queue_size = Configuration.LED_QUEUE_SIZE
+        self.__led_queue_policy = Configuration.LED_QUEUE_POLICY
+        self.__led_rate = Configuration.LED_RATE
+        self.__led_burst = Configuration.LED_BURST
+        self.__led_worker = Configuration.LED_WORKER
+        self.__sampling_adaptive = Configuration.SAMPLING_ADAPTIVE
+        self.__sampling_idle_resolution = None
+        self.__sampling_active_resolution = Configuration.SAMPLING_ACTIVE_RESOLUTION
+        self.__sampling_motion_up = Configuration.SAMPLING_MOTION_UP
+        self.__sampling_motion_down = Configuration.SAMPLING_MOTION_DOWN
+        self.__sampling_change_up = Configuration.SAMPLING_CHANGE_UP
+        self.__sampling_change_down = Configuration.SAMPLING_CHANGE_DOWN
+        self.__events_enabled = Configuration.EVENTS_ENABLED
+        self.__events_resolution = Configuration.EVENTS_RESOLUTION
+        self.__events_shake_threshold = Configuration.EVENTS_SHAKE_THRESHOLD
+        self.__events_tilt_angle = Configuration.EVENTS_TILT_ANGLE
+        self.__events_temperature_threshold = None
+        self.__events_temperature_hysteresis = Configuration.EVENTS_TEMPERATURE_HYSTERESIS
+        self.__events_humidity_threshold = None
+        self.__events_humidity_hysteresis = Configuration.EVENTS_HUMIDITY_HYSTERESIS
+        self.__diagnostics_enabled = Configuration.DIAGNOSTICS_ENABLED
+        self.__diagnostics_token = None
+        self.__diagnostics_max_duration = Configuration.DIAGNOSTICS_MAX_DURATION
+        self.__diagnostics_top = Configuration.DIAGNOSTICS_TOP
+        self.__watchdog_budget = Configuration.WATCHDOG_BUDGET
+        self.__watchdog_interval = Configuration.WATCHDOG_INTERVAL
+        self.__watchdog_publish_interval = Configuration.WATCHDOG_PUBLISH_INTERVAL
+        self.__rules_enabled = Configuration.RULES_ENABLED
+        self.__rules_file = Configuration.RULES_FILE
+        self.__orientation_enabled = Configuration.ORIENTATION_ENABLED
+        self.__orientation_resolution = Configuration.ORIENTATION_RESOLUTION
+        self.__orientation_publish_interval = Configuration.ORIENTATION_PUBLISH_INTERVAL
+        self.__orientation_beta = Configuration.ORIENTATION_BETA
+        self.__history_enabled = Configuration.HISTORY_ENABLED
+        self.__history_size = Configuration.HISTORY_SIZE
+        self.__history_batch = Configuration.HISTORY_BATCH
+        self.__history_compression = Configuration.HISTORY_COMPRESSION
+        self.__history_dictionary = None
+        self.__joystick_poll_interval = Configuration.JOYSTICK_POLL_INTERVAL
+        self.__joystick_gestures = Configuration.JOYSTICK_GESTURES
+        self.__joystick_double_press_window = Configuration.JOYSTICK_DOUBLE_PRESS_WINDOW
+        self.__joystick_hold_time = Configuration.JOYSTICK_HOLD_TIME
+        self.__joystick_sequence_window = Configuration.JOYSTICK_SEQUENCE_WINDOW
+        self.__joystick_sequences = []
+        self.__broker_targets = []
         self.__load_config_attributes()
         logger.info(f"A config object for the INI file '{self.config_full_path_file}' was initialized.")
 
@@ -96,6 +211,24 @@ class Configuration():
             self.mqtt_zone = self.__raw_config['mqtt'].get('zone', Configuration.MQTT_ZONE)
             # mqtt_room
             self.mqtt_room = self.__raw_config['mqtt'].get('room', Configuration.MQTT_ROOM)
+            # mqtt_reconnect_min_delay
+            self.mqtt_reconnect_min_delay = self.__raw_config['mqtt'].getfloat('reconnect_min_delay',
+                Configuration.MQTT_RECONNECT_MIN_DELAY)
+            # mqtt_reconnect_max_delay
+            self.mqtt_reconnect_max_delay = self.__raw_config['mqtt'].getfloat('reconnect_max_delay',
+                Configuration.MQTT_RECONNECT_MAX_DELAY)
+            # mqtt_startup_delay
+            self.mqtt_startup_delay = self.__raw_config['mqtt'].getfloat('startup_delay', Configuration.MQTT_STARTUP_DELAY)
+            # mqtt_protocol_version
+            self.mqtt_protocol_version = self.__raw_config['mqtt'].get('protocol_version', Configuration.MQTT_PROTOCOL_VERSION)
+            # mqtt_message_expiry
+            self.mqtt_message_expiry = self.__raw_config['mqtt'].getint('message_expiry', Configuration.MQTT_MESSAGE_EXPIRY)
+            # mqtt_ca_certs, mqtt_certfile and mqtt_keyfile; empty values are None
+            self.mqtt_ca_certs = self.__raw_config['mqtt'].get('ca_certs', '').strip() or None
+            self.mqtt_certfile = self.__raw_config['mqtt'].get('certfile', '').strip() or None
+            self.mqtt_keyfile = self.__raw_config['mqtt'].get('keyfile', '').strip() or None
+            # mqtt_tls_insecure
+            self.__mqtt_tls_insecure = self.__raw_config['mqtt'].getboolean('tls_insecure', Configuration.MQTT_TLS_INSECURE)
         # SENSEHAT
         if 'sensehat' in self.__raw_config.sections():
             # sensehat_set_rotation
@@ -110,6 +243,185 @@ class Configuration():
             # sensehat_gyroscope_multiplier
             self.__sensehat_gyroscope_multiplier = self.__raw_config['sensehat'].getfloat('gyroscope_multiplier',
                 Configuration.SENSEHAT_GYROSCOPE_MULTIPLIER)
+            # sensehat_read_timeout
+            self.sensehat_read_timeout = self.__raw_config['sensehat'].getfloat('read_timeout',
+                Configuration.SENSEHAT_READ_TIMEOUT)
+        # LED
+        if 'led' in self.__raw_config.sections():
+            # led_queue_size
+            self.led_queue_size = self.__raw_config['led'].getint('queue_size', Configuration.LED_QUEUE_SIZE)
+            # led_queue_policy
+            self.led_queue_policy = self.__raw_config['led'].get('queue_policy', Configuration.LED_QUEUE_POLICY)
+            # led_rate
+            self.led_rate = self.__raw_config['led'].getfloat('rate', Configuration.LED_RATE)
+            # led_burst
+            self.led_burst = self.__raw_config['led'].getfloat('burst', Configuration.LED_BURST)
+            # led_worker
+            self.__led_worker = self.__raw_config['led'].getboolean('worker', Configuration.LED_WORKER)
+        # SAMPLING
+        if 'sampling' in self.__raw_config.sections():
+            # sampling_adaptive
+            self.__sampling_adaptive = self.__raw_config['sampling'].getboolean('adaptive', Configuration.SAMPLING_ADAPTIVE)
+            # sampling_idle_resolution
+            # falls back to the fixed resolution when unset
+            if 'idle_resolution' in self.__raw_config['sampling']:
+                self.sampling_idle_resolution = self.__raw_config['sampling'].getfloat('idle_resolution')
+            # sampling_active_resolution
+            self.sampling_active_resolution = self.__raw_config['sampling'].getfloat('active_resolution',
+                Configuration.SAMPLING_ACTIVE_RESOLUTION)
+            # sampling_motion_up
+            self.sampling_motion_up = self.__raw_config['sampling'].getfloat('motion_up', Configuration.SAMPLING_MOTION_UP)
+            # sampling_motion_down
+            self.sampling_motion_down = self.__raw_config['sampling'].getfloat('motion_down', Configuration.SAMPLING_MOTION_DOWN)
+            # sampling_change_up
+            self.sampling_change_up = self.__raw_config['sampling'].getfloat('change_up', Configuration.SAMPLING_CHANGE_UP)
+            # sampling_change_down
+            self.sampling_change_down = self.__raw_config['sampling'].getfloat('change_down', Configuration.SAMPLING_CHANGE_DOWN)
+        # EVENTS
+        if 'events' in self.__raw_config.sections():
+            # events_enabled
+            self.__events_enabled = self.__raw_config['events'].getboolean('enabled', Configuration.EVENTS_ENABLED)
+            # events_resolution
+            self.events_resolution = self.__raw_config['events'].getfloat('resolution', Configuration.EVENTS_RESOLUTION)
+            # detector thresholds; an empty value disables the detector
+            self.__events_shake_threshold = self.__optional_float('events', 'shake_threshold', Configuration.EVENTS_SHAKE_THRESHOLD)
+            self.__events_tilt_angle = self.__optional_float('events', 'tilt_angle', Configuration.EVENTS_TILT_ANGLE)
+            self.__events_temperature_threshold = self.__optional_float('events', 'temperature_threshold', None)
+            self.__events_humidity_threshold = self.__optional_float('events', 'humidity_threshold', None)
+            # events_temperature_hysteresis
+            self.events_temperature_hysteresis = self.__raw_config['events'].getfloat('temperature_hysteresis',
+                Configuration.EVENTS_TEMPERATURE_HYSTERESIS)
+            # events_humidity_hysteresis
+            self.events_humidity_hysteresis = self.__raw_config['events'].getfloat('humidity_hysteresis',
+                Configuration.EVENTS_HUMIDITY_HYSTERESIS)
+        # DIAGNOSTICS
+        if 'diagnostics' in self.__raw_config.sections():
+            # diagnostics_token; an empty token rejects every command
+            self.__diagnostics_token = self.__raw_config['diagnostics'].get('token', '').strip() or None
+            # diagnostics_enabled
+            self.diagnostics_enabled = self.__raw_config['diagnostics'].getboolean('enabled', Configuration.DIAGNOSTICS_ENABLED)
+            # diagnostics_max_duration
+            self.diagnostics_max_duration = self.__raw_config['diagnostics'].getfloat('max_duration',
+                Configuration.DIAGNOSTICS_MAX_DURATION)
+            # diagnostics_top
+            self.diagnostics_top = self.__raw_config['diagnostics'].getint('top', Configuration.DIAGNOSTICS_TOP)
+        # WATCHDOG
+        if 'watchdog' in self.__raw_config.sections():
+            # watchdog_budget
+            self.watchdog_budget = self.__raw_config['watchdog'].getfloat('budget', Configuration.WATCHDOG_BUDGET)
+            # watchdog_interval
+            self.watchdog_interval = self.__raw_config['watchdog'].getfloat('interval', Configuration.WATCHDOG_INTERVAL)
+            # watchdog_publish_interval
+            self.watchdog_publish_interval = self.__raw_config['watchdog'].getfloat('publish_interval',
+                Configuration.WATCHDOG_PUBLISH_INTERVAL)
+        # RULES
+        if 'rules' in self.__raw_config.sections():
+            # rules_file; relative paths start from the working directory
+            self.__rules_file = self.__raw_config['rules'].get('file', Configuration.RULES_FILE).strip()
+            # rules_enabled
+            self.rules_enabled = self.__raw_config['rules'].getboolean('enabled', Configuration.RULES_ENABLED)
+        # ORIENTATION
+        if 'orientation' in self.__raw_config.sections():
+            # orientation_enabled
+            self.__orientation_enabled = self.__raw_config['orientation'].getboolean('enabled', Configuration.ORIENTATION_ENABLED)
+            # orientation_resolution
+            self.orientation_resolution = self.__raw_config['orientation'].getfloat('resolution',
+                Configuration.ORIENTATION_RESOLUTION)
+            # orientation_publish_interval
+            self.orientation_publish_interval = self.__raw_config['orientation'].getfloat('publish_interval',
+                Configuration.ORIENTATION_PUBLISH_INTERVAL)
+            # orientation_beta
+            self.orientation_beta = self.__raw_config['orientation'].getfloat('beta', Configuration.ORIENTATION_BETA)
+        # HISTORY
+        if 'history' in self.__raw_config.sections():
+            # history_enabled
+            self.__history_enabled = self.__raw_config['history'].getboolean('enabled', Configuration.HISTORY_ENABLED)
+            # history_size
+            self.history_size = self.__raw_config['history'].getint('size', Configuration.HISTORY_SIZE)
+            # history_batch
+            self.history_batch = self.__raw_config['history'].getint('batch', Configuration.HISTORY_BATCH)
+            # history_compression
+            self.__history_compression = self.__raw_config['history'].getboolean('compression', Configuration.HISTORY_COMPRESSION)
+            # history_dictionary; empty values use the dictionary of the sensor schema
+            self.history_dictionary = self.__raw_config['history'].get('dictionary', '').strip() or None
+        # JOYSTICK
+        if 'joystick' in self.__raw_config.sections():
+            # joystick_poll_interval
+            self.joystick_poll_interval = self.__raw_config['joystick'].getfloat('poll_interval', Configuration.JOYSTICK_POLL_INTERVAL)
+            # joystick_gestures
+            self.__joystick_gestures = self.__raw_config['joystick'].getboolean('gestures', Configuration.JOYSTICK_GESTURES)
+            # joystick_double_press_window
+            self.joystick_double_press_window = self.__raw_config['joystick'].getfloat('double_press_window',
+                Configuration.JOYSTICK_DOUBLE_PRESS_WINDOW)
+            # joystick_hold_time
+            self.joystick_hold_time = self.__raw_config['joystick'].getfloat('hold_time', Configuration.JOYSTICK_HOLD_TIME)
+            # joystick_sequence_window
+            self.joystick_sequence_window = self.__raw_config['joystick'].getfloat('sequence_window',
+                Configuration.JOYSTICK_SEQUENCE_WINDOW)
+            # joystick_sequences; comma-separated sequences of dash-separated directions (e.g., 'up-up-down, left-right')
+            self.__joystick_sequences = [[d.strip() for d in sequence.split('-')]
+                for sequence in self.__raw_config['joystick'].get('sequences', '').split(',') if sequence.strip()]
+        # BROKERS
+        for section in self.__raw_config.sections():
+            if section.startswith(Configuration.BROKER_SECTION):
+                self.__broker_targets.append(self.__load_broker_target(section))
+
+    def __load_broker_target(self, section:str)->dict:
+        # every extra broker gets the same payloads as the main one, with its own settings
+        raw_target = self.__raw_config[section]
+        name = section[len(Configuration.BROKER_SECTION):].strip()
+        if not name or not val.zone(name):
+            logger.info(f"The broker section '{section}' needs a name without '/'. Fix config file.")
+            raise err.InvalidConfigAttr(f"The broker section '{section}' has an invalid name.", 'name')
+        if 'broker_address' not in raw_target:
+            logger.info(f"The broker section '{section}' has no broker_address. Fix config file.")
+            raise err.InvalidConfigAttr(f"The broker section '{section}' has no broker_address.", 'broker_address')
+        qos = raw_target.getint('qos', Configuration.BROKER_QOS)
+        if not val.qos(qos):
+            logger.info(f"QoS cannot be set to '{qos}' in the broker section '{section}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set QoS to '{qos}'.", 'qos')
+        encoding = raw_target.get('encoding', Configuration.BROKER_ENCODING)
+        if not val.encoding(encoding):
+            logger.info(f"Encoding cannot be set to '{encoding}' in the broker section '{section}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set encoding to '{encoding}'.", 'encoding')
+        queue_size = raw_target.getint('queue_size', Configuration.BROKER_QUEUE_SIZE)
+        if not val.queue_size(queue_size):
+            logger.info(f"Queue size cannot be set to '{queue_size}' in the broker section '{section}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set queue size to '{queue_size}'.", 'queue_size')
+        ca_certs = raw_target.get('ca_certs', '').strip() or None
+        if ca_certs and not val.file_exists(ca_certs):
+            logger.info(f"The CA certificates '{ca_certs}' of the broker section '{section}' do not exist. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set CA certificates to '{ca_certs}'.", 'ca_certs')
+        return {
+            'name': name,
+            'broker_address': raw_target.get('broker_address'),
+            'user': raw_target.get('user', '').strip() or None,
+            'password': raw_target.get('password', '').strip() or None,
+            'qos': qos,
+            'prefix': raw_target.get('prefix', Configuration.BROKER_PREFIX).strip().strip('/'),
+            'encoding': encoding,
+            'queue_size': queue_size,
+            'ca_certs': ca_certs,
+        }
+
+    def __optional_float(self, section:str, option:str, fallback:float):
+        # like getfloat() but an empty value means None (i.e., disabled)
+        if option not in self.__raw_config[section]:
+            return fallback
+        if not self.__raw_config[section].get(option).strip():
+            return None
+        try:
+            return self.__raw_config[section].getfloat(option)
+        except ValueError:
+            logger.info(f"The option '{option}' in section '{section}' is not a number. Fix config file.")
+            raise err.InvalidConfigAttr(f"The option '{option}' is not a number.", option)
+
+    def diff(self, other:'Configuration')->list:
+        """
+        Method that returns the names of the settings (properties) whose values differ in 'other'
+        """
+        names = [name for name, attr in vars(Configuration).items() if isinstance(attr, property)]
+        return [name for name in names if getattr(self, name) != getattr(other, name)]
 
     # Add validations to setter logic whenever necessary and when loading attrb,
     # refer to this setter in the logic
@@ -167,6 +479,90 @@ class Configuration():
             raise err.InvalidConfigAttr(f"Room '{room}' contains invalid characters.", 'room')
         self.__mqtt_room = room
     
+    @property
+    def mqtt_reconnect_min_delay(self):
+        return self.__mqtt_reconnect_min_delay
+    @mqtt_reconnect_min_delay.setter
+    def mqtt_reconnect_min_delay(self, delay:float):
+        if not val.timeout(delay):
+            logger.info(f"Reconnect min delay cannot be set to '{delay}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set reconnect_min_delay to '{delay}'.", 'reconnect_min_delay')
+        self.__mqtt_reconnect_min_delay = delay
+
+    @property
+    def mqtt_reconnect_max_delay(self):
+        return self.__mqtt_reconnect_max_delay
+    @mqtt_reconnect_max_delay.setter
+    def mqtt_reconnect_max_delay(self, delay:float):
+        if not val.timeout(delay):
+            logger.info(f"Reconnect max delay cannot be set to '{delay}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set reconnect_max_delay to '{delay}'.", 'reconnect_max_delay')
+        self.__mqtt_reconnect_max_delay = delay
+
+    @property
+    def mqtt_startup_delay(self):
+        return self.__mqtt_startup_delay
+    @mqtt_startup_delay.setter
+    def mqtt_startup_delay(self, delay:float):
+        if not val.threshold(delay):
+            logger.info(f"Startup delay cannot be set to '{delay}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set startup_delay to '{delay}'.", 'startup_delay')
+        self.__mqtt_startup_delay = delay
+
+    @property
+    def mqtt_protocol_version(self):
+        return self.__mqtt_protocol_version
+    @mqtt_protocol_version.setter
+    def mqtt_protocol_version(self, version:str):
+        if not val.protocol_version(version):
+            logger.info(f"MQTT protocol version '{version}' is not supported. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set protocol_version to '{version}'.", 'protocol_version')
+        self.__mqtt_protocol_version = version
+
+    @property
+    def mqtt_message_expiry(self):
+        return self.__mqtt_message_expiry
+    @mqtt_message_expiry.setter
+    def mqtt_message_expiry(self, expiry:int):
+        if not val.threshold(expiry):
+            logger.info(f"Message expiry cannot be set to '{expiry}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set message_expiry to '{expiry}'.", 'message_expiry')
+        self.__mqtt_message_expiry = expiry
+
+    @property
+    def mqtt_ca_certs(self):
+        return self.__mqtt_ca_certs
+    @mqtt_ca_certs.setter
+    def mqtt_ca_certs(self, path_file:str):
+        if path_file and not val.file_exists(path_file):
+            logger.info(f"The CA certificates file '{path_file}' does not exist. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set ca_certs to '{path_file}'.", 'ca_certs')
+        self.__mqtt_ca_certs = path_file
+
+    @property
+    def mqtt_certfile(self):
+        return self.__mqtt_certfile
+    @mqtt_certfile.setter
+    def mqtt_certfile(self, path_file:str):
+        if path_file and not val.file_exists(path_file):
+            logger.info(f"The client certificate file '{path_file}' does not exist. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set certfile to '{path_file}'.", 'certfile')
+        self.__mqtt_certfile = path_file
+
+    @property
+    def mqtt_keyfile(self):
+        return self.__mqtt_keyfile
+    @mqtt_keyfile.setter
+    def mqtt_keyfile(self, path_file:str):
+        if path_file and not val.file_exists(path_file):
+            logger.info(f"The client key file '{path_file}' does not exist. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set keyfile to '{path_file}'.", 'keyfile')
+        self.__mqtt_keyfile = path_file
+
+    @property
+    def mqtt_tls_insecure(self):
+        return self.__mqtt_tls_insecure
+
     @property
     def sensehat_set_rotation(self):
         return self.__sensehat_set_rotation
@@ -198,3 +594,374 @@ class Configuration():
     @property
     def sensehat_gyroscope_multiplier(self):
         return self.__sensehat_gyroscope_multiplier
+
+    @property
+    def sensehat_read_timeout(self):
+        return self.__sensehat_read_timeout
+    @sensehat_read_timeout.setter
+    def sensehat_read_timeout(self, timeout:float):
+        if not val.timeout(timeout):
+            logger.info(f"Read timeout cannot be set to '{timeout}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set read_timeout to '{timeout}'.", 'read_timeout')
+        self.__sensehat_read_timeout = timeout
+
+    @property
+    def led_queue_size(self):
+        return self.__led_queue_size
+    @led_queue_size.setter
+    def led_queue_size(self, size:int):
+        if not val.queue_size(size):
+            logger.info(f"LED queue size cannot be set to '{size}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set queue_size to '{size}'.", 'queue_size')
+        self.__led_queue_size = size
+
+    @property
+    def led_queue_policy(self):
+        return self.__led_queue_policy
+    @led_queue_policy.setter
+    def led_queue_policy(self, policy:str):
+        if not val.queue_policy(policy):
+            logger.info(f"LED queue policy cannot be set to '{policy}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set queue_policy to '{policy}'.", 'queue_policy')
+        self.__led_queue_policy = policy
+
+    @property
+    def led_rate(self):
+        return self.__led_rate
+    @led_rate.setter
+    def led_rate(self, rate:float):
+        if not val.threshold(rate):
+            logger.info(f"LED rate cannot be set to '{rate}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set rate to '{rate}'.", 'rate')
+        self.__led_rate = rate
+
+    @property
+    def led_burst(self):
+        return self.__led_burst
+    @led_burst.setter
+    def led_burst(self, burst:float):
+        if not burst >= 1:
+            logger.info(f"LED burst cannot be set to '{burst}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set burst to '{burst}'.", 'burst')
+        self.__led_burst = burst
+
+    @property
+    def led_worker(self):
+        return self.__led_worker
+
+    @property
+    def sampling_adaptive(self):
+        return self.__sampling_adaptive
+
+    @property
+    def sampling_idle_resolution(self):
+        return self.__sampling_idle_resolution if self.__sampling_idle_resolution is not None else self.resolution
+    @sampling_idle_resolution.setter
+    def sampling_idle_resolution(self, resolution:float):
+        if not val.resolution(resolution):
+            logger.info(f"Idle resolution cannot be set to '{resolution}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set idle_resolution to '{resolution}'.", 'idle_resolution')
+        self.__sampling_idle_resolution = resolution
+
+    @property
+    def sampling_active_resolution(self):
+        return self.__sampling_active_resolution
+    @sampling_active_resolution.setter
+    def sampling_active_resolution(self, resolution:float):
+        if not val.resolution(resolution):
+            logger.info(f"Active resolution cannot be set to '{resolution}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set active_resolution to '{resolution}'.", 'active_resolution')
+        self.__sampling_active_resolution = resolution
+
+    @property
+    def sampling_motion_up(self):
+        return self.__sampling_motion_up
+    @sampling_motion_up.setter
+    def sampling_motion_up(self, threshold:float):
+        if not val.threshold(threshold):
+            logger.info(f"Motion up threshold cannot be set to '{threshold}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set motion_up to '{threshold}'.", 'motion_up')
+        self.__sampling_motion_up = threshold
+
+    @property
+    def sampling_motion_down(self):
+        return self.__sampling_motion_down
+    @sampling_motion_down.setter
+    def sampling_motion_down(self, threshold:float):
+        if not val.threshold(threshold):
+            logger.info(f"Motion down threshold cannot be set to '{threshold}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set motion_down to '{threshold}'.", 'motion_down')
+        self.__sampling_motion_down = threshold
+
+    @property
+    def sampling_change_up(self):
+        return self.__sampling_change_up
+    @sampling_change_up.setter
+    def sampling_change_up(self, threshold:float):
+        if not val.threshold(threshold):
+            logger.info(f"Change up threshold cannot be set to '{threshold}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set change_up to '{threshold}'.", 'change_up')
+        self.__sampling_change_up = threshold
+
+    @property
+    def sampling_change_down(self):
+        return self.__sampling_change_down
+    @sampling_change_down.setter
+    def sampling_change_down(self, threshold:float):
+        if not val.threshold(threshold):
+            logger.info(f"Change down threshold cannot be set to '{threshold}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set change_down to '{threshold}'.", 'change_down')
+        self.__sampling_change_down = threshold
+
+    @property
+    def events_enabled(self):
+        return self.__events_enabled
+
+    @property
+    def events_resolution(self):
+        return self.__events_resolution
+    @events_resolution.setter
+    def events_resolution(self, resolution:float):
+        if not val.resolution(resolution):
+            logger.info(f"Events resolution cannot be set to '{resolution}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set events resolution to '{resolution}'.", 'resolution')
+        self.__events_resolution = resolution
+
+    @property
+    def events_shake_threshold(self):
+        return self.__events_shake_threshold
+
+    @property
+    def events_tilt_angle(self):
+        return self.__events_tilt_angle
+
+    @property
+    def events_temperature_threshold(self):
+        return self.__events_temperature_threshold
+
+    @property
+    def events_temperature_hysteresis(self):
+        return self.__events_temperature_hysteresis
+    @events_temperature_hysteresis.setter
+    def events_temperature_hysteresis(self, hysteresis:float):
+        if not val.threshold(hysteresis):
+            logger.info(f"Temperature hysteresis cannot be set to '{hysteresis}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set temperature_hysteresis to '{hysteresis}'.", 'temperature_hysteresis')
+        self.__events_temperature_hysteresis = hysteresis
+
+    @property
+    def events_humidity_threshold(self):
+        return self.__events_humidity_threshold
+
+    @property
+    def events_humidity_hysteresis(self):
+        return self.__events_humidity_hysteresis
+    @events_humidity_hysteresis.setter
+    def events_humidity_hysteresis(self, hysteresis:float):
+        if not val.threshold(hysteresis):
+            logger.info(f"Humidity hysteresis cannot be set to '{hysteresis}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set humidity_hysteresis to '{hysteresis}'.", 'humidity_hysteresis')
+        self.__events_humidity_hysteresis = hysteresis
+
+    @property
+    def diagnostics_enabled(self):
+        return self.__diagnostics_enabled
+    @diagnostics_enabled.setter
+    def diagnostics_enabled(self, enabled:bool):
+        if enabled and not self.diagnostics_token:
+            logger.info(f"Diagnostics cannot be enabled without a token. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot enable diagnostics without a token.", 'token')
+        self.__diagnostics_enabled = enabled
+
+    @property
+    def diagnostics_token(self):
+        return self.__diagnostics_token
+
+    @property
+    def diagnostics_max_duration(self):
+        return self.__diagnostics_max_duration
+    @diagnostics_max_duration.setter
+    def diagnostics_max_duration(self, duration:float):
+        if not val.timeout(duration):
+            logger.info(f"Diagnostics max duration cannot be set to '{duration}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set max_duration to '{duration}'.", 'max_duration')
+        self.__diagnostics_max_duration = duration
+
+    @property
+    def diagnostics_top(self):
+        return self.__diagnostics_top
+    @diagnostics_top.setter
+    def diagnostics_top(self, top:int):
+        if not val.timeout(top):
+            logger.info(f"Diagnostics top cannot be set to '{top}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set top to '{top}'.", 'top')
+        self.__diagnostics_top = top
+
+    @property
+    def watchdog_budget(self):
+        return self.__watchdog_budget
+    @watchdog_budget.setter
+    def watchdog_budget(self, budget:float):
+        if not val.timeout(budget):
+            logger.info(f"Watchdog budget cannot be set to '{budget}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set budget to '{budget}'.", 'budget')
+        self.__watchdog_budget = budget
+
+    @property
+    def watchdog_interval(self):
+        return self.__watchdog_interval
+    @watchdog_interval.setter
+    def watchdog_interval(self, interval:float):
+        if not val.timeout(interval):
+            logger.info(f"Watchdog interval cannot be set to '{interval}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set interval to '{interval}'.", 'interval')
+        self.__watchdog_interval = interval
+
+    @property
+    def watchdog_publish_interval(self):
+        return self.__watchdog_publish_interval
+    @watchdog_publish_interval.setter
+    def watchdog_publish_interval(self, interval:float):
+        if not val.threshold(interval):
+            logger.info(f"Watchdog publish interval cannot be set to '{interval}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set publish_interval to '{interval}'.", 'publish_interval')
+        self.__watchdog_publish_interval = interval
+
+    @property
+    def rules_enabled(self):
+        return self.__rules_enabled
+    @rules_enabled.setter
+    def rules_enabled(self, enabled:bool):
+        if enabled and not val.file_exists(self.rules_file):
+            logger.info(f"Rules cannot be enabled because the file '{self.rules_file}' does not exist. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot enable rules without the file '{self.rules_file}'.", 'file')
+        self.__rules_enabled = enabled
+
+    @property
+    def rules_file(self):
+        return self.__rules_file
+
+    @property
+    def orientation_enabled(self):
+        return self.__orientation_enabled
+
+    @property
+    def orientation_resolution(self):
+        return self.__orientation_resolution
+    @orientation_resolution.setter
+    def orientation_resolution(self, resolution:float):
+        if not val.timeout(resolution):
+            logger.info(f"Orientation resolution cannot be set to '{resolution}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set orientation resolution to '{resolution}'.", 'resolution')
+        self.__orientation_resolution = resolution
+
+    @property
+    def orientation_publish_interval(self):
+        return self.__orientation_publish_interval
+    @orientation_publish_interval.setter
+    def orientation_publish_interval(self, interval:float):
+        if not val.timeout(interval) or interval < self.orientation_resolution:
+            logger.info(f"Orientation publish interval cannot be set to '{interval}' (min. the resolution). Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set publish_interval to '{interval}'.", 'publish_interval')
+        self.__orientation_publish_interval = interval
+
+    @property
+    def orientation_beta(self):
+        return self.__orientation_beta
+    @orientation_beta.setter
+    def orientation_beta(self, beta:float):
+        if not val.threshold(beta):
+            logger.info(f"Orientation beta cannot be set to '{beta}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set beta to '{beta}'.", 'beta')
+        self.__orientation_beta = beta
+
+    @property
+    def history_enabled(self):
+        return self.__history_enabled
+
+    @property
+    def history_size(self):
+        return self.__history_size
+    @history_size.setter
+    def history_size(self, size:int):
+        if not val.queue_size(size):
+            logger.info(f"History size cannot be set to '{size}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set history size to '{size}'.", 'size')
+        self.__history_size = size
+
+    @property
+    def history_batch(self):
+        return self.__history_batch
+    @history_batch.setter
+    def history_batch(self, batch:int):
+        if not val.queue_size(batch):
+            logger.info(f"History batch cannot be set to '{batch}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set batch to '{batch}'.", 'batch')
+        self.__history_batch = batch
+
+    @property
+    def history_compression(self):
+        return self.__history_compression
+
+    @property
+    def history_dictionary(self):
+        return self.__history_dictionary
+    @history_dictionary.setter
+    def history_dictionary(self, path_file:str):
+        if path_file and not val.file_exists(path_file):
+            logger.info(f"The dictionary file '{path_file}' does not exist. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set dictionary to '{path_file}'.", 'dictionary')
+        self.__history_dictionary = path_file
+
+    @property
+    def broker_targets(self):
+        # dicts with the options of each '[broker:<name>]' section
+        return self.__broker_targets
+
+    @property
+    def joystick_poll_interval(self):
+        return self.__joystick_poll_interval
+    @joystick_poll_interval.setter
+    def joystick_poll_interval(self, interval:float):
+        if not val.timeout(interval):
+            logger.info(f"Joystick poll interval cannot be set to '{interval}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set poll interval to '{interval}'.", 'poll_interval')
+        self.__joystick_poll_interval = interval
+
+    @property
+    def joystick_gestures(self):
+        return self.__joystick_gestures
+
+    @property
+    def joystick_double_press_window(self):
+        return self.__joystick_double_press_window
+    @joystick_double_press_window.setter
+    def joystick_double_press_window(self, window:float):
+        if not val.timeout(window):
+            logger.info(f"Double press window cannot be set to '{window}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set double press window to '{window}'.", 'double_press_window')
+        self.__joystick_double_press_window = window
+
+    @property
+    def joystick_hold_time(self):
+        return self.__joystick_hold_time
+    @joystick_hold_time.setter
+    def joystick_hold_time(self, hold_time:float):
+        if not val.timeout(hold_time):
+            logger.info(f"Hold time cannot be set to '{hold_time}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set hold time to '{hold_time}'.", 'hold_time')
+        self.__joystick_hold_time = hold_time
+
+    @property
+    def joystick_sequence_window(self):
+        return self.__joystick_sequence_window
+    @joystick_sequence_window.setter
+    def joystick_sequence_window(self, window:float):
+        if not val.timeout(window):
+            logger.info(f"Sequence window cannot be set to '{window}'. Fix config file.")
+            raise err.InvalidConfigAttr(f"Cannot set sequence window to '{window}'.", 'sequence_window')
+        self.__joystick_sequence_window = window
+
+    @property
+    def joystick_sequences(self):
+        return self.__joystick_sequences
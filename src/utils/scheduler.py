@@ -0,0 +1,81 @@
+"""
+Module that contains a drift-free, fixed-rate scheduler for the publishing loops
+"""
+
+# local imports
+from src.constants import constants as const
+# external imports
+import logging
+from math import floor
+from threading import Event
+from time import monotonic, time
+
+# start a loggin instance for this module using constants
+logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+class FixedRateScheduler():
+    """
+    Class that generates a scheduler that ticks at fixed, phase-aligned deadlines.
+    The first tick is aligned to a multiple of the period in epoch time (e.g., a period of
+    300 ticks at :00, :05, :10...), so devices with synced clocks sample at the same instants.
+    Later deadlines are advanced in monotonic time, so the time spent between ticks does not
+    add up. Ticks that were missed are skipped instead of being run back to back.
+    """
+    def __init__(self, period:float, event:Event = None):
+        self._period = period
+        # optional external (threading) event to interrupt waits
+        self._event = event if event is not None else Event()
+        # helpers
+        self._deadline = None
+        self._ticks = 0
+        self._skipped = 0
+
+    @property
+    def period(self):
+        return self._period
+    @period.setter
+    def period(self, period:float):
+        # realign on the next wait()
+        if period != self._period:
+            self._period = period
+            self._deadline = None
+
+    @property
+    def ticks(self):
+        return self._ticks
+
+    @property
+    def skipped(self):
+        return self._skipped
+
+    # class specific methods
+    def wait(self, period:float = None)->bool:
+        """
+        Method that blocks until the next tick. If 'period' is given and differs from the
+        current one, the scheduler realigns to the new period. Returns True if the event
+        was set while waiting (i.e., the caller should stop).
+        """
+        if period is not None:
+            self.period = period
+        now = monotonic()
+        if self._period <= 0:
+            self._deadline = now
+        elif self._deadline is None:
+            self._deadline = self.__aligned(now)
+        else:
+            self._deadline += self._period
+            if now > self._deadline:
+                missed = floor((now - self._deadline) / self._period) + 1
+                self._deadline += missed * self._period
+                self._skipped += missed
+                logger.warning(f"Skipped '{missed}' tick(s) of '{self._period}' seconds because the loop overran.")
+        self._ticks += 1
+        return self._event.wait(max(0.0, self._deadline - now))
+
+    def __aligned(self, now:float)->float:
+        # monotonic time of the next multiple of the period in epoch time
+        epoch = time()
+        return now + (floor(epoch / self._period) + 1) * self._period - epoch
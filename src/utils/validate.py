@@ -19,6 +19,21 @@ def broker_url(broker_url:ParseResult):
     except ValueError:
         return False
 
+def queue_size(size:int):
+    return size >= 1
+
+def protocol_version(version:str):
+    return version in const.MQTT_PROTOCOL_VERSIONS
+
+def queue_policy(policy:str):
+    return policy in const.MQTT_QUEUE_POLICIES
+
+def qos(qos:int):
+    return qos in const.MQTT_QOS_LEVELS
+
+def encoding(encoding:str):
+    return encoding in const.MQTT_ENCODINGS
+
 # SENSEHAT methods
 def pixels(pixels:list):
     return len(pixels) == 64
@@ -40,4 +55,10 @@ def resolution(resolution:int):
     return resolution >= 0
 
 def rounding(rounding:int):
-    return rounding >= 0
\ No newline at end of file
+    return rounding >= 0
+
+def timeout(timeout:float):
+    return timeout > 0
+
+def threshold(threshold:float):
+    return threshold >= 0
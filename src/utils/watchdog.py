@@ -0,0 +1,124 @@
+"""
+Module that contains a loop-lag watchdog and a minimal sd_notify() client for the systemd
+service manager (see 'man sd_notify'), so that a stuck loop also makes the service unhealthy.
+"""
+
+# local imports
+from src.constants import constants as const
+# external imports
+import logging
+import os
+import socket
+from threading import Lock
+from time import monotonic
+
+# start a loggin instance for this module using constants
+logging.basicConfig(filename=const.LOG_FILENAME, format=const.LOG_FORMAT, datefmt=const.LOG_DATEFMT)
+logger = logging.getLogger(__name__)
+logger.setLevel(const.LOG_LEVEL)
+logger.debug("Initilized a logger object.")
+
+def sd_notify(state:str)->bool:
+    """
+    Sends 'state' (e.g., 'READY=1' or 'WATCHDOG=1') to systemd. Returns False if the process
+    was not started by systemd with a notification socket or if sending failed.
+    """
+    address = os.environ.get('NOTIFY_SOCKET')
+    if not address:
+        return False
+    # a leading '@' means an abstract namespace socket
+    if address.startswith('@'):
+        address = '\0' + address[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as notify_socket:
+            notify_socket.connect(address)
+            notify_socket.sendall(state.encode('utf-8'))
+        return True
+    except OSError as oerr:
+        logger.debug(f"Unable to notify systemd of '{state}': '{oerr}'.")
+        return False
+
+def watchdog_interval()->float:
+    """
+    Returns how often (in seconds) systemd expects WATCHDOG=1, i.e., half of 'WatchdogSec',
+    or None if the systemd watchdog is not enabled for this process.
+    """
+    usec = os.environ.get('WATCHDOG_USEC')
+    pid = os.environ.get('WATCHDOG_PID')
+    if not usec or (pid and int(pid) != os.getpid()):
+        return None
+    return int(usec) / 1e6 / 2
+
+class Watchdog():
+    """
+    Class that generates a watchdog for loops that send heartbeats.
+    Each loop declares the period it expects between heartbeats. The lag of a loop is how
+    much longer than its period it took to send the next heartbeat; a loop is late if its lag
+    (including the time since its last heartbeat) exceeds its budget.
+    """
+    def __init__(self):
+        self._loops = {}
+        self._lock = Lock()
+
+    # class specific methods
+    def watch(self, name:str, period:float, budget:float):
+        """
+        Method that starts watching a loop; the first heartbeat is expected within 'period'.
+        """
+        with self._lock:
+            self._loops[name] = {
+                'period': period,
+                'budget': budget,
+                'last': monotonic(),
+                'beats': 0,
+                'lag_last': 0.0,
+                'lag_max': 0.0,
+                'lag_total': 0.0,
+            }
+        logger.debug(f"Watching the loop '{name}' (period '{period}', budget '{budget}').")
+
+    def beat(self, name:str, period:float = None):
+        """
+        Method that loops call once per iteration. Set 'period' if the time until the next
+        heartbeat changes (e.g., a new resolution).
+        """
+        now = monotonic()
+        with self._lock:
+            loop = self._loops[name]
+            lag = max(0.0, now - loop['last'] - loop['period'])
+            loop['last'] = now
+            loop['beats'] += 1
+            loop['lag_last'] = lag
+            loop['lag_max'] = max(loop['lag_max'], lag)
+            loop['lag_total'] += lag
+            if period is not None:
+                loop['period'] = period
+
+    def budget(self, name:str, budget:float):
+        with self._lock:
+            self._loops[name]['budget'] = budget
+
+    def late(self)->list:
+        """
+        Method that returns the names of the loops whose current lag exceeds their budget.
+        """
+        now = monotonic()
+        with self._lock:
+            return [name for name, loop in self._loops.items()
+                if now - loop['last'] - loop['period'] > loop['budget']]
+
+    def stats(self)->dict:
+        """
+        Method that returns the lag statistics (in seconds) of every loop.
+        """
+        now = monotonic()
+        with self._lock:
+            return {name: {
+                'period': loop['period'],
+                'budget': loop['budget'],
+                'beats': loop['beats'],
+                'lag': round(max(0.0, now - loop['last'] - loop['period']), 3),
+                'lag_last': round(loop['lag_last'], 3),
+                'lag_max': round(loop['lag_max'], 3),
+                'lag_mean': round(loop['lag_total'] / loop['beats'], 3) if loop['beats'] else None,
+            } for name, loop in self._loops.items()}